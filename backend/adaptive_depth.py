@@ -0,0 +1,73 @@
+"""
+Adaptive Retrieval Depth
+Instead of a fixed top_k, retrieval over-fetches RETRIEVAL_MAX_K matches (one
+vector query costs about the same for 5 or 20) and keeps only those above the
+relevance cliff: the first drop of at least RETRIEVAL_SCORE_GAP between
+neighbouring scores, or the first score under RETRIEVAL_MIN_SCORE, whichever
+comes first, never fewer than RETRIEVAL_MIN_K. A clear-cut question then puts a
+handful of chunks in the prompt, which shortens prompt evaluation and
+generation; a vague one still gets the full depth.
+
+Dense scores are cosine similarities and are compared as-is. BM25 scores have
+no fixed scale, so for lexical results they are divided by the top score first
+and only the gap applies.
+"""
+import os
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+RETRIEVAL_MIN_K = int(os.getenv("RETRIEVAL_MIN_K", "3"))
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", "12"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.3"))
+RETRIEVAL_SCORE_GAP = float(os.getenv("RETRIEVAL_SCORE_GAP", "0.1"))
+
+def choose_depth(scores, relative=False):
+    """
+    Pick how many of the best-first scores to keep
+
+    Args:
+        scores: Match scores, highest first
+        relative: Scores have no fixed scale (BM25); compare them as
+            fractions of the top score and skip the minimum-score cut
+
+    Returns:
+        Depth between RETRIEVAL_MIN_K and RETRIEVAL_MAX_K (or fewer if there
+        are fewer scores)
+    """
+    scores = list(scores[:RETRIEVAL_MAX_K])
+    if len(scores) <= RETRIEVAL_MIN_K:
+        return len(scores)
+    if relative:
+        top = scores[0]
+        if top <= 0:
+            return RETRIEVAL_MIN_K
+        scores = [score / top for score in scores]
+
+    depth = len(scores)
+    for i in range(1, len(scores)):
+        if scores[i - 1] - scores[i] >= RETRIEVAL_SCORE_GAP or (not relative and scores[i] < RETRIEVAL_MIN_SCORE):
+            depth = i
+            break
+    return max(depth, RETRIEVAL_MIN_K)
+
+def cut(matches, scores=None, relative=False):
+    """
+    Trim over-fetched matches to the adaptive depth
+
+    Args:
+        matches: Pinecone-style matches, best first
+        scores: Scores to choose the depth from, if not the matches' own
+            (hybrid retrieval cuts its fused list by the dense scores)
+        relative: See choose_depth
+
+    Returns:
+        The leading matches to keep
+    """
+    if scores is None:
+        scores = [match.get("score", 0) for match in matches]
+    depth = choose_depth(scores, relative)
+    metrics.record_retrieval_depth(depth)
+    return matches[:depth]
@@ -2,29 +2,56 @@
 Study Jarvis - FastAPI Backend
 Main API for the AI Study Assistant
 """
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List
-import uuid
+import asyncio
+import json
+import time
+import threading
 import os
 import tempfile
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
 import pinecone_client
 import llm_client
-from ingest_notes import extract_text, chunk_text, get_embed_model
+import session_store
+import quiz_jobs
+from embed_pool import EmbeddingPool, QUERY_LANE, BULK_LANE
+import lexical_index
+import summary_vectors
+import study_artifacts
+import metrics
+import tracing
+import file_cache
+import http_cache
+import resilience
+import batch_upload
+import adaptive_depth
+from db import get_version
+from ingest_notes import (
+    CHUNKING, extract_text_cached, iter_chunks, get_embed_model, prepare_chunks, store_chunks, remove_document
+)
 
 load_dotenv()
 
+# orjson serializes large responses (context_used, history pages) several times faster
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Study Jarvis API",
     description="AI-powered study assistant with RAG capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
 )
 
 # CORS middleware
@@ -34,8 +61,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id", "ETag"],
 )
 
+# Request latency histograms and the Server-Timing header
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Trace IDs and span logs for /chat, /upload and /quiz (plus opt-in profiling)
+app.add_middleware(tracing.TracingMiddleware)
+
+# brotli/gzip for large JSON responses (streams pass through uncompressed)
+app.add_middleware(http_cache.CompressionMiddleware)
+
+# End-to-end deadline for interactive requests (Ollama and Pinecone calls use the time left)
+app.add_middleware(resilience.DeadlineMiddleware)
+
+# Failures that leave a request without a generated answer
+LLM_ERRORS = (llm_client.LLMUnavailable, resilience.CircuitOpenError, resilience.DeadlineExceeded)
+DEGRADED_EXCERPTS = 3
+DEGRADED_EXCERPT_CHARS = 400
+
+def unavailable(error):
+    """HTTP error for a dependency that failed: 504 when the deadline ran out, else 503"""
+    status_code = 504 if isinstance(error, resilience.DeadlineExceeded) else 503
+    return HTTPException(status_code=status_code, detail=str(error))
+
 # Get embedding model (lazy-loaded)
 embed_model = None
 
@@ -47,23 +97,148 @@ def get_or_init_model():
         print("✅ Embedding model loaded!")
     return embed_model
 
-# Initialize Pinecone
-print("🔧 Initializing Pinecone...")
-pinecone_client.init_index()
-print("✅ Pinecone initialized!")
+# Optional pool of embedding worker processes (EMBED_WORKERS=0 encodes in-process)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+# Longest wait for the pool to return one embedding call (uploads have no request deadline)
+EMBED_TIMEOUT_SECONDS = float(os.getenv("EMBED_TIMEOUT_SECONDS", "300"))
+embed_pool = None
+
+async def embed_texts(texts, lane=QUERY_LANE):
+    """
+    Embed a list of texts without blocking the event loop
+
+    Args:
+        texts: List of strings to embed
+        lane: QUERY_LANE for interactive requests, BULK_LANE for ingestion
+
+    Returns:
+        float32 numpy array of shape (len(texts), dimension)
+    """
+    with metrics.stage("embed"):
+        if embed_pool is not None:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(embed_pool.submit(texts, lane)), EMBED_TIMEOUT_SECONDS
+            )
+        model = get_or_init_model()
+        return await run_in_threadpool(model.encode, texts)
+
+# Stop event of the background summary/flashcard generator (PRECOMPUTE_ARTIFACTS=1)
+artifact_worker = None
+
+# Long-running asyncio tasks (quiz jobs); referenced here so they aren't garbage-collected
+background_tasks = set()
+
+# Warmup state, filled in by the background startup task and read by /ready
+warmup_state = {
+    "model": False,
+    "index": False,
+    "error": None,
+    "attempts": 0,
+    "started_at": None,
+    "ready_at": None,
+}
+# Failed warmups are retried with exponential backoff until they succeed
+WARMUP_RETRY_SECONDS = 2
+WARMUP_MAX_RETRY_SECONDS = 60
+warmup_stop = threading.Event()
+
+def warmup():
+    """Load the embedding model and connect to Pinecone (runs in a worker thread), retrying until it works"""
+    warmup_state["started_at"] = time.time()
+    delay = WARMUP_RETRY_SECONDS
+    while not warmup_stop.is_set():
+        warmup_state["attempts"] += 1
+        try:
+            if not warmup_state["index"]:
+                print("🔧 Initializing Pinecone...")
+                pinecone_client.init_index()
+                warmup_state["index"] = True
+                print("✅ Pinecone initialized!")
+
+            if embed_pool is not None:
+                embed_pool.wait_ready()
+            else:
+                model = get_or_init_model()
+                # Run one encode so the first real query doesn't pay for lazy kernel setup
+                model.encode(["warmup"])
+            warmup_state["model"] = True
+
+            warmup_state["error"] = None
+            warmup_state["ready_at"] = time.time()
+            print(f"✅ Warmup finished in {warmup_state['ready_at'] - warmup_state['started_at']:.1f}s")
+            return
+        except Exception as e:
+            warmup_state["error"] = str(e)
+            print(f"❌ Warmup failed (attempt {warmup_state['attempts']}): {e}; retrying in {delay}s")
+            warmup_stop.wait(delay)
+            delay = min(delay * 2, WARMUP_MAX_RETRY_SECONDS)
+
+@app.on_event("startup")
+async def start_warmup():
+    """Kick off warmup in the background so the server starts accepting connections immediately"""
+    global embed_pool
+    if EMBED_WORKERS > 0:
+        embed_pool = EmbeddingPool(EMBED_WORKERS, dimension=pinecone_client.DIMENSION)
+        embed_pool.start()
+
+    loop = asyncio.get_running_loop()
+    app.state.warmup_task = loop.run_in_executor(None, warmup)
+
+    # Precompute summaries and flashcards whenever the LLM is idle
+    global artifact_worker
+    if study_artifacts.PRECOMPUTE_ARTIFACTS:
+        artifact_worker = study_artifacts.start_background_worker()
+
+@app.on_event("shutdown")
+async def stop_embed_pool():
+    """Stop the embedding workers, if any"""
+    warmup_stop.set()
+    if embed_pool is not None:
+        embed_pool.close()
+    if artifact_worker is not None:
+        artifact_worker.set()
 
 # Pydantic models
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = "default"
     mode: Optional[str] = "answer"  # answer, summarize, quiz, flashcard
-    top_k: Optional[int] = 10  # Increased from 5 to get more context
+    top_k: Optional[int] = None  # fixed number of chunks; None picks it per question (adaptive_depth.py)
+    retrieval: Optional[str] = "dense"  # dense, lexical (BM25 only), hybrid (rank fusion)
+    subject: Optional[str] = None  # only search this subject's notes
+    chapter: Optional[str] = None  # only search this chapter's notes
+    scope: Optional[str] = "query"  # query, or document/chapter for a whole-document summary or flashcard set
+    document: Optional[str] = None  # source filename when scope is "document"
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    session_id: Optional[str] = "default"
+    mode: Optional[str] = "answer"
+    top_k: Optional[int] = None
+    retrieval: Optional[str] = "dense"
+    subject: Optional[str] = None
+    chapter: Optional[str] = None
+
+MAX_BATCH_QUESTIONS = 100
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+CHAT_SCOPES = ("query",) + study_artifacts.ARTIFACT_SCOPES
+
+class QuizJobRequest(BaseModel):
+    topics: List[str]
+    num_questions: int = 5
+    subject: Optional[str] = None
+
+MAX_QUIZ_TOPICS = 30
+QUIZ_STREAM_MAX_SECONDS = 1800  # a stream ends after this long even if the job hasn't
+UPLOAD_BLOCK_SIZE = 1024 * 1024  # bytes read (and hashed) per step while streaming an upload
 
 class ChatResponse(BaseModel):
     answer: str
     context_used: List[str]
     sources: List[str]
     timestamp: str
+    degraded: List[str] = []  # "lexical_only" (vector store down), "sources_only" (no generated answer)
+    retrieval_depth: int = 0  # chunks retrieved for the prompt
 
 class UploadResponse(BaseModel):
     status: str
@@ -76,9 +251,7 @@ class StatusResponse(BaseModel):
     pinecone_status: str
     llm_status: str
     models_available: List[str]
-
-# In-memory conversation storage (use database in production)
-conversations = {}
+    breakers: dict = {}
 
 @app.get("/")
 async def root():
@@ -87,40 +260,107 @@ async def root():
         "message": "Study Jarvis API is running! 🤖",
         "version": "1.0.0",
         "endpoints": {
+            "/live": "Liveness probe",
+            "/ready": "Readiness probe (model and index warmed up)",
             "/status": "Check system status",
             "/upload": "Upload notes (PDF, DOCX, TXT)",
+            "/upload/batch": "Upload many files or zip archives at once (streams NDJSON)",
             "/chat": "Ask questions about your notes",
-            "/history": "Get conversation history"
+            "/chat/batch": "Ask many questions at once (streams NDJSON)",
+            "/history": "Get conversation history",
+            "/quiz/jobs": "Generate quizzes for many topics in one job"
         }
     }
 
+@app.get("/live")
+async def live():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: only returns 200 once the model and index are warm"""
+    is_ready = warmup_state["model"] and warmup_state["index"]
+    body = {
+        "status": "ready" if is_ready else "warming_up",
+        "model_loaded": warmup_state["model"],
+        "index_ready": warmup_state["index"],
+    }
+    if warmup_state["error"]:
+        # Still retrying in the background; this is the most recent failure
+        body["status"] = "retrying"
+        body["error"] = warmup_state["error"]
+        body["attempts"] = warmup_state["attempts"]
+    if is_ready:
+        body["warmup_seconds"] = round(warmup_state["ready_at"] - warmup_state["started_at"], 3)
+        return body
+    return JSONResponse(status_code=503, content=body)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: per-stage latency, LLM speed, cache hit ratios, ingestion throughput"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
-    """Check status of all services"""
+    """
+    Check status of all services
+
+    breakers shows this worker's circuit breakers; while one is not closed the
+    API answers in a degraded mode and status is "degraded".
+    """
     llm_status = llm_client.check_ollama_status()
+    breakers = resilience.breaker_status()
+    vector_store = breakers[resilience.VECTOR_STORE_BREAKER.name]["state"]
 
     return StatusResponse(
-        status="online",
-        pinecone_status="connected",
+        status="online" if all(b["state"] == "closed" for b in breakers.values()) else "degraded",
+        pinecone_status="connected" if vector_store == "closed" else f"unavailable (circuit {vector_store})",
         llm_status=llm_status["status"],
-        models_available=llm_status.get("models", [])
+        models_available=llm_status.get("models", []),
+        breakers=breakers
     )
 
+# (corpus version, body) of the last /documents scan made after the index settled
+_documents_cache = (None, None)
+
 @app.get("/documents")
-async def get_documents():
-    """Get list of uploaded documents and their statistics"""
+async def get_documents(request: Request, response: Response):
+    """
+    Get list of uploaded documents and their statistics
+
+    The ETag follows the corpus version, so polling an unchanged library
+    costs one SQLite lookup and a 304 instead of an index scan.
+    """
+    global _documents_cache
     try:
-        stats = pinecone_client.get_document_stats()
-        return {
-            "status": "success",
-            "total_vectors": stats['total_vectors'],
-            "documents": stats['documents'],
-            "document_count": len(stats['documents'])
-        }
+        version, changed_at = await run_in_threadpool(get_version, pinecone_client.CORPUS_VERSION)
+        settled = time.time() - changed_at > http_cache.INDEX_CONSISTENCY_SECONDS
+        etag = http_cache.make_etag("documents", version) if settled else None
+        last_modified = changed_at if settled and changed_at else None
+        if etag:
+            cached = http_cache.not_modified(request, etag, last_modified)
+            if cached is not None:
+                return cached
+
+        body = _documents_cache[1] if settled and _documents_cache[0] == version else None
+        metrics.record_cache("documents", body is not None)
+        if body is None:
+            stats = await run_in_threadpool(pinecone_client.get_document_stats)
+            body = {
+                "status": "success",
+                "total_vectors": stats['total_vectors'],
+                "documents": stats['documents'],
+                "document_count": len(stats['documents'])
+            }
+            if settled:
+                _documents_cache = (version, body)
+        response.headers.update(http_cache.validator_headers(etag, last_modified))
+        return body
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting documents: {str(e)}")
 
-@app.delete("/documents/{source_name}")
+@app.delete("/documents/{source_name:path}")
 async def delete_document(source_name: str):
     """Delete a specific document by source name"""
     try:
@@ -128,7 +368,7 @@ async def delete_document(source_name: str):
         from urllib.parse import unquote
         decoded_source = unquote(source_name)
 
-        result = pinecone_client.delete_document(decoded_source)
+        result = await run_in_threadpool(remove_document, decoded_source)
 
         if result['success']:
             return {
@@ -162,59 +402,74 @@ async def upload_notes(
                 detail=f"Unsupported file type: {ext}. Please upload PDF, DOCX, or TXT files."
             )
 
-        # Save to temporary file
+        # Stream to a temporary file, hashing the bytes on the way
+        started = time.perf_counter()
+        hasher = file_cache.new_hasher()
         with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
+            while block := await file.read(UPLOAD_BLOCK_SIZE):
+                hasher.update(block)
+                tmp_file.write(block)
             tmp_path = tmp_file.name
+        content_hash = hasher.hexdigest()
 
-        # Extract text
-        text = extract_text(tmp_path)
+        try:
+            # Same bytes, name and settings as an earlier upload: nothing to do
+            existing = await run_in_threadpool(
+                file_cache.find_ingested, filename, content_hash, subject, chapter, CHUNKING
+            )
+            if existing is not None:
+                return UploadResponse(
+                    status="success",
+                    filename=filename,
+                    chunks_created=existing,
+                    message=f"{filename} is unchanged; already stored as {existing} chunks"
+                )
 
-        if not text.strip():
+            # Extract text (cached per file hash)
+            with metrics.stage("extract"):
+                text = await run_in_threadpool(extract_text_cached, tmp_path, content_hash)
+        finally:
             os.unlink(tmp_path)
+
+        if not text.strip():
             raise HTTPException(
                 status_code=400,
                 detail="No text could be extracted from the file"
             )
 
-        # Chunk text
-        chunks = chunk_text(text, chunk_size=500, overlap=50)
-
-        # Create embeddings
-        model = get_or_init_model()
-        embeddings = model.encode(chunks)
-
-        # Prepare vectors for Pinecone
-        vectors = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vector_id = str(uuid.uuid4())
-            metadata = {
-                "text": chunk,
-                "source": filename,
-                "chunk_index": i,
-                "upload_time": datetime.now().isoformat()
-            }
+        # A new version of an earlier upload replaces it rather than adding to it
+        if await run_in_threadpool(file_cache.ingested_hash, filename) is not None:
+            await run_in_threadpool(remove_document, filename)
 
-            if subject:
-                metadata["subject"] = subject
-            if chapter:
-                metadata["chapter"] = chapter
+        # Chunk text
+        with metrics.stage("chunk"):
+            chunks = list(iter_chunks(text))
 
-            vectors.append((vector_id, embedding.tolist(), metadata))
+        # Collapse near-duplicate chunks so only new content is embedded
+        with metrics.stage("dedup"):
+            plan = await run_in_threadpool(prepare_chunks, chunks, filename, subject)
 
-        # Upload to Pinecone
-        success = pinecone_client.upsert_vectors(vectors)
+        # Create embeddings (bulk lane so interactive queries stay fast)
+        embeddings = await embed_texts(plan.new_texts, lane=BULK_LANE) if plan.new_texts else []
 
-        # Cleanup
-        os.unlink(tmp_path)
+        # Upload to Pinecone and the lexical index
+        with metrics.stage("store"):
+            success, _ = await run_in_threadpool(
+                store_chunks, plan, embeddings, filename, subject, chapter,
+                {"upload_time": datetime.now().isoformat()}
+            )
 
         if success:
+            metrics.record_ingest(len(chunks), time.perf_counter() - started)
+            await run_in_threadpool(
+                file_cache.record_ingested, filename, content_hash, subject, chapter, CHUNKING, len(chunks)
+            )
             return UploadResponse(
                 status="success",
                 filename=filename,
                 chunks_created=len(chunks),
                 message=f"Successfully processed {filename} into {len(chunks)} chunks"
+                + (f" ({plan.duplicates} near-duplicates collapsed)" if plan.duplicates else "")
             )
         else:
             raise HTTPException(
@@ -227,6 +482,225 @@ async def upload_notes(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@app.post("/upload/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    subject: Optional[str] = Form(None),
+    chapter: Optional[str] = Form(None)
+):
+    """
+    Upload many notes files, or zip archives of them, in one request
+
+    Archive entries are read without extracting the archive, and files are
+    encoded and upserted in combined batches (see batch_upload). Results
+    stream back as NDJSON, one line per file in upload order, followed by a
+    summary line with "done": true.
+    """
+    uploads = [(file.filename, file.file) for file in files]
+
+    async def stream_results():
+        started = time.perf_counter()
+        summary = {"files": 0, "succeeded": 0, "unchanged": 0, "failed": 0, "chunks_created": 0}
+        async for result in batch_upload.ingest(
+            uploads, lambda texts: embed_texts(texts, lane=BULK_LANE), subject, chapter
+        ):
+            summary["files"] += 1
+            summary[{"success": "succeeded", "unchanged": "unchanged"}.get(result["status"], "failed")] += 1
+            if result["status"] == "success":
+                summary["chunks_created"] += result["chunks_created"]
+            yield json.dumps(result) + "\n"
+        summary["seconds"] = round(time.perf_counter() - started, 2)
+        print(f"✅ Batch upload: {summary['succeeded']} stored, {summary['unchanged']} unchanged, "
+              f"{summary['failed']} failed ({summary['chunks_created']} chunks, {summary['seconds']}s)")
+        yield json.dumps({"done": True, **summary}) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def build_context(matches):
+    """Turn vector matches into source-labeled context chunks and a de-duplicated source list"""
+    context_chunks = []
+    sources = []
+
+    for match in matches:
+        if match.get('metadata'):
+            text = match['metadata'].get('text', '')
+            chunk_sources = match['metadata'].get('sources') or [match['metadata'].get('source', 'Unknown')]
+
+            # Prefix each chunk with its source(s) so the LLM can cite and quote from it
+            labeled_chunk = f"[source={', '.join(chunk_sources)}]\n{text}"
+            context_chunks.append(labeled_chunk)
+            for source in chunk_sources:
+                if source not in sources:
+                    sources.append(source)
+
+    return context_chunks, sources
+
+async def retrieve(question, query_embedding, top_k, retrieval="dense", subject=None, chapter=None):
+    """
+    Fetch the most relevant chunks for a question
+
+    Args:
+        top_k: Number of chunks, or None to over-fetch and cut at the
+            relevance cliff (see adaptive_depth.py)
+        retrieval: "dense" (Pinecone), "lexical" (in-process BM25, no embedding
+            needed) or "hybrid" (reciprocal-rank fusion of both)
+        subject: Only search this subject's partition
+        chapter: Only return chunks from this chapter
+
+    Returns:
+        (matches, degraded) where degraded lists "lexical_only" when the
+        vector store failed and BM25 results were used instead
+    """
+    filter = {}
+    if subject:
+        filter["subject"] = subject
+    if chapter:
+        filter["chapter"] = chapter
+    filter = filter or None
+    # A subject routes the query to its own namespace; otherwise search every partition
+    namespaces = [pinecone_client.subject_namespace(subject)] if subject else None
+    adaptive = top_k is None
+    fetch_k = adaptive_depth.RETRIEVAL_MAX_K if adaptive else top_k
+
+    def lexical_search():
+        matches = lexical_index.search(question, top_k=fetch_k, filter=filter)
+        return adaptive_depth.cut(matches, relative=True) if adaptive else matches
+
+    if retrieval == "lexical":
+        return lexical_search(), []
+
+    try:
+        dense_filter = pinecone_client.metadata_filter(filter)
+        if summary_vectors.HIERARCHICAL_RETRIEVAL:
+            # Two-stage: pick the best documents by centroid, then search only their chunks
+            narrowed = await run_in_threadpool(summary_vectors.narrow_filter, query_embedding, dense_filter)
+            if narrowed is not None:
+                dense_filter = narrowed
+
+        dense = await run_in_threadpool(
+            pinecone_client.query_partitions,
+            query_embedding=query_embedding,
+            top_k=fetch_k,
+            filter=dense_filter,
+            namespaces=namespaces
+        )
+    except Exception as e:
+        # The lexical index lives in-process, so it still answers while the vector store is down
+        print(f"⚠️  Vector search failed ({e}); using lexical retrieval")
+        return lexical_search(), ["lexical_only"]
+
+    if retrieval == "hybrid":
+        lexical = lexical_index.search(question, top_k=fetch_k, filter=filter)
+        fused = lexical_index.reciprocal_rank_fusion([dense, lexical], top_k=fetch_k)
+        if adaptive:
+            # Fused scores only encode rank, so the dense similarities set the depth
+            if dense:
+                return adaptive_depth.cut(fused, scores=[m.get("score", 0) for m in dense]), []
+            return adaptive_depth.cut(fused, scores=[m.get("score", 0) for m in lexical], relative=True), []
+        return fused, []
+    if adaptive:
+        dense = adaptive_depth.cut(dense)
+    return dense, []
+
+def sources_only_answer(matches, error):
+    """Stand-in answer when the LLM is unavailable: the best passages, quoted"""
+    lines = [f"⚠️ The language model is unavailable right now ({error}), so this is not a generated answer."]
+    excerpts = [m for m in matches if m.get("metadata", {}).get("text")][:DEGRADED_EXCERPTS]
+    if not excerpts:
+        lines.append("No relevant passages were found in your notes.")
+    else:
+        lines.append("The most relevant passages from your notes:")
+        for match in excerpts:
+            metadata = match["metadata"]
+            text = " ".join(metadata["text"].split())
+            if len(text) > DEGRADED_EXCERPT_CHARS:
+                text = text[:DEGRADED_EXCERPT_CHARS].rsplit(" ", 1)[0] + " …"
+            source = ", ".join(metadata.get("sources") or [metadata.get("source", "Unknown")])
+            lines.append(f"- [{source}] {text}")
+    return "\n\n".join(lines)
+
+async def answer_question(question, query_embedding, session_id, mode, top_k, retrieval="dense",
+                          subject=None, chapter=None):
+    """
+    Run the RAG pipeline for one question whose embedding is already computed
+    (query_embedding may be None for lexical retrieval)
+
+    Retrieval and generation run in the threadpool so many questions can be
+    in flight at once; generation is throttled by llm_client's queue.
+
+    If the LLM is unavailable (or the request deadline runs out) the answer
+    is the retrieved passages themselves, flagged as degraded.
+    """
+    # Retrieve relevant chunks
+    with metrics.stage("retrieve"):
+        matches, degraded = await retrieve(question, query_embedding, top_k, retrieval, subject, chapter)
+
+    # Build prompt based on mode
+    with metrics.stage("prompt"):
+        context_chunks, sources = build_context(matches)
+        prompt = llm_client.build_study_prompt(
+            context_chunks=context_chunks,
+            user_question=question,
+            mode=mode
+        )
+
+    # Query LLM (timed as llm_queue + generate inside llm_client)
+    try:
+        answer = await llm_client.agenerate(prompt)
+    except LLM_ERRORS as e:
+        print(f"⚠️  Answering with sources only: {e}")
+        answer = sources_only_answer(matches, e)
+        degraded = degraded + ["sources_only"]
+
+    # Store conversation (shared across workers via SQLite)
+    message = {
+        "timestamp": datetime.now().isoformat(),
+        "question": question,
+        "answer": answer,
+        "mode": mode,
+        "sources": sources
+    }
+    if degraded:
+        message["degraded"] = degraded
+    await run_in_threadpool(session_store.append_message, session_id, message)
+
+    return {
+        "answer": answer,
+        "context_used": context_chunks[:3],  # Return top 3 contexts
+        "sources": sources,
+        "timestamp": datetime.now().isoformat(),
+        "degraded": degraded,
+        "retrieval_depth": len(matches)
+    }
+
+async def answer_from_artifact(scope, name, mode, session_id):
+    """
+    Answer a whole-document or whole-chapter summarize/flashcard request from
+    its stored artifact, generating (and storing) it first if it isn't ready
+    """
+    label = study_artifacts.artifact_label(scope, name)
+    artifact = await run_in_threadpool(study_artifacts.get_artifact, scope, name, mode)
+    metrics.record_cache("study_artifacts", artifact is not None)
+    if artifact is None:
+        artifact = await run_in_threadpool(study_artifacts.build_artifact, scope, name, mode)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail=f"No notes found for {scope} '{label}'")
+
+    await run_in_threadpool(session_store.append_message, session_id, {
+        "timestamp": datetime.now().isoformat(),
+        "question": f"{mode} {scope}: {label}",
+        "answer": artifact["content"],
+        "mode": mode,
+        "sources": artifact["sources"]
+    })
+
+    return {
+        "answer": artifact["content"],
+        "context_used": [],
+        "sources": artifact["sources"],
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -237,81 +711,148 @@ async def chat(request: ChatRequest):
     - summarize: Summarize notes on a topic
     - quiz: Generate quiz questions
     - flashcard: Create flashcards
+
+    With scope "document" (plus document) or "chapter" (plus chapter, and
+    subject when several subjects have a chapter of that name),
+    summarize/flashcard cover the whole document or chapter and are served
+    from precomputed artifacts; message is ignored.
     """
+    if request.retrieval not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"retrieval must be one of {RETRIEVAL_MODES}")
+    if request.scope not in CHAT_SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope must be one of {CHAT_SCOPES}")
+
+    if request.scope != "query":
+        if request.mode not in study_artifacts.ARTIFACT_KINDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"scope '{request.scope}' only supports modes {study_artifacts.ARTIFACT_KINDS}"
+            )
+        name = request.document if request.scope == "document" else request.chapter
+        if not name:
+            raise HTTPException(status_code=400, detail=f"scope '{request.scope}' requires {request.scope}")
+        try:
+            if request.scope == "chapter":
+                subject = request.subject
+                if not subject:
+                    subjects = await run_in_threadpool(study_artifacts.chapter_subjects, name)
+                    if len(subjects) > 1:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"Chapter '{name}' exists in several subjects {subjects}; pass subject"
+                        )
+                    subject = subjects[0] if subjects else None
+                name = study_artifacts.chapter_key(subject, name)
+            result = await answer_from_artifact(request.scope, name, request.mode, request.session_id)
+            return ChatResponse(**result)
+        except HTTPException:
+            raise
+        except LLM_ERRORS as e:
+            # Not precomputed yet, and there is nothing to build it with
+            raise unavailable(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
+
     try:
-        # Create embedding for query
-        model = get_or_init_model()
-        query_embedding = model.encode([request.message])[0].tolist()
+        # Create embedding for query (lexical retrieval doesn't need one)
+        query_embedding = None
+        if request.retrieval != "lexical":
+            query_embedding = (await embed_texts([request.message]))[0].tolist()
 
-        # Retrieve relevant chunks from Pinecone
-        matches = pinecone_client.query_vectors(
-            query_embedding=query_embedding,
-            top_k=request.top_k
+        result = await answer_question(
+            request.message, query_embedding, request.session_id, request.mode,
+            request.top_k, request.retrieval, request.subject, request.chapter
         )
+        return ChatResponse(**result)
 
-        # Extract context and sources
-        context_chunks = []
-        sources = []
-
-        for match in matches:
-            if match.get('metadata'):
-                text = match['metadata'].get('text', '')
-                source = match['metadata'].get('source', 'Unknown')
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
-                # Prefix each chunk with its source so the LLM can cite and quote from it
-                labeled_chunk = f"[source={source}]\n{text}"
-                context_chunks.append(labeled_chunk)
-                if source not in sources:
-                    sources.append(source)
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Answer many questions in one call
 
-        # Build prompt based on mode
-        prompt = llm_client.build_study_prompt(
-            context_chunks=context_chunks,
-            user_question=request.message,
-            mode=request.mode
+    All questions are embedded in a single batched pass, then retrieval and
+    generation run concurrently. Results stream back as NDJSON, one line per
+    question in completion order; each line carries the question's index.
+    """
+    questions = request.questions
+    if not questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch"
         )
 
-        # Query LLM
-        answer = llm_client.query_llm(prompt)
-
-        # Store conversation
-        if request.session_id not in conversations:
-            conversations[request.session_id] = []
-
-        conversations[request.session_id].append({
-            "timestamp": datetime.now().isoformat(),
-            "question": request.message,
-            "answer": answer,
-            "mode": request.mode,
-            "sources": sources
-        })
-
-        return ChatResponse(
-            answer=answer,
-            context_used=context_chunks[:3],  # Return top 3 contexts
-            sources=sources,
-            timestamp=datetime.now().isoformat()
-        )
+    if request.retrieval not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"retrieval must be one of {RETRIEVAL_MODES}")
 
+    try:
+        if request.retrieval == "lexical":
+            embeddings = [None] * len(questions)
+        else:
+            embeddings = [e.tolist() for e in await embed_texts(questions)]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error embedding questions: {str(e)}")
+
+    async def run_one(index, question, embedding):
+        try:
+            result = await answer_question(
+                question, embedding, request.session_id, request.mode,
+                request.top_k, request.retrieval, request.subject, request.chapter
+            )
+            return {"index": index, "question": question, **result}
+        except Exception as e:
+            return {"index": index, "question": question, "error": str(e)}
+
+    async def stream_results():
+        tasks = [
+            asyncio.create_task(run_one(i, q, emb))
+            for i, (q, emb) in enumerate(zip(questions, embeddings))
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away: don't keep generating answers nobody will read
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 @app.get("/history/{session_id}")
-async def get_history(session_id: str):
-    """Get conversation history for a session"""
-    if session_id not in conversations:
-        return {"session_id": session_id, "messages": []}
+async def get_history(request: Request, response: Response, session_id: str,
+                      cursor: Optional[int] = None, limit: int = 50):
+    """
+    Get conversation history for a session, one page at a time
 
+    Pass the returned next_cursor back as ?cursor= to fetch the following page.
+    Re-fetching an unchanged page returns 304 (ETag follows the session's
+    newest message).
+    """
+    last_id, last_active = await run_in_threadpool(session_store.get_version, session_id)
+    etag = http_cache.make_etag("history", session_id, last_id, cursor, limit)
+    cached = http_cache.not_modified(request, etag, last_active)
+    if cached is not None:
+        return cached
+
+    messages, next_cursor = await run_in_threadpool(
+        session_store.get_messages, session_id, cursor, limit
+    )
+    response.headers.update(http_cache.validator_headers(etag, last_active))
     return {
         "session_id": session_id,
-        "messages": conversations[session_id]
+        "messages": messages,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
     }
 
 @app.delete("/history/{session_id}")
 async def clear_history(session_id: str):
     """Clear conversation history for a session"""
-    if session_id in conversations:
-        del conversations[session_id]
+    if await run_in_threadpool(session_store.clear_session, session_id):
         return {"message": f"History cleared for session {session_id}"}
     return {"message": "Session not found"}
 
@@ -324,39 +865,174 @@ async def generate_quiz(
     """Generate a quiz based on notes"""
     try:
         # Create embedding for topic
-        model = get_or_init_model()
-        query_embedding = model.encode([topic])[0].tolist()
-
-        # Build filter if subject provided
-        filter_dict = {"subject": subject} if subject else None
+        query_embedding = (await embed_texts([topic]))[0].tolist()
 
-        # Retrieve relevant chunks
-        matches = pinecone_client.query_vectors(
-            query_embedding=query_embedding,
-            top_k=10,
-            filter=filter_dict
-        )
-
-        context_chunks = [m['metadata'].get('text', '') for m in matches if m.get('metadata')]
+        # Retrieve relevant chunks (from the subject's partition if provided)
+        with metrics.stage("retrieve"):
+            matches, degraded = await retrieve(topic, query_embedding, None, subject=subject)
 
         # Generate quiz
-        prompt = llm_client.build_study_prompt(
-            context_chunks=context_chunks,
-            user_question=str(num_questions),
-            mode="quiz"
-        )
+        with metrics.stage("prompt"):
+            context_chunks = [m['metadata'].get('text', '') for m in matches if m.get('metadata')]
+            prompt = llm_client.build_study_prompt(
+                context_chunks=context_chunks,
+                user_question=str(num_questions),
+                mode="quiz"
+            )
 
-        quiz = llm_client.query_llm(prompt, max_tokens=1024)
+        quiz = await llm_client.agenerate(prompt, max_tokens=1024)
 
         return {
             "topic": topic,
             "num_questions": num_questions,
-            "quiz": quiz
+            "quiz": quiz,
+            "degraded": degraded,
+            "retrieval_depth": len(matches)
         }
 
+    except LLM_ERRORS as e:
+        raise unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
+def split_shared_chunks(matches_per_topic):
+    """
+    Give each retrieved chunk to only one topic
+
+    A chunk that several topics retrieved stays with the topic it scored
+    highest for, so the generated quizzes don't repeat each other. A topic
+    never loses its single best chunk.
+    """
+    owner = {}
+    for topic_index, matches in enumerate(matches_per_topic):
+        for match in matches:
+            best = owner.get(match['id'])
+            if best is None or match.get('score', 0) > best[1]:
+                owner[match['id']] = (topic_index, match.get('score', 0))
+
+    result = []
+    for topic_index, matches in enumerate(matches_per_topic):
+        kept = [m for m in matches if owner[m['id']][0] == topic_index]
+        if not kept and matches:
+            kept = matches[:1]
+        result.append(kept)
+    return result
+
+async def quiz_job_heartbeat(job_id):
+    """Tell other workers this job is still alive until the task is cancelled"""
+    while True:
+        try:
+            await run_in_threadpool(quiz_jobs.heartbeat, job_id)
+        except Exception as e:
+            print(f"⚠️  Quiz job {job_id} heartbeat failed: {e}")
+        await asyncio.sleep(quiz_jobs.JOB_HEARTBEAT_SECONDS)
+
+async def run_quiz_job(job_id, topics, num_questions, subject):
+    """Batch-embed topics, retrieve in parallel, then generate every quiz concurrently"""
+    heartbeat_task = None
+    try:
+        await run_in_threadpool(quiz_jobs.set_job_status, job_id, "running")
+        heartbeat_task = asyncio.create_task(quiz_job_heartbeat(job_id))
+        embeddings = await embed_texts(topics)
+
+        with metrics.stage("retrieve"):
+            matches_per_topic = await asyncio.gather(*(
+                retrieve(topic, embedding.tolist(), None, subject=subject)
+                for topic, embedding in zip(topics, embeddings)
+            ))
+        matches_per_topic = split_shared_chunks([matches for matches, _ in matches_per_topic])
+
+        async def generate_one(index, matches):
+            try:
+                context_chunks, sources = build_context(matches)
+                prompt = llm_client.build_study_prompt(
+                    context_chunks=context_chunks,
+                    user_question=str(num_questions),
+                    mode="quiz"
+                )
+                # Waits in llm_client's generation queue alongside chat traffic
+                quiz = await llm_client.agenerate(prompt, max_tokens=1024)
+                await run_in_threadpool(quiz_jobs.finish_item, job_id, index, quiz, sources)
+            except Exception as e:
+                await run_in_threadpool(quiz_jobs.finish_item, job_id, index, None, None, str(e))
+
+        await asyncio.gather(*(
+            generate_one(index, matches) for index, matches in enumerate(matches_per_topic)
+        ))
+        await run_in_threadpool(quiz_jobs.set_job_status, job_id, "completed")
+        print(f"✅ Quiz job {job_id} finished ({len(topics)} topics)")
+    except Exception as e:
+        print(f"❌ Quiz job {job_id} failed: {e}")
+        await run_in_threadpool(quiz_jobs.set_job_status, job_id, "failed", str(e))
+    finally:
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+
+@app.post("/quiz/jobs")
+async def create_quiz_job(request: QuizJobRequest):
+    """
+    Start generating quizzes for many topics at once
+
+    Returns immediately with a job_id. Poll GET /quiz/jobs/{job_id} or stream
+    GET /quiz/jobs/{job_id}/stream for results.
+    """
+    topics = [t.strip() for t in request.topics if t.strip()]
+    if not topics:
+        raise HTTPException(status_code=400, detail="topics must not be empty")
+    if len(topics) > MAX_QUIZ_TOPICS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUIZ_TOPICS} topics per job")
+
+    job_id = await run_in_threadpool(
+        quiz_jobs.create_job, topics, request.num_questions, request.subject
+    )
+    task = asyncio.create_task(
+        run_quiz_job(job_id, topics, request.num_questions, request.subject)
+    )
+    # Keep a reference so the task isn't garbage-collected mid-run
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+    return {"job_id": job_id, "status": "pending", "total": len(topics)}
+
+@app.get("/quiz/jobs/{job_id}")
+async def get_quiz_job(job_id: str):
+    """Get the status of a quiz job and every quiz finished so far"""
+    job = await run_in_threadpool(quiz_jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Quiz job not found")
+    return job
+
+@app.get("/quiz/jobs/{job_id}/stream")
+async def stream_quiz_job(job_id: str):
+    """Stream a quiz job's items as NDJSON as each topic finishes"""
+    job = await run_in_threadpool(quiz_jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Quiz job not found")
+
+    async def stream_items():
+        sent = set()
+        current = job
+        started = time.monotonic()
+        while True:
+            for item in current["items"]:
+                if item["status"] != "pending" and item["index"] not in sent:
+                    sent.add(item["index"])
+                    yield json.dumps(item) + "\n"
+            if current["status"] in ("completed", "failed"):
+                yield json.dumps({"job_id": job_id, "status": current["status"], "done": True}) + "\n"
+                return
+            if time.monotonic() - started > QUIZ_STREAM_MAX_SECONDS:
+                yield json.dumps({
+                    "job_id": job_id, "status": current["status"], "done": False,
+                    "error": f"Stream closed after {QUIZ_STREAM_MAX_SECONDS}s; poll /quiz/jobs/{job_id} for the rest"
+                }) + "\n"
+                return
+            # The job may be running in another worker, so poll the shared store
+            await asyncio.sleep(0.25)
+            current = await run_in_threadpool(quiz_jobs.get_job, job_id)
+
+    return StreamingResponse(stream_items(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     print("\n🚀 Starting Study Jarvis Backend...")
@@ -0,0 +1,278 @@
+"""
+Batch Upload
+Ingest many files, or the notes inside zip archives, in one request. Archive
+entries are read straight out of the upload (nothing is extracted to disk)
+and every file flows through a three-stage pipeline:
+
+    prepare (hash, extract, chunk, plan) → encode → store
+
+Encoding batches chunks across files and storing does one combined upsert
+per batch, so the model and Pinecone see a few large calls instead of one
+per file, and extracting the next files overlaps with encoding and storing
+the previous ones.
+"""
+import io
+import os
+import time
+import asyncio
+import zipfile
+from datetime import datetime
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+import file_cache
+from near_dup import PendingChunks
+from ingest_notes import (
+    CHUNKING, SUPPORTED_EXTENSIONS, extract_text_cached, iter_chunks, prepare_chunks, remove_document, store_many
+)
+
+load_dotenv()
+
+# Chunks encoded and upserted together (files are never split across batches)
+UPLOAD_BATCH_CHUNKS = int(os.getenv("UPLOAD_BATCH_CHUNKS", "200"))
+# Largest file or archive entry accepted, and most data one archive may expand to
+UPLOAD_MAX_FILE_MB = float(os.getenv("UPLOAD_MAX_FILE_MB", "100"))
+UPLOAD_MAX_ARCHIVE_MB = float(os.getenv("UPLOAD_MAX_ARCHIVE_MB", "1024"))
+
+PIPELINE_DEPTH = 4  # files (or batches) waiting between stages
+
+def _skip(name):
+    # Folders' hidden files, macOS resource forks and Office lock files (~$notes.docx)
+    return any(part.startswith((".", "~$", "__MACOSX")) for part in name.split("/"))
+
+def _read_capped(stream, limit):
+    data = stream.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"File is larger than {UPLOAD_MAX_FILE_MB:g} MB")
+    return data
+
+def iter_entries(uploads):
+    """
+    Read every note out of the uploads, in order
+
+    Args:
+        uploads: (filename, binary file object) pairs; .zip files are opened
+            and their supported entries read one at a time
+
+    Yields:
+        (name, bytes, None) per note, or (name, None, error message)
+    """
+    max_file = int(UPLOAD_MAX_FILE_MB * 1024 * 1024)
+    for filename, stream in uploads:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext == ".zip":
+            yield from _iter_archive(filename, stream, max_file)
+        elif ext not in SUPPORTED_EXTENSIONS:
+            yield filename, None, f"Unsupported file type: {ext}"
+        else:
+            try:
+                yield filename, _read_capped(stream, max_file), None
+            except Exception as e:
+                yield filename, None, str(e)
+
+def _iter_archive(filename, stream, max_file):
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile as e:
+        yield filename, None, f"Not a valid zip archive: {e}"
+        return
+
+    budget = UPLOAD_MAX_ARCHIVE_MB * 1024 * 1024
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or _skip(name):
+                continue
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in SUPPORTED_EXTENSIONS:
+                yield name, None, f"Unsupported file type: {ext or '(none)'}"
+                continue
+            budget -= info.file_size
+            if budget < 0:
+                yield name, None, f"{filename} expands to more than {UPLOAD_MAX_ARCHIVE_MB:g} MB; stopped here"
+                return
+            try:
+                # The header's size can lie, so the read is capped too
+                with archive.open(info) as entry:
+                    yield name, _read_capped(entry, max_file), None
+            except Exception as e:
+                yield name, None, f"Could not read from {filename}: {e}"
+
+def prepare_entry(name, data, subject=None, chapter=None, pending=None):
+    """
+    Hash, extract, chunk and plan one file (runs in a worker thread)
+
+    Args:
+        pending: PendingChunks of the batch; the file is planned against the
+            store and the files planned before it
+
+    Returns:
+        Result dict; it carries "plan" while the file still needs encoding and storing
+    """
+    hasher = file_cache.new_hasher()
+    hasher.update(data)
+    content_hash = hasher.hexdigest()
+
+    existing = file_cache.find_ingested(name, content_hash, subject, chapter, CHUNKING)
+    if existing is not None:
+        return {
+            "filename": name,
+            "status": "unchanged",
+            "chunks_created": existing,
+            "message": f"{name} is unchanged; already stored as {existing} chunks",
+        }
+
+    with metrics.stage("extract"):
+        text = extract_text_cached(io.BytesIO(data), content_hash, ext=os.path.splitext(name)[1].lower())
+    if not text.strip():
+        return {"filename": name, "status": "error", "message": "No text could be extracted from the file"}
+
+    # A new version of an earlier upload replaces it rather than adding to it
+    if file_cache.ingested_hash(name) is not None:
+        remove_document(name)
+
+    with metrics.stage("chunk"):
+        chunks = list(iter_chunks(text))
+    with metrics.stage("dedup"):
+        plan = prepare_chunks(chunks, name, subject, pending)
+    return {"filename": name, "content_hash": content_hash, "chunks_created": len(chunks), "plan": plan}
+
+def _record_stored(items, subject, chapter):
+    for item in items:
+        file_cache.record_ingested(
+            item["filename"], item["content_hash"], subject, chapter, CHUNKING, item["chunks_created"]
+        )
+
+async def ingest(uploads, embed, subject=None, chapter=None):
+    """
+    Run uploads through the prepare → encode → store pipeline
+
+    Args:
+        uploads: (filename, binary file object) pairs; zip archives are expanded
+        embed: Coroutine function turning a list of texts into embeddings
+
+    Yields:
+        One result per file, in upload order, as soon as it is stored:
+        {"index", "filename", "status", "chunks_created", "message"} with
+        status "success", "unchanged" or "error"
+    """
+    prepared = asyncio.Queue(PIPELINE_DEPTH)
+    encoded = asyncio.Queue(PIPELINE_DEPTH)
+    results = asyncio.Queue()
+    pending = PendingChunks()
+
+    async def prepare_stage():
+        entries = iter_entries(uploads)
+        index = 0
+        try:
+            while (entry := await run_in_threadpool(next, entries, None)) is not None:
+                name, data, error = entry
+                if error is not None:
+                    item = {"filename": name, "status": "error", "message": error}
+                else:
+                    try:
+                        item = await run_in_threadpool(prepare_entry, name, data, subject, chapter, pending)
+                    except Exception as e:
+                        item = {"filename": name, "status": "error", "message": f"Error processing file: {e}"}
+                item["index"] = index
+                index += 1
+                await prepared.put(item)
+        finally:
+            await prepared.put(None)
+
+    async def encode_batch(batch):
+        planned = [item for item in batch if "plan" in item]
+        texts = [text for item in planned for text in item["plan"].new_texts]
+        try:
+            embeddings = await embed(texts) if texts else []
+        except Exception as e:
+            for item in planned:
+                del item["plan"]
+                item.update(status="error", message=f"Error creating embeddings: {e}")
+            return batch
+        offset = 0
+        for item in planned:
+            count = len(item["plan"].new_texts)
+            item["embeddings"] = embeddings[offset:offset + count]
+            offset += count
+        return batch
+
+    async def encode_stage():
+        batch, pending = [], 0
+        try:
+            while True:
+                item = await prepared.get()
+                if item is not None:
+                    batch.append(item)
+                    pending += len(item["plan"].new_texts) if "plan" in item else 0
+                if batch and (item is None or pending >= UPLOAD_BATCH_CHUNKS):
+                    await encoded.put(await encode_batch(batch))
+                    batch, pending = [], 0
+                if item is None:
+                    return
+        finally:
+            await encoded.put(None)
+
+    async def store_stage():
+        try:
+            while (batch := await encoded.get()) is not None:
+                # A file sharing chunks with an earlier one of the upload is stored after it,
+                # in the same upsert or a later one; if that file failed, so does this one
+                queued = set()
+                for item in batch:
+                    if "plan" not in item:
+                        continue
+                    plan = item["plan"]
+                    if any(earlier.stored_ids is None and earlier not in queued for earlier in plan.depends_on):
+                        del item["plan"]
+                        item.pop("embeddings", None)
+                        item.update(status="error", message="A file it shares chunks with failed to store; upload it again")
+                    else:
+                        queued.add(plan)
+                planned = [item for item in batch if "plan" in item]
+                if planned:
+                    started = time.perf_counter()
+                    try:
+                        with metrics.stage("store"):
+                            success, _ = await run_in_threadpool(
+                                store_many,
+                                [(item["plan"], item["embeddings"], item["filename"]) for item in planned],
+                                subject, chapter, {"upload_time": datetime.now().isoformat()}
+                            )
+                    except Exception as e:
+                        print(f"❌ Error storing upload batch: {e}")
+                        success = False
+                    if success:
+                        await run_in_threadpool(_record_stored, planned, subject, chapter)
+                        metrics.record_ingest(
+                            sum(item["chunks_created"] for item in planned), time.perf_counter() - started
+                        )
+                    for item in planned:
+                        plan = item.pop("plan")
+                        item.pop("embeddings", None)
+                        if success:
+                            item.update(
+                                status="success",
+                                message=f"Successfully processed {item['filename']} into {item['chunks_created']} chunks"
+                                + (f" ({plan.duplicates} near-duplicates collapsed)" if plan.duplicates else "")
+                            )
+                        else:
+                            item.update(status="error", message="Failed to upload to vector database")
+                for item in batch:
+                    item.pop("content_hash", None)
+                    item.setdefault("chunks_created", 0)
+                    await results.put(item)
+        finally:
+            await results.put(None)
+
+    tasks = [asyncio.create_task(stage()) for stage in (prepare_stage, encode_stage, store_stage)]
+    try:
+        while (result := await results.get()) is not None:
+            yield result
+        # Surface anything that broke a stage
+        await asyncio.gather(*tasks)
+    finally:
+        # Client went away: stop reading and encoding the rest
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,4 @@
+"""
+Local benchmarks for Study Jarvis
+Run from the backend directory, e.g. `python -m bench.startup`
+"""
@@ -0,0 +1,98 @@
+"""
+Chunking Benchmark
+Compares the legacy fixed-window chunk_text with the structure-aware
+iter_chunks: chunks produced, throughput, and how often chunks cut through
+words or sentences.
+
+Usage:
+    python -m bench.chunking [files ...] [--size-mb 5] [--runs 3]
+
+Without files, sample_notes.txt is repeated until the corpus reaches --size-mb.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+
+from ingest_notes import chunk_text, iter_chunks, extract_text
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_NOTES = os.path.join(os.path.dirname(BACKEND_DIR), "sample_notes.txt")
+MODEL_TOKEN_LIMIT = 256  # all-MiniLM-L6-v2 max sequence length
+
+SENTENCE_END = re.compile(r"[.!?:)\]\"'*]$")
+WORD_PIECE_ESTIMATE = re.compile(r"\w+|[^\w\s]")
+
+CHUNKERS = {
+    "chunk_text": lambda text: chunk_text(text, chunk_size=500, overlap=50),
+    "iter_chunks": lambda text: list(iter_chunks(text)),
+}
+
+def load_corpus(paths, size_mb):
+    """Concatenate the given files, or repeat the sample notes to size_mb"""
+    if paths:
+        return "\n\n".join(extract_text(path) for path in paths)
+    with open(SAMPLE_NOTES, "r", encoding="utf-8") as f:
+        sample = f.read()
+    repeats = max(1, int(size_mb * 1024 * 1024 / len(sample.encode("utf-8"))))
+    return "\n\n".join([sample] * repeats)
+
+def chunk_quality(text, chunks):
+    """Share of chunks that start or end mid-word, end mid-sentence, or exceed the model limit"""
+    words = set(re.findall(r"\S+", text))
+    lines = {line.strip() for line in text.splitlines()}
+    mid_word = sum(
+        1 for chunk in chunks
+        if chunk.split()[0] not in words or chunk.split()[-1] not in words
+    )
+    # Ending on a whole source line (list items, table rows) counts as a clean break
+    mid_sentence = sum(
+        1 for chunk in chunks
+        if not SENTENCE_END.search(chunk.rstrip()) and chunk.rsplit("\n", 1)[-1].strip() not in lines
+    )
+    too_long = sum(
+        1 for chunk in chunks
+        if len(WORD_PIECE_ESTIMATE.findall(chunk)) > MODEL_TOKEN_LIMIT
+    )
+    count = max(len(chunks), 1)
+    return {
+        "cut_mid_word": round(mid_word / count, 3),
+        "cut_mid_sentence": round(mid_sentence / count, 3),
+        "over_model_limit": round(too_long / count, 3),
+    }
+
+def run(text, runs=3):
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    results = {}
+    for name, chunker in CHUNKERS.items():
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            chunks = chunker(text)
+            timings.append(time.perf_counter() - start)
+        seconds = statistics.median(timings)
+        results[name] = {
+            "chunks": len(chunks),
+            "avg_chunk_chars": round(sum(len(c) for c in chunks) / max(len(chunks), 1), 1),
+            "seconds": round(seconds, 4),
+            "mb_per_second": round(size_mb / seconds, 2) if seconds else None,
+            **chunk_quality(text, chunks),
+        }
+    return {"corpus_mb": round(size_mb, 2), "runs": runs, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark note chunking")
+    parser.add_argument("files", nargs="*", help="PDF/DOCX/TXT files to use as the corpus")
+    parser.add_argument("--size-mb", type=float, default=5, help="Synthetic corpus size without files")
+    parser.add_argument("--runs", type=int, default=3, help="Timing samples per chunker")
+    args = parser.parse_args()
+
+    print("📖 Loading corpus...")
+    text = load_corpus(args.files, args.size_mb)
+    print("⏱️  Chunking...")
+    print(json.dumps(run(text, args.runs), indent=2))
+
+if __name__ == "__main__":
+    main()
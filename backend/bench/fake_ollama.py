@@ -0,0 +1,123 @@
+"""
+Fake Ollama Server
+Deterministic stand-in for Ollama's /api/generate and /api/tags, so the app
+can be benchmarked without a GPU or a model download. Every response takes
+the configured time to first token and then streams tokens at a fixed rate.
+
+Usage:
+    python -m bench.fake_ollama [--port 11435] [--ttft 0.2] [--tokens-per-second 30] [--tokens 120]
+
+Point the app at it with OLLAMA_URL=http://127.0.0.1:11435
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("the", "tree", "stores", "keys", "in", "sorted", "order", "so", "lookups", "take", "log", "n", "time")
+
+class FakeOllamaConfig:
+    def __init__(self, ttft=0.2, tokens_per_second=30.0, tokens=120):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+
+def _handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._json({"models": [{"name": "fake:latest"}]})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            num_tokens = min(config.tokens, request.get("options", {}).get("num_predict", config.tokens))
+            prompt_words = len(request.get("prompt", "").split())
+            interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+            started = time.perf_counter()
+            time.sleep(config.ttft)
+            prompt_done = time.perf_counter()
+
+            def final(text):
+                now = time.perf_counter()
+                return {
+                    "model": request.get("model", "fake"),
+                    "response": text,
+                    "done": True,
+                    "total_duration": int((now - started) * 1e9),
+                    "load_duration": 0,
+                    "prompt_eval_count": prompt_words,
+                    "prompt_eval_duration": int((prompt_done - started) * 1e9),
+                    "eval_count": num_tokens,
+                    "eval_duration": int((now - prompt_done) * 1e9),
+                }
+
+            tokens = [WORDS[i % len(WORDS)] + " " for i in range(num_tokens)]
+            if not request.get("stream", True):
+                time.sleep(interval * num_tokens)
+                self._json(final("".join(tokens)))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_chunk(body):
+                data = json.dumps(body).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+            for token in tokens:
+                write_chunk({"response": token, "done": False})
+                time.sleep(interval)
+            write_chunk(final(""))
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+def make_server(port=0, **config):
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(FakeOllamaConfig(**config)))
+    server.daemon_threads = True
+    return server
+
+def start(port=0, **config):
+    """Serve in a background thread; returns (server, base_url)"""
+    server = make_server(port, **config)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-ollama").start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=30.0)
+    parser.add_argument("--tokens", type=int, default=120, help="Tokens per response (capped by num_predict)")
+    args = parser.parse_args()
+
+    server = make_server(args.port, ttft=args.ttft, tokens_per_second=args.tokens_per_second, tokens=args.tokens)
+    print(f"🤖 Fake Ollama on http://127.0.0.1:{args.port} "
+          f"(TTFT {args.ttft}s, {args.tokens_per_second} tokens/s, {args.tokens} tokens)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Fake Vector Store Server
+In-memory stand-in for a Pinecone index's REST data plane (upsert, query,
+fetch, update, delete, describe_index_stats) with namespaces and metadata
+filters. Queries are brute-force cosine similarity with numpy, plus an
+optional fixed latency to mimic the network round trip.
+
+Usage:
+    python -m bench.fake_vector_store [--port 5081] [--latency-ms 0]
+
+Point the app at it with PINECONE_INDEX_HOST=http://127.0.0.1:5081 (any
+PINECONE_API_KEY value works).
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+DIMENSION = 384
+
+_COMPARISONS = {
+    "$eq": lambda value, arg: arg in value,
+    "$ne": lambda value, arg: arg not in value,
+    "$in": lambda value, arg: any(v in arg for v in value),
+    "$nin": lambda value, arg: not any(v in arg for v in value),
+    "$gt": lambda value, arg: any(v is not None and v > arg for v in value),
+    "$gte": lambda value, arg: any(v is not None and v >= arg for v in value),
+    "$lt": lambda value, arg: any(v is not None and v < arg for v in value),
+    "$lte": lambda value, arg: any(v is not None and v <= arg for v in value),
+}
+
+def matches_filter(metadata, filter):
+    """Evaluate a Pinecone metadata filter; list-valued fields match if any element does"""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            values = value if isinstance(value, list) else [value]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, arg in condition.items():
+                if not _COMPARISONS[op](values, arg):
+                    return False
+    return True
+
+class Namespace:
+    """Vectors of one namespace, kept as a growing float32 matrix for fast scoring"""
+
+    def __init__(self, dimension):
+        self.ids = []
+        self.positions = {}
+        self.metadata = []
+        self.values = np.zeros((0, dimension), dtype=np.float32)
+        self.norms = np.zeros(0, dtype=np.float32)
+
+    def upsert(self, vectors):
+        new_rows = []
+        for vector in vectors:
+            values = np.asarray(vector["values"], dtype=np.float32)
+            position = self.positions.get(vector["id"])
+            if position is None:
+                self.positions[vector["id"]] = len(self.ids) + len(new_rows)
+                new_rows.append((vector["id"], values, vector.get("metadata") or {}))
+            else:
+                self.values[position] = values
+                self.norms[position] = np.linalg.norm(values)
+                self.metadata[position] = vector.get("metadata") or {}
+        if new_rows:
+            self.ids.extend(row[0] for row in new_rows)
+            self.metadata.extend(row[2] for row in new_rows)
+            block = np.stack([row[1] for row in new_rows])
+            self.values = np.vstack([self.values, block])
+            self.norms = np.concatenate([self.norms, np.linalg.norm(block, axis=1)])
+
+    def delete(self, ids):
+        doomed = {self.positions[i] for i in ids if i in self.positions}
+        if not doomed:
+            return
+        keep = [p for p in range(len(self.ids)) if p not in doomed]
+        self.ids = [self.ids[p] for p in keep]
+        self.metadata = [self.metadata[p] for p in keep]
+        self.values = self.values[keep]
+        self.norms = self.norms[keep]
+        self.positions = {vector_id: p for p, vector_id in enumerate(self.ids)}
+
+    def query(self, vector, top_k, filter, include_values, include_metadata):
+        if not self.ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        scores = self.values @ query / np.maximum(self.norms * query_norm, 1e-12)
+        if filter:
+            allowed = np.array([matches_filter(m, filter) for m in self.metadata])
+            scores = np.where(allowed, scores, -np.inf)
+        top_k = min(top_k, len(self.ids))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            {
+                "id": self.ids[p],
+                "score": float(scores[p]),
+                "values": self.values[p].tolist() if include_values else [],
+                **({"metadata": self.metadata[p]} if include_metadata else {}),
+            }
+            for p in best if scores[p] != -np.inf
+        ]
+
+class FakeVectorStore:
+    def __init__(self, dimension=DIMENSION, latency_ms=0.0):
+        self.dimension = dimension
+        self.latency = latency_ms / 1000.0
+        self.namespaces = {}
+        self.lock = threading.Lock()
+
+    def namespace(self, name):
+        if name not in self.namespaces:
+            self.namespaces[name] = Namespace(self.dimension)
+        return self.namespaces[name]
+
+    def handle(self, method, path, query, body):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            namespace = self.namespace(body.get("namespace") or query.get("namespace", [""])[0])
+
+            if path == "/vectors/upsert":
+                namespace.upsert(body.get("vectors", []))
+                return {"upsertedCount": len(body.get("vectors", []))}
+
+            if path == "/query":
+                matches = namespace.query(
+                    body["vector"], body.get("topK", 10), body.get("filter"),
+                    body.get("includeValues", False), body.get("includeMetadata", False)
+                )
+                return {"matches": matches, "namespace": body.get("namespace", "")}
+
+            if path == "/vectors/fetch":
+                vectors = {}
+                for vector_id in query.get("ids", []):
+                    position = namespace.positions.get(vector_id)
+                    if position is not None:
+                        vectors[vector_id] = {
+                            "id": vector_id,
+                            "values": namespace.values[position].tolist(),
+                            "metadata": namespace.metadata[position],
+                        }
+                return {"vectors": vectors, "namespace": query.get("namespace", [""])[0]}
+
+            if path == "/vectors/list":
+                prefix = query.get("prefix", [""])[0]
+                limit = int(query.get("limit", ["100"])[0])
+                start = int(query.get("paginationToken", ["0"])[0])
+                ids = [vector_id for vector_id in namespace.ids if vector_id.startswith(prefix)]
+                page = ids[start:start + limit]
+                result = {"vectors": [{"id": vector_id} for vector_id in page], "namespace": query.get("namespace", [""])[0]}
+                if start + limit < len(ids):
+                    result["pagination"] = {"next": str(start + limit)}
+                return result
+
+            if path == "/vectors/update":
+                position = namespace.positions.get(body["id"])
+                if position is not None:
+                    if body.get("values"):
+                        namespace.values[position] = np.asarray(body["values"], dtype=np.float32)
+                        namespace.norms[position] = np.linalg.norm(namespace.values[position])
+                    namespace.metadata[position].update(body.get("setMetadata") or {})
+                return {}
+
+            if path == "/vectors/delete":
+                if body.get("deleteAll"):
+                    self.namespaces.pop(body.get("namespace") or "", None)
+                elif body.get("ids"):
+                    namespace.delete(body["ids"])
+                elif body.get("filter"):
+                    namespace.delete([
+                        vector_id for vector_id, metadata in zip(namespace.ids, namespace.metadata)
+                        if matches_filter(metadata, body["filter"])
+                    ])
+                return {}
+
+            if path == "/describe_index_stats":
+                counts = {name: {"vectorCount": len(ns.ids)} for name, ns in self.namespaces.items() if ns.ids}
+                return {
+                    "namespaces": counts,
+                    "dimension": self.dimension,
+                    "indexFullness": 0.0,
+                    "totalVectorCount": sum(c["vectorCount"] for c in counts.values()),
+                }
+        return None
+
+def _handler(store):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def log_message(self, *args):
+            pass
+
+        def _dispatch(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length)) if length else {}
+            result = store.handle(self.command, url.path, parse_qs(url.query), body)
+            if result is None:
+                self.send_error(404)
+                return
+            data = json.dumps(result).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_DELETE = _dispatch
+
+    return Handler
+
+def make_server(port=0, dimension=DIMENSION, latency_ms=0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(FakeVectorStore(dimension, latency_ms)))
+    server.daemon_threads = True
+    return server
+
+def start(port=0, **config):
+    """Serve in a background thread; returns (server, base_url)"""
+    server = make_server(port, **config)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-vector-store").start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory fake of the Pinecone data plane")
+    parser.add_argument("--port", type=int, default=5081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every request")
+    args = parser.parse_args()
+
+    server = make_server(args.port, latency_ms=args.latency_ms)
+    print(f"🗄️  Fake vector store on http://127.0.0.1:{args.port} (latency {args.latency_ms} ms)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+End-to-End Load Benchmark
+Starts the real app (start.py) against the fake Ollama and fake vector
+store, then drives /upload and /chat with concurrent clients and reports
+p50/p95/p99 latency, throughput and the average Server-Timing breakdown.
+Embedding uses the real model, so sentence-transformers must be installed.
+
+Usage:
+    python -m bench.load [--uploads 20] [--chats 200] [--concurrency 8] [--workers 1]
+                         [--ttft 0.2] [--tokens-per-second 30] [--tokens 120] [--out results.json]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench import fake_ollama, fake_vector_store
+from bench.results import save, summarize_latencies
+from bench.startup import BACKEND_DIR, wait_for
+
+TOPICS = (
+    "binary search trees", "hash tables", "merge sort", "quick sort", "linked lists", "graph traversal",
+    "dynamic programming", "heaps", "stacks", "queues", "process scheduling", "virtual memory",
+    "deadlocks", "normal forms", "transactions", "B+ trees", "TCP congestion control", "routing",
+)
+FILLER = (
+    "stores", "compares", "balances", "splits", "merges", "visits", "caches", "locks", "orders",
+    "the", "each", "node", "key", "value", "page", "frame", "table", "index", "record", "packet",
+)
+
+def make_document(seed, paragraphs=30):
+    """Deterministic notes; every document differs so near-duplicate collapsing doesn't kick in"""
+    rng = random.Random(seed)
+    lines = [f"# Lecture {seed}: {rng.choice(TOPICS).title()}"]
+    for p in range(paragraphs):
+        if p % 6 == 0:
+            lines.append(f"\n## Section {p // 6 + 1}: {rng.choice(TOPICS).title()}")
+        sentences = [
+            f"{rng.choice(TOPICS).capitalize()} {' '.join(rng.choice(FILLER) for _ in range(rng.randint(8, 16)))} "
+            f"(example {seed}-{p}-{s})."
+            for s in range(rng.randint(3, 6))
+        ]
+        lines.append(" ".join(sentences))
+    return "\n\n".join(lines)
+
+def parse_server_timing(header):
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if duration:
+            stages[name] = float(duration)
+    return stages
+
+def run_scenario(name, requests_to_send, concurrency):
+    """Send (callable) requests with a pool of client threads; returns the summary"""
+    latencies, stages, errors = [], {}, 0
+
+    def send(call):
+        start = time.perf_counter()
+        try:
+            response = call()
+            ok = response.status_code == 200
+            timing = parse_server_timing(response.headers.get("Server-Timing"))
+        except requests.exceptions.RequestException:
+            ok, timing = False, {}
+        return ok, time.perf_counter() - start, timing
+
+    print(f"🚦 {name}: {len(requests_to_send)} requests, concurrency {concurrency}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for ok, seconds, timing in pool.map(send, requests_to_send):
+            if not ok:
+                errors += 1
+                continue
+            latencies.append(seconds)
+            for stage, ms in timing.items():
+                stages.setdefault(stage, []).append(ms)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(requests_to_send),
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency": summarize_latencies(latencies),
+        "server_timing_mean_ms": {stage: round(sum(v) / len(v), 2) for stage, v in stages.items()},
+    }
+
+def start_app(port, workers, env, timeout):
+    server = subprocess.Popen(
+        [sys.executable, "start.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    if wait_for(f"http://127.0.0.1:{port}/ready", time.perf_counter() + timeout) is None:
+        server.terminate()
+        raise RuntimeError("App did not become ready; is sentence-transformers installed?")
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /upload and /chat load test with fake backends")
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1, help="Server workers (start.py --workers)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=30.0, help="Fake LLM generation speed")
+    parser.add_argument("--tokens", type=int, default=120, help="Fake LLM tokens per answer")
+    parser.add_argument("--store-latency-ms", type=float, default=5.0, help="Fake vector-store latency")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for the app to be ready")
+    parser.add_argument("--out", help="Result file (default: bench/results/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    _, ollama_url = fake_ollama.start(ttft=args.ttft, tokens_per_second=args.tokens_per_second, tokens=args.tokens)
+    _, store_url = fake_vector_store.start(latency_ms=args.store_latency_ms)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "OLLAMA_URL": ollama_url,
+            "PINECONE_INDEX_HOST": store_url,
+            "PINECONE_API_KEY": os.environ.get("PINECONE_API_KEY", "bench"),
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.bin"),
+            "TRACE_LOG_PATH": os.path.join(workdir, "traces.jsonl"),
+            "PRECOMPUTE_ARTIFACTS": "0",
+        }
+        print("🚀 Starting app against fake Ollama and vector store...")
+        server = start_app(args.port, args.workers, env, args.timeout)
+        base = f"http://127.0.0.1:{args.port}"
+        try:
+            documents = [make_document(seed) for seed in range(args.uploads)]
+            uploads = [
+                lambda i=i, doc=doc: requests.post(
+                    f"{base}/upload",
+                    files={"file": (f"lecture{i}.txt", doc.encode("utf-8"), "text/plain")},
+                    data={"subject": "Computer Science"},
+                    timeout=300,
+                )
+                for i, doc in enumerate(documents)
+            ]
+            chats = [
+                lambda i=i: requests.post(
+                    f"{base}/chat",
+                    json={"message": f"Explain {TOPICS[i % len(TOPICS)]}", "session_id": f"bench-{i % 16}"},
+                    timeout=300,
+                )
+                for i in range(args.chats)
+            ]
+
+            results = {
+                "config": {
+                    "workers": args.workers,
+                    "llm_ttft_s": args.ttft,
+                    "llm_tokens_per_second": args.tokens_per_second,
+                    "llm_tokens": args.tokens,
+                    "store_latency_ms": args.store_latency_ms,
+                },
+                "upload": run_scenario("upload", uploads, args.concurrency),
+                "chat": run_scenario("chat", chats, args.concurrency),
+            }
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    save("load", results, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Microbenchmarks
+Times the individual pipeline pieces offline: chunking, text extraction per
+file format, embedding throughput and vector-store query latency (against
+bench/fake_vector_store.py, so it measures the client and HTTP path rather
+than Pinecone itself).
+
+Usage:
+    python -m bench.micro [--only chunking,extract,encode,query] [--runs 5] [--vectors 5000] [--out results.json]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from bench import chunking, fake_vector_store
+from bench.results import save, summarize_latencies
+
+BENCHMARKS = ("chunking", "extract", "encode", "query")
+
+def _median_seconds(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def _write_pdf(path, lines, lines_per_page=55):
+    """Write a plain text-only PDF (no PDF library needed)"""
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace")
+
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        stream = b"BT /F1 10 Tf 12 TL 50 780 Td " + b" ".join(b"(" + escape(line) + b") Tj T*" for line in page) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids)
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(bytes(output))
+
+def _write_fixtures(directory, text):
+    """Write the same notes as TXT, DOCX and PDF; returns {ext: path}"""
+    paths = {}
+    lines = [line for line in text.splitlines()]
+
+    paths[".txt"] = os.path.join(directory, "notes.txt")
+    with open(paths[".txt"], "w", encoding="utf-8") as f:
+        f.write(text)
+
+    try:
+        import docx
+        document = docx.Document()
+        for line in lines:
+            document.add_paragraph(line)
+        paths[".docx"] = os.path.join(directory, "notes.docx")
+        document.save(paths[".docx"])
+    except ImportError:
+        print("⚠️  python-docx not installed; skipping DOCX")
+
+    paths[".pdf"] = os.path.join(directory, "notes.pdf")
+    _write_pdf(paths[".pdf"], [line[:110] for line in lines])
+    return paths
+
+def bench_chunking(text, runs):
+    return chunking.run(text, runs)
+
+def bench_extract(text, runs):
+    from ingest_notes import extract_text
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for ext, path in _write_fixtures(directory, text).items():
+            extracted = extract_text(path)
+            seconds = _median_seconds(lambda: extract_text(path), runs)
+            results[ext.lstrip(".")] = {
+                "file_size_kb": round(os.path.getsize(path) / 1024, 1),
+                "extracted_chars": len(extracted),
+                "seconds": round(seconds, 4),
+                "mb_per_second": round(len(extracted.encode("utf-8")) / (1024 * 1024) / seconds, 2),
+            }
+    return results
+
+def bench_encode(text, runs):
+    from ingest_notes import get_embed_model, iter_chunks
+
+    try:
+        model = get_embed_model()
+    except ImportError as e:
+        print(f"⚠️  Embedding model unavailable ({e}); skipping encode")
+        return {"skipped": str(e)}
+
+    chunks = list(iter_chunks(text))[:512]
+    model.encode(chunks[:8])  # warm up
+    results = {}
+    for batch_size in (1, 8, 32, 64):
+        texts = chunks[:max(batch_size * 4, 32)]
+        seconds = _median_seconds(lambda: model.encode(texts, batch_size=batch_size), runs)
+        results[f"batch_{batch_size}"] = {
+            "texts": len(texts),
+            "seconds": round(seconds, 4),
+            "texts_per_second": round(len(texts) / seconds, 1),
+        }
+    single = []
+    for query in chunks[:50]:
+        start = time.perf_counter()
+        model.encode([query[:200]])
+        single.append(time.perf_counter() - start)
+    results["single_query"] = summarize_latencies(single)
+    return results
+
+def bench_query(num_vectors, num_queries=200, latency_ms=0.0):
+    import pinecone_client
+
+    server, url = fake_vector_store.start(latency_ms=latency_ms)
+    os.environ.setdefault("PINECONE_API_KEY", "bench")
+    pinecone_client.INDEX_HOST = url
+    pinecone_client._index = None
+    pinecone_client.init_index()
+
+    rng = np.random.default_rng(0)
+    dimension = pinecone_client.DIMENSION
+    subjects = ["Math", "Physics", "History", None]
+    for start in range(0, num_vectors, 100):
+        batch = rng.standard_normal((min(100, num_vectors - start), dimension)).astype(np.float32)
+        pinecone_client.upsert_partitioned([
+            (f"v{start + i}", vector.tolist(), {
+                "text": f"chunk {start + i}", "source": f"doc{(start + i) % 50}.txt",
+                "chunk_index": start + i, **({"subject": s} if (s := subjects[(start + i) % 4]) else {}),
+            })
+            for i, vector in enumerate(batch)
+        ])
+
+    queries = rng.standard_normal((num_queries, dimension)).astype(np.float32).tolist()
+    scenarios = {
+        "query_vectors": lambda q: pinecone_client.query_vectors(q, top_k=10, namespace=""),
+        "query_vectors_filtered": lambda q: pinecone_client.query_vectors(
+            q, top_k=10, filter={"source": {"$eq": "doc7.txt"}}, namespace=""
+        ),
+        "query_partitions": lambda q: pinecone_client.query_partitions(q, top_k=10),
+    }
+    results = {"vectors": num_vectors, "latency_ms_added": latency_ms}
+    for name, fn in scenarios.items():
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            timings.append(time.perf_counter() - start)
+        results[name] = summarize_latencies(timings)
+    server.shutdown()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline microbenchmarks")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"Comma-separated subset of {BENCHMARKS}")
+    parser.add_argument("--runs", type=int, default=5, help="Timing samples per measurement")
+    parser.add_argument("--size-mb", type=float, default=1, help="Size of the synthetic notes corpus")
+    parser.add_argument("--vectors", type=int, default=5000, help="Vectors loaded into the fake store")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--store-latency-ms", type=float, default=0.0, help="Simulated vector-store latency")
+    parser.add_argument("--out", help="Result file (default: bench/results/micro-<timestamp>.json)")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    text = chunking.load_corpus([], args.size_mb)
+    results = {}
+    if "chunking" in selected:
+        print("⏱️  Chunking...")
+        results["chunking"] = bench_chunking(text, args.runs)
+    if "extract" in selected:
+        print("⏱️  Text extraction...")
+        results["extract"] = bench_extract(chunking.load_corpus([], min(args.size_mb, 0.25)), args.runs)
+    if "encode" in selected:
+        print("⏱️  Embedding...")
+        results["encode"] = bench_encode(text, args.runs)
+    if "query" in selected:
+        print("⏱️  Vector queries...")
+        results["query"] = bench_query(args.vectors, args.queries, args.store_latency_ms)
+
+    save("micro", results, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark Results
+Latency summaries, JSON result files and run-to-run comparison shared by
+the benchmarks in this package.
+
+Usage:
+    python -m bench.results compare old.json new.json [--threshold 0.10]
+
+Exits with status 1 when any metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Metric names containing these are better when higher; everything else
+# numeric (seconds, ms, percentiles) is better when lower
+HIGHER_IS_BETTER = ("per_second", "throughput")
+# Counts and settings that describe the run rather than its speed
+NEUTRAL = (
+    "count", "runs", "chunks", "chars", "requests", "errors", "concurrency", "size", "corpus", "dimension", "vectors"
+)
+
+def summarize_latencies(seconds):
+    """p50/p95/p99/mean/max in milliseconds for a list of durations in seconds"""
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "count": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR)
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def save(name, results, path=None):
+    """Write results with run metadata to JSON; returns the file path"""
+    document = {
+        "benchmark": name,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"💾 Results saved to {path}")
+    return path
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+def _direction(metric):
+    leaf = metric.rsplit(".", 1)[-1]
+    if any(word in leaf for word in HIGHER_IS_BETTER):
+        return 1
+    if any(word in leaf for word in NEUTRAL):
+        return 0
+    return -1
+
+def compare(old, new, threshold=0.10):
+    """
+    Compare two result documents metric by metric
+
+    Returns:
+        List of (metric, old, new, relative change, verdict) where verdict is
+        "regressed", "improved", "same" or "info"
+    """
+    old_flat = _flatten(old.get("results", old))
+    new_flat = _flatten(new.get("results", new))
+    rows = []
+    for metric in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[metric], new_flat[metric]
+        change = (after - before) / abs(before) if before else 0.0
+        direction = _direction(metric)
+        if direction == 0:
+            verdict = "info"
+        elif change * direction < -threshold:
+            verdict = "regressed"
+        elif change * direction > threshold:
+            verdict = "improved"
+        else:
+            verdict = "same"
+        rows.append((metric, before, after, change, verdict))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Relative change that counts")
+    args = parser.parse_args()
+
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows = compare(old, new, args.threshold)
+    marks = {"regressed": "❌", "improved": "✅", "same": "  ", "info": "  "}
+    for metric, before, after, change, verdict in rows:
+        print(f"{marks[verdict]} {metric:<60} {before:>12.3f} → {after:>12.3f}  ({change:+.1%})")
+
+    regressions = [row for row in rows if row[4] == "regressed"]
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
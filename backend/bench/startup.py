@@ -0,0 +1,94 @@
+"""
+Startup Benchmark
+Measures how long `import app` takes and how long a fresh server needs
+before /live and /ready start returning 200.
+
+Usage:
+    python -m bench.startup [--runs 5] [--port 8765] [--timeout 300]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import_time(runs=5):
+    """Import the app module in fresh interpreters and return wall-clock seconds per run"""
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+def wait_for(url, deadline):
+    """Poll a URL until it returns 200 or the deadline passes; returns the time it succeeded"""
+    while time.perf_counter() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.perf_counter()
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.05)
+    return None
+
+def measure_time_to_ready(port=8765, timeout=300):
+    """Start uvicorn and time how long until /live and /ready succeed"""
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        live_at = wait_for(f"{base}/live", deadline)
+        ready_at = wait_for(f"{base}/ready", deadline)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    return {
+        "time_to_live": round(live_at - start, 3) if live_at else None,
+        "time_to_ready": round(ready_at - start, 3) if ready_at else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Study Jarvis startup")
+    parser.add_argument("--runs", type=int, default=5, help="Number of import-time samples")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the throwaway server")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for readiness")
+    args = parser.parse_args()
+
+    print("⏱️  Measuring import time...")
+    imports = measure_import_time(args.runs)
+    print("⏱️  Measuring time to live/ready...")
+    startup = measure_time_to_ready(args.port, args.timeout)
+
+    results = {
+        "import_seconds": {
+            "median": round(statistics.median(imports), 4),
+            "min": round(min(imports), 4),
+            "max": round(max(imports), 4),
+            "runs": len(imports),
+        },
+        **startup,
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
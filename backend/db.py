@@ -0,0 +1,72 @@
+"""
+Local SQLite Database
+Shared by every server worker process for sessions, jobs and other state
+"""
+import os
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./study_jarvis.db")
+
+# CREATE statements registered by the modules that own each table
+_schema = []
+
+# One connection per thread, reopened after a fork so workers never share a handle
+_local = threading.local()
+
+def _db_path():
+    """Turn a sqlite:/// URL into a filesystem path"""
+    if not DATABASE_URL.startswith("sqlite:///"):
+        raise ValueError(f"Only sqlite:/// DATABASE_URLs are supported, got: {DATABASE_URL}")
+    return DATABASE_URL[len("sqlite:///"):]
+
+def register_schema(*statements):
+    """Register CREATE ... IF NOT EXISTS statements to run on every new connection"""
+    _schema.extend(statements)
+
+def get_connection():
+    """Get this thread's SQLite connection, creating the registered schema on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "pid", None) != os.getpid():
+        conn = sqlite3.connect(_db_path(), timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.applied = 0
+    # Modules imported after the connection was opened register more schema
+    if _local.applied < len(_schema):
+        for statement in _schema[_local.applied:]:
+            conn.execute(statement)
+        conn.commit()
+        _local.applied = len(_schema)
+    return conn
+
+register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+)
+
+def bump_version(name):
+    """Advance a change counter (e.g. "corpus") so cached copies of that data are revalidated"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO versions (name, version, updated_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            (name, time.time())
+        )
+
+def get_version(name):
+    """Current (version, updated_at) of a change counter; (0, 0.0) if it never changed"""
+    row = get_connection().execute("SELECT version, updated_at FROM versions WHERE name = ?", (name,)).fetchone()
+    return row if row else (0, 0.0)
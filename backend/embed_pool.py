@@ -0,0 +1,297 @@
+"""
+Embedding Worker Pool
+Runs model.encode in separate processes so embedding never competes with
+request handling for the GIL.
+
+Requests go over multiprocessing queues in two lanes:
+- "query": interactive encodes (chat/quiz); always served first
+- "bulk": ingestion encodes; split into small batches and capped so that at
+  least one worker is always free for queries
+
+Workers write embeddings straight into a shared-memory buffer owned by the
+caller, so only the input texts and a tiny completion message cross the pipe.
+
+Idle workers block on a shared condition that submit() notifies, so they
+use no CPU while waiting and pick up a query as soon as it is queued.
+
+Workers report each job they take, so if one dies mid-job (OOM, segfault)
+the dispatcher fails that job's future and starts a replacement worker.
+"""
+import os
+import uuid
+import queue
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+QUERY_LANE = "query"
+BULK_LANE = "bulk"
+
+def _next_lane(lanes, stop):
+    """Block until a query, or a bulk job with a free bulk slot, is queued; claim it"""
+    with lanes["cond"]:
+        while not stop.is_set():
+            if lanes["query"].value:
+                lanes["query"].value -= 1
+                return QUERY_LANE
+            if lanes["bulk"].value and lanes["bulk_slots"].value:
+                lanes["bulk"].value -= 1
+                lanes["bulk_slots"].value -= 1
+                return BULK_LANE
+            # The timeout only bounds how long a missed stop takes to notice
+            lanes["cond"].wait(timeout=1.0)
+    return None
+
+def _release_bulk_slot(lanes):
+    with lanes["cond"]:
+        lanes["bulk_slots"].value += 1
+        lanes["cond"].notify()
+
+def _worker_main(worker_id, query_q, bulk_q, result_q, lanes, stop, threads):
+    """Worker process loop: load the model once, then serve encode jobs"""
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+
+    try:
+        from ingest_notes import get_embed_model
+        model = get_embed_model()
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model.encode(["warmup"])
+    except Exception as e:
+        result_q.put(("failed", worker_id, None, str(e)))
+        return
+    result_q.put(("ready", worker_id, None, None))
+
+    while True:
+        lane = _next_lane(lanes, stop)
+        if lane is None:
+            break
+        holding_bulk_slot = lane == BULK_LANE
+        # submit() queues the job before counting it, so this get doesn't wait long
+        job = (bulk_q if holding_bulk_slot else query_q).get()
+
+        request_id, shm_name, offset, texts = job
+        # Lets the dispatcher fail this job (and free the bulk slot) if we die on it
+        result_q.put(("taken", worker_id, request_id, holding_bulk_slot))
+        try:
+            embeddings = np.asarray(model.encode(texts), dtype=np.float32)
+            # The caller owns and unlinks the block; workers only attach and close
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray(
+                    (offset + len(texts), embeddings.shape[1]), dtype=np.float32, buffer=shm.buf
+                )
+                out[offset:offset + len(texts)] = embeddings
+                del out
+            finally:
+                shm.close()
+            result_q.put(("done", worker_id, request_id, None))
+        except Exception as e:
+            result_q.put(("error", worker_id, request_id, str(e)))
+        finally:
+            if holding_bulk_slot:
+                _release_bulk_slot(lanes)
+
+class EmbeddingPool:
+    """Pool of embedding worker processes with query and bulk priority lanes"""
+
+    def __init__(self, num_workers, dimension, bulk_batch_size=32, threads_per_worker=None):
+        self.num_workers = num_workers
+        self.dimension = dimension
+        self.bulk_batch_size = bulk_batch_size
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+
+        # forkserver gives clean children even though the server process has threads
+        method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        self._ctx = mp.get_context(method)
+        self._query_q = self._ctx.Queue()
+        self._bulk_q = self._ctx.Queue()
+        self._result_q = self._ctx.Queue()
+        # Queued jobs per lane and free bulk slots, guarded by one condition workers wait on
+        self._lanes = {
+            "cond": self._ctx.Condition(),
+            "query": self._ctx.Value("i", 0, lock=False),
+            "bulk": self._ctx.Value("i", 0, lock=False),
+            "bulk_slots": self._ctx.Value("i", max(1, num_workers - 1), lock=False),
+        }
+        self._stop = self._ctx.Event()
+
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ready_workers = 0
+        self._ready = threading.Event()
+        self._startup_error = None
+        self._processes = []
+        self._dispatcher = None
+        # worker_id -> (request_id, holding_bulk_slot) of the job it is encoding
+        self._taken = {}
+        self._failed_workers = set()  # couldn't load the model; not restarted
+
+    def _spawn(self, worker_id):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                worker_id, self._query_q, self._bulk_q, self._result_q,
+                self._lanes, self._stop, self.threads_per_worker
+            ),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def start(self):
+        """Spawn the worker processes and the result dispatcher thread"""
+        self._processes = [self._spawn(worker_id) for worker_id in range(self.num_workers)]
+
+        self._dispatcher = threading.Thread(target=self._dispatch_results, daemon=True)
+        self._dispatcher.start()
+        print(f"✅ Started {self.num_workers} embedding worker(s)")
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has loaded the model; raises if a worker failed to start"""
+        ready = self._ready.wait(timeout)
+        if self._startup_error:
+            raise RuntimeError(f"Embedding worker failed to start: {self._startup_error}")
+        return ready
+
+    def submit(self, texts, lane=QUERY_LANE):
+        """
+        Queue texts for encoding
+
+        Args:
+            texts: List of strings to embed
+            lane: QUERY_LANE for interactive requests, BULK_LANE for ingestion
+
+        Returns:
+            concurrent.futures.Future resolving to a float32 array of shape (len(texts), dimension)
+        """
+        future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, self.dimension), dtype=np.float32))
+            return future
+
+        shm = shared_memory.SharedMemory(create=True, size=len(texts) * self.dimension * 4)
+        request_id = uuid.uuid4().hex
+
+        if lane == BULK_LANE:
+            parts = [
+                (offset, texts[offset:offset + self.bulk_batch_size])
+                for offset in range(0, len(texts), self.bulk_batch_size)
+            ]
+            target, lane = self._bulk_q, BULK_LANE
+        else:
+            parts = [(0, list(texts))]
+            target, lane = self._query_q, QUERY_LANE
+
+        with self._pending_lock:
+            self._pending[request_id] = {
+                "future": future,
+                "shm": shm,
+                "count": len(texts),
+                "remaining": len(parts),
+                "error": None,
+            }
+
+        for offset, part in parts:
+            target.put((request_id, shm.name, offset, part))
+        with self._lanes["cond"]:
+            self._lanes[lane].value += len(parts)
+            self._lanes["cond"].notify(len(parts))
+
+        return future
+
+    def encode(self, texts, lane=QUERY_LANE, timeout=None):
+        """Synchronous wrapper around submit()"""
+        return self.submit(texts, lane).result(timeout)
+
+    def _dispatch_results(self):
+        """Resolve futures as workers report completed jobs, and replace workers that die"""
+        while not self._stop.is_set():
+            try:
+                kind, worker_id, request_id, detail = self._result_q.get(timeout=0.5)
+            except queue.Empty:
+                self._replace_dead_workers()
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == "ready":
+                self._ready_workers += 1
+                if self._ready_workers >= self.num_workers:
+                    self._ready.set()
+            elif kind == "failed":
+                self._failed_workers.add(worker_id)
+                self._startup_error = detail
+                self._ready.set()
+            elif kind == "taken":
+                self._taken[worker_id] = (request_id, detail)
+            else:
+                self._taken.pop(worker_id, None)
+                self._finish_part(request_id, detail)
+            self._replace_dead_workers()
+
+    def _replace_dead_workers(self):
+        for worker_id, process in enumerate(self._processes):
+            if process.is_alive() or self._stop.is_set() or worker_id in self._failed_workers:
+                continue
+            print(f"⚠️  Embedding worker {worker_id} died (exit code {process.exitcode}); restarting it")
+            taken = self._taken.pop(worker_id, None)
+            if taken is not None:
+                request_id, holding_bulk_slot = taken
+                if holding_bulk_slot:
+                    _release_bulk_slot(self._lanes)
+                self._finish_part(request_id, f"Embedding worker died (exit code {process.exitcode})")
+            self._processes[worker_id] = self._spawn(worker_id)
+
+    def _finish_part(self, request_id, error):
+        """Count one finished part of a request; resolve its future once every part is in"""
+        with self._pending_lock:
+            entry = self._pending.get(request_id)
+            if entry is None:
+                return
+            entry["remaining"] -= 1
+            if error:
+                entry["error"] = error
+            # A failed request is reported right away; its other parts are ignored when they land
+            if entry["remaining"] > 0 and not error:
+                return
+            del self._pending[request_id]
+
+        shm = entry["shm"]
+        try:
+            future = entry["future"]
+            if future.cancelled():
+                pass
+            elif entry["error"]:
+                future.set_exception(RuntimeError(entry["error"]))
+            else:
+                view = np.ndarray((entry["count"], self.dimension), dtype=np.float32, buffer=shm.buf)
+                result = view.copy()
+                del view
+                future.set_result(result)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        """Stop the workers and fail anything still pending"""
+        self._stop.set()
+        with self._lanes["cond"]:
+            self._lanes["cond"].notify_all()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for entry in pending.values():
+            entry["future"].set_exception(RuntimeError("Embedding pool shut down"))
+            entry["shm"].close()
+            entry["shm"].unlink()
+        print("✅ Embedding workers stopped")
@@ -0,0 +1,140 @@
+"""
+Uploaded File Cache
+Content hashes of ingested files and the text extracted from them, kept in
+the shared SQLite database.
+
+Re-uploading a file whose bytes, name, subject, chapter and chunking
+settings match what was already ingested is a no-op that reports the
+existing chunk count. When anything but the bytes changed (a new chunk size,
+a different subject), the cached text is re-chunked without parsing the
+PDF or DOCX again.
+"""
+import os
+import time
+import zlib
+import hashlib
+from dotenv import load_dotenv
+
+import metrics
+from db import get_connection, register_schema
+
+load_dotenv()
+
+FILE_CACHE_ENABLED = os.getenv("FILE_CACHE_ENABLED", "1") == "1"
+# Compressed extracted text kept; least recently used files are dropped first
+EXTRACT_CACHE_MAX_MB = float(os.getenv("EXTRACT_CACHE_MAX_MB", "200"))
+HASH_BLOCK_SIZE = 1024 * 1024
+
+register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS ingested_files (
+        source TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        subject TEXT,
+        chapter TEXT,
+        chunking TEXT NOT NULL,
+        chunks INTEGER NOT NULL,
+        ingested_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS extracted_texts (
+        content_hash TEXT PRIMARY KEY,
+        text BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        used_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_extracted_texts_used ON extracted_texts (used_at)",
+)
+
+def new_hasher():
+    return hashlib.sha256()
+
+def file_hash(path):
+    """SHA-256 of a file on disk, read in blocks"""
+    hasher = new_hasher()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def find_ingested(source, content_hash, subject, chapter, chunking):
+    """
+    Chunk count of an identical earlier ingestion, or None
+
+    Args:
+        chunking: Chunker settings the file would be split with now; a
+            change means the file must be re-chunked
+    """
+    if not FILE_CACHE_ENABLED:
+        return None
+    row = get_connection().execute(
+        "SELECT chunks FROM ingested_files WHERE source = ? AND content_hash = ? "
+        "AND subject IS ? AND chapter IS ? AND chunking = ?",
+        (source, content_hash, subject, chapter, chunking)
+    ).fetchone()
+    metrics.record_cache("ingested_files", row is not None)
+    return row[0] if row else None
+
+def ingested_hash(source):
+    """Content hash a source was last ingested from, or None if it never was"""
+    row = get_connection().execute(
+        "SELECT content_hash FROM ingested_files WHERE source = ?", (source,)
+    ).fetchone()
+    return row[0] if row else None
+
+def record_ingested(source, content_hash, subject, chapter, chunking, chunks):
+    """Remember that a source was ingested from these bytes"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ingested_files "
+            "(source, content_hash, subject, chapter, chunking, chunks, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source, content_hash, subject, chapter, chunking, chunks, time.time())
+        )
+
+def forget(source):
+    """Drop a deleted source so uploading it again ingests it from scratch"""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM ingested_files WHERE source = ?", (source,))
+
+def get_text(content_hash):
+    """Previously extracted text for these file bytes, or None"""
+    if not FILE_CACHE_ENABLED:
+        return None
+    conn = get_connection()
+    row = conn.execute("SELECT text FROM extracted_texts WHERE content_hash = ?", (content_hash,)).fetchone()
+    metrics.record_cache("extracted_text", row is not None)
+    if row is None:
+        return None
+    with conn:
+        conn.execute("UPDATE extracted_texts SET used_at = ? WHERE content_hash = ?", (time.time(), content_hash))
+    return zlib.decompress(row[0]).decode("utf-8")
+
+def put_text(content_hash, text):
+    """Cache extracted text, evicting the least recently used entries over the size cap"""
+    if not FILE_CACHE_ENABLED:
+        return
+    data = zlib.compress(text.encode("utf-8"), 6)
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO extracted_texts (content_hash, text, size, used_at) VALUES (?, ?, ?, ?)",
+            (content_hash, data, len(data), time.time())
+        )
+        budget = int(EXTRACT_CACHE_MAX_MB * 1024 * 1024)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extracted_texts").fetchone()[0]
+        if total > budget:
+            # Walk from oldest to newest, dropping entries until we're back under budget
+            doomed = []
+            for old_hash, size in conn.execute(
+                "SELECT content_hash, size FROM extracted_texts WHERE content_hash != ? ORDER BY used_at",
+                (content_hash,)
+            ):
+                if total <= budget:
+                    break
+                doomed.append((old_hash,))
+                total -= size
+            conn.executemany("DELETE FROM extracted_texts WHERE content_hash = ?", doomed)
@@ -0,0 +1,287 @@
+"""
+Folder Sync
+Keeps a notes folder (including subfolders) in sync with the index. A
+manifest of (path, mtime, size, hash) in the shared SQLite database records
+what was ingested, so each pass only ingests added or modified files and
+removes deleted ones; files that were merely touched are re-hashed, not
+re-ingested.
+
+Changes are picked up from filesystem events (watchdog: inotify, FSEvents or
+ReadDirectoryChangesW) when it is installed, otherwise by polling. Bursts of
+edits are debounced so a file saved in several writes is ingested once.
+"""
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+import file_cache
+from db import get_connection, register_schema
+from ingest_notes import SUPPORTED_EXTENSIONS, ingest_file, remove_document
+
+load_dotenv()
+
+SYNC_POLL_SECONDS = float(os.getenv("SYNC_POLL_SECONDS", "5"))
+# A file must be left alone this long before it is ingested
+SYNC_DEBOUNCE_SECONDS = float(os.getenv("SYNC_DEBOUNCE_SECONDS", "2"))
+# Full rescan interval in event mode, to catch anything the watcher missed
+SYNC_RESCAN_SECONDS = float(os.getenv("SYNC_RESCAN_SECONDS", "600"))
+
+register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS sync_manifest (
+        root TEXT NOT NULL,
+        path TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        chunks INTEGER NOT NULL,
+        synced_at REAL NOT NULL,
+        PRIMARY KEY (root, path)
+    )
+    """,
+)
+
+def _is_note(name):
+    # Skip hidden files and Office lock files (~$notes.docx)
+    return (
+        not name.startswith((".", "~$"))
+        and os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+    )
+
+def scan(root):
+    """Stat every supported file under root; returns {relative path: (mtime_ns, size)}"""
+    found = {}
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith("."):
+                    pending.append(entry.path)
+            elif entry.is_file() and _is_note(entry.name):
+                stat = entry.stat()
+                found[os.path.relpath(entry.path, root).replace(os.sep, "/")] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+class FolderSync:
+    """Manifest-backed sync of one folder into one subject"""
+
+    def __init__(self, root, subject=None):
+        self.root = os.path.abspath(root)
+        self.subject = subject
+        # Files that failed to ingest, by the stat they had; retried once they change
+        self.failed = {}
+        rows = get_connection().execute(
+            "SELECT path, mtime_ns, size, content_hash FROM sync_manifest WHERE root = ?", (self.root,)
+        ).fetchall()
+        self.manifest = {path: (mtime_ns, size, content_hash) for path, mtime_ns, size, content_hash in rows}
+
+    def _stat(self, paths):
+        current = {}
+        for path in paths:
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            current[path] = (stat.st_mtime_ns, stat.st_size)
+        return current
+
+    def _record(self, path, mtime_ns, size, content_hash, chunks):
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_manifest (root, path, mtime_ns, size, content_hash, chunks, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.root, path, mtime_ns, size, content_hash, chunks, time.time())
+            )
+        self.manifest[path] = (mtime_ns, size, content_hash)
+
+    def _touch(self, path, mtime_ns, size):
+        # Same content under a new stat; the chunk count carries over
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "UPDATE sync_manifest SET mtime_ns = ?, size = ?, synced_at = ? WHERE root = ? AND path = ?",
+                (mtime_ns, size, time.time(), self.root, path)
+            )
+        self.manifest[path] = (mtime_ns, size, self.manifest[path][2])
+
+    def _drop(self, path):
+        conn = get_connection()
+        with conn:
+            conn.execute("DELETE FROM sync_manifest WHERE root = ? AND path = ?", (self.root, path))
+        self.manifest.pop(path, None)
+
+    def sync(self, paths=None):
+        """
+        Bring the index in line with the folder
+
+        Args:
+            paths: Relative paths that may have changed (from file events);
+                None rescans the whole folder
+
+        Returns:
+            (stats, deferred) where stats counts added/modified/removed/touched
+            files and deferred holds paths still being written (retry later)
+        """
+        if paths is None:
+            current = scan(self.root)
+            candidates = set(current) | set(self.manifest)
+        else:
+            candidates = {path for path in paths if _is_note(os.path.basename(path))}
+            current = self._stat(candidates)
+
+        stats = {"added": 0, "modified": 0, "removed": 0, "touched": 0}
+        deferred = set()
+        settle_before = time.time_ns() - int(SYNC_DEBOUNCE_SECONDS * 1e9)
+
+        for path in sorted(candidates):
+            known = self.manifest.get(path)
+            if path not in current:
+                self.failed.pop(path, None)
+                if known is not None:
+                    print(f"🗑️  Removed: {path}")
+                    if remove_document(path)["success"]:
+                        self._drop(path)
+                        stats["removed"] += 1
+                continue
+
+            mtime_ns, size = current[path]
+            if known is not None and known[:2] == (mtime_ns, size):
+                continue
+            if self.failed.get(path) == (mtime_ns, size):
+                continue
+            if mtime_ns > settle_before:
+                deferred.add(path)
+                continue
+
+            file_path = os.path.join(self.root, path)
+            content_hash = file_cache.file_hash(file_path)
+            if known is not None and known[2] == content_hash:
+                # Saved without changes (or copied over with new timestamps)
+                self._touch(path, mtime_ns, size)
+                stats["touched"] += 1
+                continue
+
+            if known is not None:
+                remove_document(path)
+            chunks = ingest_file(file_path, subject=self.subject, source=path)
+            if chunks:
+                self._record(path, mtime_ns, size, content_hash, chunks)
+                self.failed.pop(path, None)
+                stats["modified" if known is not None else "added"] += 1
+            else:
+                self.failed[path] = (mtime_ns, size)
+                if known is not None:
+                    self._drop(path)
+
+        return stats, deferred
+
+def _report(stats):
+    if any(stats.values()):
+        print(
+            f"🔄 Synced: {stats['added']} added, {stats['modified']} modified, "
+            f"{stats['removed']} removed, {stats['touched']} unchanged"
+        )
+
+def sync_once(root, subject=None):
+    """One full sync pass; returns the change counts"""
+    stats, _ = FolderSync(root, subject).sync()
+    _report(stats)
+    if not any(stats.values()):
+        print("✅ Already in sync")
+    return stats
+
+def _event_watcher(root, on_change):
+    """Start a watchdog observer calling on_change(relative path or None); None if unavailable"""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.event_type in ("opened", "closed_no_write"):
+                return
+            if event.is_directory:
+                # A moved or deleted folder changes everything below it
+                if event.event_type in ("moved", "deleted"):
+                    on_change(None)
+                return
+            for path in (event.src_path, getattr(event, "dest_path", "")):
+                if path:
+                    on_change(os.path.relpath(path, root).replace(os.sep, "/"))
+
+    observer = Observer()
+    observer.schedule(Handler(), root, recursive=True)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+def watch(root, subject=None, stop_event=None):
+    """
+    Sync a folder, then keep it in sync until interrupted
+
+    Uses filesystem events when watchdog is installed and polling otherwise.
+    """
+    syncer = FolderSync(root, subject)
+    stop_event = stop_event or threading.Event()
+    print(f"👀 Syncing {syncer.root} ({len(syncer.manifest)} files in manifest)")
+    stats, pending = syncer.sync()
+    _report(stats)
+
+    changed = threading.Condition()
+    dirty = {"paths": set(pending), "rescan": False, "last_event": time.monotonic()}
+
+    def on_change(path):
+        with changed:
+            if path is None:
+                dirty["rescan"] = True
+            else:
+                dirty["paths"].add(path)
+            dirty["last_event"] = time.monotonic()
+            changed.notify()
+
+    observer = _event_watcher(syncer.root, on_change)
+    if observer:
+        print(f"✅ Watching for changes (debounce {SYNC_DEBOUNCE_SECONDS}s)")
+    else:
+        print(f"✅ Polling every {SYNC_POLL_SECONDS}s (install watchdog for filesystem events)")
+
+    last_rescan = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            if observer is None:
+                stop_event.wait(SYNC_POLL_SECONDS)
+                if stop_event.is_set():
+                    break
+                paths = None
+            else:
+                with changed:
+                    changed.wait(timeout=SYNC_POLL_SECONDS)
+                    quiet = time.monotonic() - dirty["last_event"]
+                    due = time.monotonic() - last_rescan >= SYNC_RESCAN_SECONDS
+                    if not (dirty["paths"] or dirty["rescan"] or due) or (quiet < SYNC_DEBOUNCE_SECONDS and not due):
+                        continue
+                    paths = None if dirty["rescan"] or due else dirty["paths"]
+                    dirty["paths"], dirty["rescan"] = set(), False
+            if paths is None:
+                last_rescan = time.monotonic()
+
+            stats, deferred = syncer.sync(paths)
+            _report(stats)
+            if deferred and observer is not None:
+                with changed:
+                    dirty["paths"] |= deferred
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+    finally:
+        if observer:
+            observer.stop()
+            observer.join()
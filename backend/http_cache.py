@@ -0,0 +1,142 @@
+"""
+HTTP Caching and Compression
+Conditional GET support (ETag / Last-Modified validators and 304 responses)
+for the read endpoints the frontend polls, and response compression (brotli
+when installed, otherwise gzip) for large non-streaming responses.
+"""
+import os
+import gzip
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+# Hosted indexes are eventually consistent: a scan right after a write may
+# miss it, so responses this close to a corpus change get no validators
+INDEX_CONSISTENCY_SECONDS = float(os.getenv("INDEX_CONSISTENCY_SECONDS", "10"))
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # about gzip's speed with smaller output; 11 is far too slow per request
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def make_etag(*parts):
+    """Weak ETag over the values that identify a representation"""
+    digest = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same validator
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def not_modified(request: Request, etag, last_modified=None):
+    """
+    Return a 304 response if the client's cached copy is current, else None
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    headers = validator_headers(etag, last_modified)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    elif last_modified and request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            return None
+        fresh = int(last_modified) <= since
+    else:
+        return None
+    return Response(status_code=304, headers=headers) if fresh else None
+
+def validator_headers(etag, last_modified=None):
+    """ETag/Last-Modified headers plus no-cache, so browsers store and always revalidate"""
+    headers = {"Cache-Control": "no-cache"}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+def _choose_encoding(accept_encoding):
+    accepted = {
+        token.split(";")[0].strip().lower()
+        for token in accept_encoding.split(",")
+        if not token.strip().endswith(";q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """
+    Compress complete JSON/text responses above COMPRESS_MIN_BYTES
+
+    Streaming responses (NDJSON chat and quiz streams) pass through untouched
+    so every line still reaches the client as soon as it is written.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        held_start = None
+
+        async def send_compressed(message):
+            nonlocal held_start
+            if message["type"] == "http.response.start":
+                held_start = message
+                return
+            if message["type"] != "http.response.body" or held_start is None:
+                await send(message)
+                return
+
+            start, held_start = held_start, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body")
+                or "content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -3,31 +3,55 @@ Note Ingestion Script
 Handles uploading and processing of study notes (PDF, DOCX, TXT)
 """
 import os
+import re
 import sys
+import time
 import uuid
-from sentence_transformers import SentenceTransformer
-from PyPDF2 import PdfReader
-import docx
+import threading
+from collections import deque
 from dotenv import load_dotenv
 import pinecone_client
+import lexical_index
+import summary_vectors
+import near_dup
+import study_artifacts
+import file_cache
+import metrics
 
 load_dotenv()
 
-# Lazy-load embedding model
+# Chunk budget for iter_chunks. Tokens are estimated as whitespace-separated
+# words; all-MiniLM-L6-v2 truncates input at 256 word pieces, so 180 leaves
+# headroom for words and punctuation that split into several pieces.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "180"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "20"))
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+# Recorded with each ingested file; changing the chunk budget re-chunks re-uploads
+CHUNKING = f"iter_chunks:{CHUNK_MAX_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+
+# Lazy-load embedding model. sentence_transformers pulls in torch, so it is
+# only imported the first time the model is actually needed.
 _embed_model = None
+_embed_model_lock = threading.Lock()
 
 def get_embed_model():
     """Get or initialize the embedding model"""
     global _embed_model
     if _embed_model is None:
-        print("Loading embedding model...")
-        _embed_model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ Embedding model loaded!")
+        with _embed_model_lock:
+            if _embed_model is None:
+                from sentence_transformers import SentenceTransformer
+                print("Loading embedding model...")
+                _embed_model = SentenceTransformer('all-MiniLM-L6-v2')
+                print("✅ Embedding model loaded!")
     return _embed_model
 
 def chunk_text(text, chunk_size=500, overlap=50):
     """
-    Split text into chunks with overlap
+    Split text into fixed-size character windows with overlap
+
+    Kept for comparison (bench/chunking.py); ingestion uses iter_chunks.
 
     Args:
         text: Full text to chunk
@@ -53,9 +77,145 @@ def chunk_text(text, chunk_size=500, overlap=50):
 
     return chunks
 
+# Sentence ends (with trailing quotes/brackets) and line breaks; runs of
+# blank lines are one separator so paragraph breaks cost a single match
+SEGMENT_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*[ \t]+|[ \t]*\n(?:[ \t]*\n)*[ \t]*")
+HEADING_PATTERN = re.compile(
+    r"#{1,6}\s|(?i:chapter|section|unit|lecture|part|module)\s+\w+|\d+(?:\.\d+)*\.?\s+[A-Z]"
+)
+WORD = re.compile(r"\S+")
+
+MAX_HEADING_CHARS = 100
+HEADING_FLUSH_FILL = 0.5     # start a new chunk at a heading once this full
+PARAGRAPH_FLUSH_FILL = 0.75  # ... or at a paragraph break once this full
+
+def _segments(text):
+    """
+    Yield (start, end, kind) for each sentence or line of text
+
+    kind says what separated the segment from the previous one: "paragraph"
+    (blank line), "line" (single newline) or "sentence". Offsets exclude
+    surrounding whitespace, so no text is copied.
+    """
+    kind = "paragraph"
+    start = 0
+    for boundary in SEGMENT_BOUNDARY.finditer(text):
+        end = boundary.start()
+        while start < end and text[start].isspace():
+            start += 1
+        if start < end:
+            yield start, end, kind
+        newlines = text.count("\n", boundary.start(), boundary.end())
+        kind = "paragraph" if newlines > 1 else "line" if newlines else "sentence"
+        start = boundary.end()
+
+    end = len(text)
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    while start < end and text[start].isspace():
+        start += 1
+    if start < end:
+        yield start, end, kind
+
+def _is_heading(text, start, end):
+    """A short line that looks like a markdown, numbered or "Chapter N" heading"""
+    return end - start <= MAX_HEADING_CHARS and HEADING_PATTERN.match(text, start, end) is not None
+
+def _split_long(text, start, end, max_size, measure):
+    """Split a segment longer than the budget at word boundaries"""
+    piece_start = start
+    piece_end = start
+    size = 0
+    for word in WORD.finditer(text, start, end):
+        word_size = measure(word.start(), word.end())
+        if size and size + word_size > max_size:
+            yield piece_start, piece_end, size
+            piece_start, size = word.start(), 0
+        piece_end = word.end()
+        size += word_size
+    if piece_end > piece_start:
+        yield piece_start, piece_end, size
+
+def iter_chunks(text, max_size=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS, unit="tokens", min_chars=50):
+    """
+    Split text into chunks along paragraph, heading and sentence boundaries
+
+    A single pass over the text: segments are tracked as offsets and each
+    chunk is sliced out once when it is yielded. Chunks only break inside a
+    sentence when the sentence alone exceeds the budget.
+
+    Args:
+        text: Full text to chunk
+        max_size: Budget per chunk, in `unit`s
+        overlap: Trailing context (whole sentences) repeated at the start of
+            the next chunk, in `unit`s; never carried across headings
+        unit: "tokens" (estimated as words) or "chars"
+        min_chars: Chunks shorter than this are dropped
+
+    Yields:
+        Chunk texts in document order
+    """
+    if unit == "chars":
+        measure = lambda start, end: end - start + 1  # plus the separator before it
+    else:
+        # str.count runs in C; repeated spaces only make the estimate conservative
+        measure = lambda start, end: text.count(" ", start, end) + text.count("\n", start, end) + 1
+
+    window = deque()  # (start, end, size) of the segments in the current chunk
+    size = 0
+    fresh = False     # window holds something beyond the carried-over overlap
+
+    def flush():
+        """Text of the current window, or None if it is under min_chars"""
+        chunk_start, chunk_end = window[0][0], window[-1][1]
+        return text[chunk_start:chunk_end] if chunk_end - chunk_start > min_chars else None
+
+    for seg_start, seg_end, kind in _segments(text):
+        seg_size = measure(seg_start, seg_end)
+        heading = kind != "sentence" and _is_heading(text, seg_start, seg_end)
+
+        if fresh and (
+            size + seg_size > max_size
+            or (heading and size >= max_size * HEADING_FLUSH_FILL)
+            or (kind == "paragraph" and size >= max_size * PARAGRAPH_FLUSH_FILL)
+        ):
+            chunk = flush()
+            if chunk:
+                yield chunk
+            if heading or kind == "paragraph":
+                window.clear()
+                size = 0
+            while window and (size > overlap or size + seg_size > max_size):
+                size -= window.popleft()[2]
+            fresh = False
+
+        if seg_size > max_size:
+            # A run-on "sentence" (tables, code, PDFs without punctuation)
+            for piece in _split_long(text, seg_start, seg_end, max_size, measure):
+                if fresh and size + piece[2] > max_size:
+                    chunk = flush()
+                    if chunk:
+                        yield chunk
+                    window.clear()
+                    size = 0
+                window.append(piece)
+                size += piece[2]
+                fresh = True
+            continue
+
+        window.append((seg_start, seg_end, seg_size))
+        size += seg_size
+        fresh = True
+
+    if fresh:
+        chunk = flush()
+        if chunk:
+            yield chunk
+
 def read_pdf(file_path):
     """Extract text from PDF file"""
     try:
+        from PyPDF2 import PdfReader
         reader = PdfReader(file_path)
         text = ""
         for page in reader.pages:
@@ -68,6 +228,7 @@ def read_pdf(file_path):
 def read_docx(file_path):
     """Extract text from DOCX file"""
     try:
+        import docx
         doc = docx.Document(file_path)
         text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
         return text
@@ -78,15 +239,22 @@ def read_docx(file_path):
 def read_txt(file_path):
     """Extract text from TXT file"""
     try:
+        if hasattr(file_path, "read"):
+            return file_path.read().decode('utf-8')
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
     except Exception as e:
         print(f"❌ Error reading TXT: {e}")
         return ""
 
-def extract_text(file_path):
-    """Extract text based on file extension"""
-    ext = os.path.splitext(file_path)[1].lower()
+def extract_text(file_path, ext=None):
+    """
+    Extract text based on file extension
+
+    file_path may also be a binary file object (e.g. an entry read out of a
+    zip archive), in which case ext must be given.
+    """
+    ext = ext or os.path.splitext(file_path)[1].lower()
 
     if ext == '.pdf':
         return read_pdf(file_path)
@@ -98,7 +266,138 @@ def extract_text(file_path):
         print(f"❌ Unsupported file type: {ext}")
         return ""
 
-def ingest_file(file_path, subject=None, chapter=None):
+def extract_text_cached(file_path, content_hash, ext=None):
+    """extract_text, reusing the text already extracted from identical file bytes"""
+    text = file_cache.get_text(content_hash)
+    if text is None:
+        text = extract_text(file_path, ext)
+        if text.strip():
+            file_cache.put_text(content_hash, text)
+    return text
+
+def build_vectors(chunks, embeddings, source, subject=None, chapter=None, extra_metadata=None,
+                  chunk_indexes=None):
+    """
+    Pair chunks with their embeddings and metadata
+
+    Args:
+        chunk_indexes: Position of each chunk in its document (defaults to 0..n-1)
+
+    Returns:
+        List of (id, embedding, metadata) tuples ready for upsert
+    """
+    if chunk_indexes is None:
+        chunk_indexes = range(len(chunks))
+
+    vectors = []
+    for i, chunk, embedding in zip(chunk_indexes, chunks, embeddings):
+        vector_id = f"{uuid.uuid4()}"
+        metadata = {
+            "text": chunk,
+            "source": source,
+            "sources": [source],  # grows when near-duplicates from other files collapse into this chunk
+            "chunk_index": i,
+        }
+
+        # Add optional metadata
+        if subject:
+            metadata["subject"] = subject
+        if chapter:
+            metadata["chapter"] = chapter
+        if extra_metadata:
+            metadata.update(extra_metadata)
+
+        vectors.append((vector_id, embedding.tolist(), metadata))
+    return vectors
+
+def store_vectors(vectors):
+    """
+    Store chunk vectors everywhere retrieval reads them: their subject's
+    Pinecone namespace, the lexical index and the document centroids
+    """
+    success = pinecone_client.upsert_partitioned(vectors)
+    if success:
+        lexical_index.add_chunks(vectors)
+        summary_vectors.update_summaries(vectors)
+    return success
+
+def prepare_chunks(chunks, source, subject=None, pending=None):
+    """Drop near-duplicate chunks before embedding; only plan.new_texts need encoding"""
+    return near_dup.plan_chunks(chunks, source, pinecone_client.subject_namespace(subject), pending)
+
+def _set_sources(updates):
+    """Push the changed sources (and their subjects/chapters) of shared chunks to Pinecone and the lexical index"""
+    changed = {}
+    for chunk_id, update in updates.items():
+        metadata = {key: value for key, value in update.items() if key != "namespace"}
+        metadata["source"] = update["sources"][0]
+        pinecone_client.update_metadata(chunk_id, metadata, namespace=update["namespace"])
+        changed[chunk_id] = metadata
+    lexical_index.update_metadata(changed)
+
+def store_chunks(plan, embeddings, source, subject=None, chapter=None, extra_metadata=None):
+    """
+    Store a planned document: new chunks become vectors, near-duplicates
+    become extra source references on the chunks they matched
+
+    Returns:
+        (success, vectors stored)
+    """
+    success, vectors = store_many([(plan, embeddings, source)], subject, chapter, extra_metadata)
+    return success, vectors[0]
+
+def store_many(documents, subject=None, chapter=None, extra_metadata=None):
+    """
+    Store several planned documents with one combined upsert
+
+    Args:
+        documents: List of (plan, embeddings, source)
+
+    Returns:
+        (success, list of the vectors stored for each document)
+    """
+    built = [
+        build_vectors(
+            plan.new_texts, embeddings, source,
+            subject=subject,
+            chapter=chapter,
+            extra_metadata=extra_metadata,
+            chunk_indexes=plan.new_indexes
+        )
+        for plan, embeddings, source in documents
+    ]
+    all_vectors = [vector for vectors in built for vector in vectors]
+    success = store_vectors(all_vectors) if all_vectors else True
+    if success:
+        for (plan, _, source), vectors in zip(documents, built):
+            _set_sources(near_dup.commit_plan(plan, vectors, subject, chapter))
+            if plan.existing_refs:
+                # The centroid built from the new vectors misses the shared chunks
+                summary_vectors.rebuild_summaries([plan.source], stored=vectors)
+            # Stored summaries/flashcards no longer match the notes
+            study_artifacts.invalidate(source, subject, chapter)
+    return success, built
+
+def remove_document(source):
+    """Delete a source file's vectors, centroids and lexical index entries"""
+    # Chunks shared with other files survive, re-pointed at their remaining sources
+    survivors = near_dup.release_source(source)
+    _set_sources(survivors)
+
+    # The source's subject isn't known here, so clear it from every partition
+    for namespace in pinecone_client.list_chunk_namespaces(refresh=True):
+        result = pinecone_client.delete_document(source, namespace=namespace)
+        if not result['success']:
+            return result
+    lexical_index.delete_source(source)
+    summary_vectors.delete_summaries(source)
+    # Files that shared chunks with this one may have had no centroid of their own
+    summary_vectors.rebuild_summaries({s for update in survivors.values() for s in update["sources"]})
+    study_artifacts.forget(source)
+    file_cache.forget(source)
+    return result
+
+def ingest_file(file_path, subject=None, chapter=None, source=None):
     """
     Main ingestion function
 
@@ -106,6 +405,7 @@ def ingest_file(file_path, subject=None, chapter=None):
         file_path: Path to the file to ingest
         subject: Subject/course name (optional metadata)
         chapter: Chapter/topic name (optional metadata)
+        source: Source name to store it under (defaults to the file name)
 
     Returns:
         Number of chunks ingested
@@ -114,11 +414,20 @@ def ingest_file(file_path, subject=None, chapter=None):
         print(f"❌ File not found: {file_path}")
         return 0
 
-    print(f"\n📄 Processing: {os.path.basename(file_path)}")
+    filename = source or os.path.basename(file_path)
+    print(f"\n📄 Processing: {filename}")
+
+    # Skip files that were already ingested byte-for-byte with the same settings
+    started = time.perf_counter()
+    content_hash = file_cache.file_hash(file_path)
+    existing = file_cache.find_ingested(filename, content_hash, subject, chapter, CHUNKING)
+    if existing is not None:
+        print(f"⏭️  Unchanged since last ingestion ({existing} chunks)")
+        return existing
 
     # Extract text
     print("📖 Extracting text...")
-    text = extract_text(file_path)
+    text = extract_text_cached(file_path, content_hash)
 
     if not text.strip():
         print("❌ No text extracted from file")
@@ -126,42 +435,33 @@ def ingest_file(file_path, subject=None, chapter=None):
 
     print(f"✅ Extracted {len(text)} characters")
 
+    # A new version of an earlier ingestion replaces it rather than adding to it
+    if file_cache.ingested_hash(filename) is not None:
+        print("♻️  Replacing the previous version")
+        remove_document(filename)
+
     # Chunk text
     print("✂️  Chunking text...")
-    chunks = chunk_text(text, chunk_size=500, overlap=50)
+    chunks = list(iter_chunks(text))
     print(f"✅ Created {len(chunks)} chunks")
 
+    # Collapse near-duplicates (headers, footers, boilerplate) before embedding
+    plan = prepare_chunks(chunks, filename, subject=subject)
+    if plan.duplicates:
+        print(f"🧬 {plan.duplicates} near-duplicate chunks collapsed")
+
     # Create embeddings
     print("🧮 Creating embeddings...")
     embed_model = get_embed_model()
-    embeddings = embed_model.encode(chunks, show_progress_bar=True)
-
-    # Prepare vectors for Pinecone
-    print("📦 Preparing vectors for upload...")
-    vectors = []
-    filename = os.path.basename(file_path)
-
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-        vector_id = f"{uuid.uuid4()}"
-        metadata = {
-            "text": chunk,
-            "source": filename,
-            "chunk_index": i,
-        }
-
-        # Add optional metadata
-        if subject:
-            metadata["subject"] = subject
-        if chapter:
-            metadata["chapter"] = chapter
-
-        vectors.append((vector_id, embedding.tolist(), metadata))
+    embeddings = embed_model.encode(plan.new_texts, show_progress_bar=True) if plan.new_texts else []
 
     # Upload to Pinecone
     print("☁️  Uploading to Pinecone...")
-    success = pinecone_client.upsert_vectors(vectors)
+    success, _ = store_chunks(plan, embeddings, filename, subject=subject, chapter=chapter)
 
     if success:
+        metrics.record_ingest(len(chunks), time.perf_counter() - started)
+        file_cache.record_ingested(filename, content_hash, subject, chapter, CHUNKING, len(chunks))
         print(f"✅ Successfully ingested {len(chunks)} chunks from {filename}")
         return len(chunks)
     else:
@@ -175,7 +475,6 @@ def ingest_directory(directory_path, subject=None):
         return
 
     total_chunks = 0
-    supported_extensions = ['.pdf', '.docx', '.txt']
 
     print(f"\n📁 Processing directory: {directory_path}")
 
@@ -183,7 +482,7 @@ def ingest_directory(directory_path, subject=None):
         file_path = os.path.join(directory_path, filename)
         ext = os.path.splitext(filename)[1].lower()
 
-        if os.path.isfile(file_path) and ext in supported_extensions:
+        if os.path.isfile(file_path) and ext in SUPPORTED_EXTENSIONS:
             chunks = ingest_file(file_path, subject=subject)
             total_chunks += chunks
 
@@ -195,23 +494,35 @@ if __name__ == "__main__":
     pinecone_client.init_index()
 
     # Check command line arguments
-    if len(sys.argv) < 2:
+    flags = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not args or flags - {"--sync", "--watch"}:
         print("""
 Usage:
     python ingest_notes.py <file_or_directory> [subject] [chapter]
+    python ingest_notes.py <directory> [subject] --sync     # ingest changes since the last sync, then exit
+    python ingest_notes.py <directory> [subject] --watch    # keep syncing until Ctrl+C
 
 Examples:
     python ingest_notes.py notes.pdf "Data Structures" "Chapter 1"
     python ingest_notes.py my_notes/ "Operating Systems"
     python ingest_notes.py lecture.txt
+    python ingest_notes.py "S:\\Shared\\CS101" "Computer Science" --watch
         """)
         sys.exit(1)
 
-    path = sys.argv[1]
-    subject = sys.argv[2] if len(sys.argv) > 2 else None
-    chapter = sys.argv[3] if len(sys.argv) > 3 else None
-
-    if os.path.isfile(path):
+    path = args[0]
+    subject = args[1] if len(args) > 1 else None
+    chapter = args[2] if len(args) > 2 else None
+
+    if flags and os.path.isdir(path):
+        # Subfolders are included; files are stored under their path relative to the folder
+        import folder_sync
+        if "--watch" in flags:
+            folder_sync.watch(path, subject)
+        else:
+            folder_sync.sync_once(path, subject)
+    elif os.path.isfile(path):
         ingest_file(path, subject, chapter)
     elif os.path.isdir(path):
         ingest_directory(path, subject)
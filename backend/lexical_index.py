@@ -0,0 +1,455 @@
+"""
+Lexical (BM25) Index
+Compact in-process inverted index over note chunks, used for keyword-heavy
+queries ("B+ tree", course codes, formula names) and hybrid retrieval.
+
+Postings are stored in flat arrays (document numbers and term frequencies)
+per term, so a lookup touches only the query terms' postings and never the
+embedding model or Pinecone.
+
+On disk the index is a snapshot (LEXICAL_INDEX_PATH, plain dicts and arrays)
+plus an append-only log of the writes made since. Writers (server workers,
+ingest_notes.py, folder sync) append under an exclusive file lock, and every
+process replays only the records it hasn't seen yet; the log is folded into
+a new snapshot once it outgrows it.
+"""
+import os
+import re
+import sys
+import math
+import time
+import heapq
+import pickle
+import uuid
+import threading
+from array import array
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+load_dotenv()
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index.bin")
+LOG_PATH = f"{LEXICAL_INDEX_PATH}.log"
+LOCK_PATH = f"{LEXICAL_INDEX_PATH}.lock"
+LOG_COMPACT_BYTES = 8 * 1024 * 1024  # log size below which it is never folded into the snapshot
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # reciprocal-rank-fusion damping constant
+
+# Keeps "b+", "c++", "c#" and course codes like "cs101" as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+[+#]*")
+
+# Metadata kept per chunk so lexical hits can be used as context directly
+STORED_FIELDS = ("text", "source", "sources", "subject", "subjects", "chapter", "chapters", "chunk_index")
+# A chunk shared by several files (near-duplicates) lists all of their values
+# here, and filters on the single-valued field match any of them
+LIST_FIELDS = {"source": "sources", "subject": "subjects", "chapter": "chapters"}
+
+def tokenize(text):
+    """Lowercase and split text into index terms"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def matches_filter(meta, filter):
+    """True if stored metadata passes a {field: value} filter (list fields count too)"""
+    if meta is None:
+        return False
+    for field, value in (filter or {}).items():
+        if meta.get(field) != value and value not in (meta.get(LIST_FIELDS.get(field)) or ()):
+            return False
+    return True
+
+class LexicalIndex:
+    """BM25 inverted index with array-backed postings and tombstone deletes"""
+
+    def __init__(self):
+        self.terms = {}            # term -> term number
+        self.postings = []         # term number -> array('I') of doc numbers
+        self.frequencies = []      # term number -> array('H') of term frequencies
+        self.doc_freq = array('I')  # term number -> live documents containing it
+
+        self.doc_ids = []          # doc number -> chunk/vector id
+        self.doc_lengths = array('I')
+        self.doc_terms = []        # doc number -> array('I') of distinct term numbers
+        self.doc_meta = []         # doc number -> stored metadata (None once deleted)
+        self.id_to_doc = {}
+        self.live_docs = 0
+        self.total_length = 0
+
+    def add(self, doc_id, metadata):
+        """Index one chunk; metadata must include its "text" """
+        if doc_id in self.id_to_doc:
+            self.delete_ids([doc_id])
+
+        tokens = tokenize(metadata.get("text", ""))
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        doc = len(self.doc_ids)
+        term_numbers = array('I')
+        for token, count in counts.items():
+            term = self.terms.get(token)
+            if term is None:
+                term = len(self.postings)
+                self.terms[token] = term
+                self.postings.append(array('I'))
+                self.frequencies.append(array('H'))
+                self.doc_freq.append(0)
+            self.postings[term].append(doc)
+            self.frequencies[term].append(min(count, 65535))
+            self.doc_freq[term] += 1
+            term_numbers.append(term)
+
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        self.doc_terms.append(term_numbers)
+        self.doc_meta.append({k: metadata[k] for k in STORED_FIELDS if k in metadata})
+        self.id_to_doc[doc_id] = doc
+        self.live_docs += 1
+        self.total_length += len(tokens)
+
+    def delete_ids(self, doc_ids):
+        """Tombstone chunks by id; returns how many were removed"""
+        removed = 0
+        for doc_id in doc_ids:
+            doc = self.id_to_doc.pop(doc_id, None)
+            if doc is None:
+                continue
+            for term in self.doc_terms[doc]:
+                self.doc_freq[term] -= 1
+            self.doc_terms[doc] = array('I')
+            self.doc_meta[doc] = None
+            self.live_docs -= 1
+            self.total_length -= self.doc_lengths[doc]
+            removed += 1
+
+        # Dead entries still sit in the postings; rebuild once they dominate
+        if len(self.doc_ids) > 1000 and self.live_docs < len(self.doc_ids) // 2:
+            self.compact()
+        return removed
+
+    def delete_source(self, source):
+        """Remove every chunk that came from a source file"""
+        ids = [
+            self.doc_ids[doc] for doc, meta in enumerate(self.doc_meta)
+            if meta is not None and meta.get("source") == source
+        ]
+        return self.delete_ids(ids)
+
+    def set_sources(self, doc_id, sources):
+        """Re-point a chunk shared between files at its current sources"""
+        return self.update_metadata(doc_id, {"source": sources[0], "sources": list(sources)})
+
+    def update_metadata(self, doc_id, fields):
+        """Overwrite stored metadata fields of a chunk (e.g. a shared chunk's sources and chapters)"""
+        doc = self.id_to_doc.get(doc_id)
+        if doc is None:
+            return False
+        self.doc_meta[doc].update({k: v for k, v in fields.items() if k in STORED_FIELDS})
+        return True
+
+    def compact(self):
+        """Rebuild the arrays without tombstoned documents"""
+        live = [(self.doc_ids[doc], meta) for doc, meta in enumerate(self.doc_meta) if meta is not None]
+        self.__init__()
+        for doc_id, meta in live:
+            self.add(doc_id, meta)
+
+    def search(self, query, top_k=10, filter=None):
+        """
+        Score chunks against a query with BM25
+
+        Args:
+            query: Free-text query
+            top_k: Number of results
+            filter: Optional {field: value} exact-match metadata filter
+
+        Returns:
+            List of Pinecone-style matches: {"id", "score", "metadata"}
+        """
+        if self.live_docs == 0:
+            return []
+
+        avg_length = self.total_length / self.live_docs
+        scores = {}
+        for token in set(tokenize(query)):
+            term = self.terms.get(token)
+            if term is None or self.doc_freq[term] == 0:
+                continue
+            df = self.doc_freq[term]
+            idf = math.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+            docs = self.postings[term]
+            freqs = self.frequencies[term]
+            for i in range(len(docs)):
+                doc = docs[i]
+                tf = freqs[i]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(
+            top_k,
+            ((score, doc) for doc, score in scores.items() if matches_filter(self.doc_meta[doc], filter)),
+        )
+        return [
+            {"id": self.doc_ids[doc], "score": score, "metadata": dict(self.doc_meta[doc])}
+            for score, doc in best
+        ]
+
+def reciprocal_rank_fusion(result_lists, top_k=10, k=RRF_K):
+    """Merge ranked match lists by summing 1 / (k + rank); keeps the first copy of each match"""
+    fused = {}
+    first_seen = {}
+    for results in result_lists:
+        for rank, match in enumerate(results):
+            fused[match["id"]] = fused.get(match["id"], 0.0) + 1.0 / (k + rank + 1)
+            first_seen.setdefault(match["id"], match)
+
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [
+        {"id": doc_id, "score": score, "metadata": first_seen[doc_id].get("metadata")}
+        for doc_id, score in ranked
+    ]
+
+# Process-wide index, kept up to date by replaying the shared write log
+_index = None
+_generation = None  # snapshot our copy was loaded from (None: none yet, or one from before the log)
+_log_offset = 0     # bytes of the log already applied to our copy
+_log_key = None     # (inode, size, mtime) of the log when we last read it
+_last_check = 0.0
+_lock = threading.RLock()
+
+class _Unpickler(pickle.Unpickler):
+    """Reads snapshots that pickled the LexicalIndex class itself, including ones written as __main__"""
+
+    def find_class(self, module, name):
+        if name == "LexicalIndex":
+            return LexicalIndex
+        return super().find_class(module, name)
+
+@contextmanager
+def _file_lock(exclusive):
+    """Cross-process lock around the snapshot and log (shared for readers, exclusive for writers)"""
+    with open(LOCK_PATH, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+            return
+        # Windows: byte-range locks are exclusive only
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                pass
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+def _load_snapshot():
+    if not os.path.exists(LEXICAL_INDEX_PATH):
+        return LexicalIndex(), None
+    with open(LEXICAL_INDEX_PATH, "rb") as f:
+        state = _Unpickler(f).load()
+    if isinstance(state, LexicalIndex):
+        return state, None
+    index = LexicalIndex()
+    generation = state.pop("generation")
+    index.__dict__.update(state)
+    return index, generation
+
+def _apply(index, record):
+    """Apply one logged write to an index; returns how many chunks it changed"""
+    kind, payload = record
+    if kind == "add":
+        for doc_id, metadata in payload:
+            index.add(doc_id, metadata)
+        return len(payload)
+    if kind == "delete_source":
+        return index.delete_source(payload)
+    if kind == "set_sources":
+        return sum(1 for doc_id, sources in payload.items() if index.set_sources(doc_id, sources))
+    if kind == "update_metadata":
+        return sum(1 for doc_id, fields in payload.items() if index.update_metadata(doc_id, fields))
+    raise ValueError(f"Unknown lexical index record: {kind}")
+
+def _refresh_locked():
+    """Bring our copy up to date with the snapshot and log (caller holds the file lock)"""
+    global _index, _generation, _log_offset, _log_key
+    _log_key = _stat_key(LOG_PATH)
+    if _log_key is None:
+        if _index is None or _generation is not None:
+            _index, _generation = _load_snapshot()
+            _log_offset = 0
+        return
+
+    with open(LOG_PATH, "rb") as f:
+        _, generation = pickle.load(f)
+        if _index is None or generation != _generation:
+            # Compacted (or rebuilt) since we loaded: start over from the new snapshot
+            _index, _generation = _load_snapshot()
+            if _generation != generation:
+                # Snapshot was replaced but its log wasn't yet; the snapshot already has every write
+                _log_offset = 0
+                return
+            _log_offset = f.tell()
+        f.seek(_log_offset)
+        while True:
+            try:
+                record = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                # The end of the log, or a write cut short by a crash (the next writer truncates it)
+                break
+            _apply(_index, record)
+            _log_offset = f.tell()
+
+def _compact_locked():
+    """Fold the log into a fresh snapshot (caller holds the exclusive file lock)"""
+    global _generation, _log_offset, _log_key
+    generation = uuid.uuid4().hex
+    tmp_path = f"{LEXICAL_INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"generation": generation, **vars(_index)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, LEXICAL_INDEX_PATH)
+
+    with open(tmp_path, "wb") as f:
+        pickle.dump(("header", generation), f, protocol=pickle.HIGHEST_PROTOCOL)
+        _log_offset = f.tell()
+    os.replace(tmp_path, LOG_PATH)
+    _generation = generation
+    _log_key = _stat_key(LOG_PATH)
+
+def get_index(refresh=False):
+    """
+    Get the shared lexical index, picking up changes written by other processes
+
+    The log is checked at most once a second unless refresh is set; only the
+    records appended since the last check are read.
+    """
+    global _last_check
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and not refresh and now - _last_check < 1.0:
+            return _index
+        _last_check = now
+        if _index is None or _stat_key(LOG_PATH) != _log_key:
+            with _file_lock(exclusive=False):
+                _refresh_locked()
+        return _index
+
+def _write(record):
+    """Apply a write to the shared index: append it to the log under the exclusive lock"""
+    global _index, _log_offset, _log_key
+    with _lock, _file_lock(exclusive=True):
+        _refresh_locked()
+        try:
+            changed = _apply(_index, record)
+            if not changed:
+                return 0
+            if _generation is None or _log_offset == 0:
+                # No usable log yet (new index, a snapshot from before the log existed,
+                # or a compaction interrupted before its log was written)
+                _compact_locked()
+                return changed
+            with open(LOG_PATH, "r+b") as f:
+                # Drop the remains of a write cut short by a crash
+                f.truncate(_log_offset)
+                f.seek(_log_offset)
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+                _log_offset = f.tell()
+            _log_key = _stat_key(LOG_PATH)
+            if _log_offset > max(LOG_COMPACT_BYTES, os.path.getsize(LEXICAL_INDEX_PATH)):
+                _compact_locked()
+            return changed
+        except Exception:
+            # Our copy may be ahead of the files now; reload it on the next use
+            _index = None
+            raise
+
+def add_chunks(vectors):
+    """Index freshly upserted chunks; vectors are (id, embedding, metadata) tuples"""
+    _write(("add", [
+        (vector_id, {k: metadata[k] for k in STORED_FIELDS if k in metadata})
+        for vector_id, _, metadata in vectors
+    ]))
+
+def delete_source(source):
+    """Remove a source file's chunks from the lexical index"""
+    return _write(("delete_source", source))
+
+def set_sources(sources_by_id):
+    """Update the source lists of chunks shared between files ({chunk_id: [source, ...]})"""
+    if not sources_by_id:
+        return 0
+    return _write(("set_sources", {doc_id: list(sources) for doc_id, sources in sources_by_id.items()}))
+
+def update_metadata(fields_by_id):
+    """Overwrite stored metadata fields of chunks ({chunk_id: {field: value}})"""
+    if not fields_by_id:
+        return 0
+    return _write(("update_metadata", {doc_id: dict(fields) for doc_id, fields in fields_by_id.items()}))
+
+def document_chunks(source=None, chapter=None, subject=None):
+    """
+    Stored chunks of one source file or one chapter, in document order
+
+    Chunks shared with other files (near-duplicates) count for every source,
+    subject and chapter that contains them.
+    """
+    filter = {}
+    if source is not None:
+        filter["source"] = source
+    if subject is not None:
+        filter["subject"] = subject
+    if chapter is not None:
+        filter["chapter"] = chapter
+    chunks = [meta for meta in get_index().doc_meta if matches_filter(meta, filter)]
+    chunks.sort(key=lambda meta: (meta.get("source", ""), meta.get("chunk_index", 0)))
+    return chunks
+
+def search(query, top_k=10, filter=None):
+    """BM25 search over the shared index"""
+    return get_index().search(query, top_k=top_k, filter=filter)
+
+def rebuild_from_vector_store():
+    """Rebuild the lexical index from the chunk texts already stored in Pinecone"""
+    import pinecone_client
+
+    matches = pinecone_client.scan_chunks()
+    index = LexicalIndex()
+    for match in matches:
+        if match.get("metadata", {}).get("text"):
+            index.add(match["id"], match["metadata"])
+    global _index
+    with _lock, _file_lock(exclusive=True):
+        _index = index
+        _compact_locked()
+    print(f"✅ Lexical index rebuilt with {index.live_docs} chunks")
+    return index.live_docs
+
+if __name__ == "__main__":
+    # Work on the imported module so its index state is the one other code sees
+    import lexical_index
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        lexical_index.rebuild_from_vector_store()
+    else:
+        print("""
+Usage:
+    python lexical_index.py rebuild    Rebuild the BM25 index from Pinecone
+        """)
@@ -5,17 +5,55 @@ Handles communication with self-hosted LLaMA/Mistral models
 import requests
 import json
 import os
+import time
+import asyncio
+import threading
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+import resilience
 
 load_dotenv()
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 DEFAULT_MODEL = os.getenv("LLM_MODEL", "llama3")
-
-def query_llm(prompt, model=DEFAULT_MODEL, max_tokens=1024, temperature=0.2, stream=False):
+# Longest a single generation may take (a request deadline can cut it shorter)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "180"))
+
+# Generation queue: at most LLM_CONCURRENCY requests talk to Ollama at once,
+# the rest wait here instead of piling up inside Ollama. Request handlers
+# queue on an asyncio semaphore (agenerate) so waiting requests don't each
+# hold a threadpool thread; the thread semaphore also covers background callers
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "2"))
+_generation_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+_async_slots = None  # (event loop, asyncio.Semaphore), created on first use
+
+# Generations running or waiting in this process; background work only
+# starts when this is zero so it never delays interactive requests
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+def generations_in_flight():
+    """Number of LLM requests this process is running or has queued"""
+    return _in_flight
+
+def _track_in_flight(delta):
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += delta
+
+class LLMUnavailable(Exception):
+    """Ollama couldn't produce an answer (not running, erroring or timed out)"""
+
+def generate(prompt, model=DEFAULT_MODEL, max_tokens=1024, temperature=0.2, stream=False):
     """
     Query the local LLM via Ollama API
 
+    Waiting for a generation slot and the call itself both stop at the
+    request deadline (see resilience), and the call goes through the Ollama
+    circuit breaker.
+
     Args:
         prompt: The prompt to send to the LLM
         model: Model name (llama3, mistral, etc.)
@@ -25,7 +63,48 @@ def query_llm(prompt, model=DEFAULT_MODEL, max_tokens=1024, temperature=0.2, str
 
     Returns:
         Generated text response
+
+    Raises:
+        LLMUnavailable, resilience.CircuitOpenError, resilience.DeadlineExceeded
+    """
+    _track_in_flight(1)
+    try:
+        return _generate(prompt, model, max_tokens, temperature, stream, time.perf_counter())
+    finally:
+        _track_in_flight(-1)
+
+async def agenerate(prompt, model=DEFAULT_MODEL, max_tokens=1024, temperature=0.2, stream=False):
+    """
+    generate() for request handlers: waits for a generation slot in the event
+    loop, then runs the call in the threadpool
+
+    Same arguments, return value and exceptions as generate().
     """
+    global _async_slots
+    loop = asyncio.get_running_loop()
+    if _async_slots is None or _async_slots[0] is not loop:
+        _async_slots = (loop, asyncio.Semaphore(LLM_CONCURRENCY))
+    slots = _async_slots[1]
+
+    _track_in_flight(1)
+    try:
+        if resilience.LLM_BREAKER.rejecting():
+            raise resilience.CircuitOpenError("ollama is unavailable (circuit open)")
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(slots.acquire(), resilience.time_left(LLM_TIMEOUT_SECONDS))
+        except asyncio.TimeoutError:
+            raise resilience.DeadlineExceeded("Request deadline exceeded waiting for a generation slot")
+        try:
+            return await run_in_threadpool(
+                _generate, prompt, model, max_tokens, temperature, stream, queued_at
+            )
+        finally:
+            slots.release()
+    finally:
+        _track_in_flight(-1)
+
+def _generate(prompt, model, max_tokens, temperature, stream, queued_at):
     try:
         url = f"{OLLAMA_URL}/api/generate"
         payload = {
@@ -43,29 +122,64 @@ def query_llm(prompt, model=DEFAULT_MODEL, max_tokens=1024, temperature=0.2, str
             }
         }
 
-        response = requests.post(url, json=payload, timeout=180)  # Increased timeout
-        response.raise_for_status()
+        # Don't queue behind a backend that is known to be down
+        if resilience.LLM_BREAKER.rejecting():
+            raise resilience.CircuitOpenError("ollama is unavailable (circuit open)")
+
+        if not _generation_slots.acquire(timeout=resilience.time_left(LLM_TIMEOUT_SECONDS)):
+            raise resilience.DeadlineExceeded("Request deadline exceeded waiting for a generation slot")
+        try:
+            queue_seconds = time.perf_counter() - queued_at
+            metrics.record_stage("llm_queue", queue_seconds)
+            timeout = resilience.time_left(LLM_TIMEOUT_SECONDS)
+
+            with resilience.LLM_BREAKER.call(), metrics.stage("generate"):
+                response = requests.post(url, json=payload, timeout=timeout, stream=stream)
+                response.raise_for_status()
+
+                if stream:
+                    # Handle streaming response
+                    full_response = ""
+                    first_token_seconds = None
+                    for line in response.iter_lines():
+                        if line:
+                            data = json.loads(line)
+                            if "response" in data:
+                                if first_token_seconds is None and data["response"]:
+                                    first_token_seconds = time.perf_counter() - queued_at
+                                full_response += data["response"]
+                            if data.get("done", False):
+                                metrics.record_llm(data, queue_seconds, first_token_seconds)
+                                break
+                    return full_response
+                else:
+                    # Handle regular response
+                    data = response.json()
+                    metrics.record_llm(data, queue_seconds)
+                    return data.get("response", "")
+        finally:
+            _generation_slots.release()
+
+    except requests.exceptions.ConnectionError as e:
+        raise LLMUnavailable("Cannot connect to Ollama. Make sure Ollama is running (ollama serve).") from e
+    except requests.exceptions.Timeout as e:
+        raise LLMUnavailable("Request timed out. The model might be too large or slow.") from e
+    except requests.exceptions.RequestException as e:
+        raise LLMUnavailable(f"Ollama request failed: {e}") from e
+
+def query_llm(prompt, model=DEFAULT_MODEL, max_tokens=1024, temperature=0.2, stream=False):
+    """
+    Query the local LLM, returning failures as text instead of raising
+
+    Same arguments as generate().
 
-        if stream:
-            # Handle streaming response
-            full_response = ""
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line)
-                    if "response" in data:
-                        full_response += data["response"]
-                    if data.get("done", False):
-                        break
-            return full_response
-        else:
-            # Handle regular response
-            data = response.json()
-            return data.get("response", "")
-
-    except requests.exceptions.ConnectionError:
-        return "❌ Error: Cannot connect to Ollama. Make sure Ollama is running (ollama serve)."
-    except requests.exceptions.Timeout:
-        return "❌ Error: Request timed out. The model might be too large or slow."
+    Returns:
+        Generated text response, or a message starting with "❌ Error" on failure
+    """
+    try:
+        return generate(prompt, model, max_tokens, temperature, stream)
+    except (LLMUnavailable, resilience.CircuitOpenError, resilience.DeadlineExceeded) as e:
+        return f"❌ Error: {e}"
     except Exception as e:
         return f"❌ Error querying LLM: {str(e)}"
 
@@ -0,0 +1,167 @@
+"""
+Metrics
+Prometheus histograms and counters for the request pipeline, plus the
+per-request stage timings returned in the Server-Timing header.
+
+Stages are timed with `with stage("embed"):`, which feeds the
+study_jarvis_stage_seconds histogram, the current request's Server-Timing
+entry and a span of its trace (see tracing.py). With several server
+workers, set PROMETHEUS_MULTIPROC_DIR (start.py does this for you) so
+/metrics aggregates every worker.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+)
+
+import tracing
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200)
+
+REQUEST_SECONDS = Histogram(
+    "study_jarvis_request_seconds", "End-to-end request latency",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "study_jarvis_stage_seconds", "Time spent in one pipeline stage (embed, retrieve, prompt, generate, ...)",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "study_jarvis_llm_queue_seconds", "Time waiting for a free LLM generation slot", buckets=LATENCY_BUCKETS
+)
+LLM_TTFT_SECONDS = Histogram(
+    "study_jarvis_llm_time_to_first_token_seconds", "Time from calling the LLM to its first generated token",
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "study_jarvis_llm_tokens_per_second", "Generation speed reported by Ollama (eval_count / eval_duration)",
+    buckets=TOKEN_RATE_BUCKETS
+)
+LLM_TOKENS = Counter("study_jarvis_llm_generated_tokens", "Tokens generated by the LLM")
+CACHE_LOOKUPS = Counter(
+    "study_jarvis_cache_lookups", "Cache lookups by cache and result (hit/miss)", ["cache", "result"]
+)
+INGESTED_CHUNKS = Counter("study_jarvis_ingested_chunks", "Chunks ingested (including collapsed near-duplicates)")
+INGEST_SECONDS = Histogram(
+    "study_jarvis_ingest_seconds", "Time to ingest one document", buckets=LATENCY_BUCKETS
+)
+INGEST_CHUNKS_PER_SECOND = Histogram(
+    "study_jarvis_ingest_chunks_per_second", "Ingestion throughput per document",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+RETRIEVAL_DEPTH = Histogram(
+    "study_jarvis_retrieval_depth", "Chunks kept per question by adaptive retrieval",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 30)
+)
+
+# Stage durations (seconds) of the request being handled; the dict is shared
+# by every task and threadpool call the request spawns
+_request_timings = ContextVar("request_timings", default=None)
+
+@contextmanager
+def stage(name):
+    """Time a block as one pipeline stage (and a span of the current trace)"""
+    start = time.perf_counter()
+    with tracing.span(name):
+        try:
+            yield
+        finally:
+            record_stage(name, time.perf_counter() - start)
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def record_llm(response_data, queue_seconds, first_token_seconds=None):
+    """
+    Record one Ollama generation
+
+    Args:
+        response_data: Final Ollama response (carries eval_count/eval_duration in ns)
+        queue_seconds: Time spent waiting for a generation slot
+        first_token_seconds: Measured time to the first streamed token; for
+            non-streaming calls it is derived from Ollama's load and prompt
+            evaluation durations
+    """
+    LLM_QUEUE_SECONDS.observe(queue_seconds)
+    if first_token_seconds is None:
+        server_ns = response_data.get("load_duration", 0) + response_data.get("prompt_eval_duration", 0)
+        if server_ns:
+            first_token_seconds = queue_seconds + server_ns / 1e9
+    if first_token_seconds is not None:
+        LLM_TTFT_SECONDS.observe(first_token_seconds)
+
+    eval_count = response_data.get("eval_count", 0)
+    eval_duration = response_data.get("eval_duration", 0)
+    if eval_count:
+        LLM_TOKENS.inc(eval_count)
+    if eval_count and eval_duration:
+        LLM_TOKENS_PER_SECOND.observe(eval_count / (eval_duration / 1e9))
+
+def record_ingest(chunks, seconds):
+    INGESTED_CHUNKS.inc(chunks)
+    INGEST_SECONDS.observe(seconds)
+    if seconds > 0:
+        INGEST_CHUNKS_PER_SECOND.observe(chunks / seconds)
+
+def record_retrieval_depth(depth):
+    RETRIEVAL_DEPTH.observe(depth)
+
+def server_timing_header(timings):
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+def render():
+    """Prometheus exposition text for /metrics, aggregated across workers when configured"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency histogram plus the Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timings["total"] = time.perf_counter() - start
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_header(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            endpoint = scope.get("endpoint")
+            REQUEST_SECONDS.labels(
+                endpoint=getattr(endpoint, "__name__", "unmatched"),
+                method=scope["method"],
+                status=str(status),
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,409 @@
+"""
+Near-Duplicate Chunk Detection
+MinHash signatures with LSH banding, used at ingestion to collapse repeated
+headers, footers, slide templates and boilerplate into a single stored chunk.
+
+A chunk that nearly matches one already in the same subject partition (or
+earlier in the same document) is not embedded or stored again; instead the
+existing chunk's "sources" metadata gains a reference to the new source, and
+its "subjects"/"chapters" lists gain the new document's subject and chapter
+so filtered retrieval finds it for either document. Signatures, band buckets
+and each source's subject/chapter live in the shared SQLite database.
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+from dotenv import load_dotenv
+import numpy as np
+
+from db import get_connection, register_schema
+
+load_dotenv()
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1") == "1"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))  # estimated Jaccard similarity
+NUM_PERM = 64
+BANDS = 8  # 8 bands x 8 rows: candidates start showing up around ~0.77 similarity
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(1)
+# a < 2^31 and shingle hashes < 2^32 keep a * x + b inside 64 bits
+_PERM_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS chunk_signatures (
+        chunk_id TEXT PRIMARY KEY,
+        namespace TEXT NOT NULL,
+        signature BLOB NOT NULL,
+        sources TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chunk_bands (
+        namespace TEXT NOT NULL,
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        chunk_id TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_chunk_bands_bucket ON chunk_bands (namespace, band, bucket)",
+    "CREATE INDEX IF NOT EXISTS idx_chunk_bands_chunk ON chunk_bands (chunk_id)",
+    # Subject and chapter each source filed a (possibly shared) chunk under
+    """
+    CREATE TABLE IF NOT EXISTS chunk_sources (
+        chunk_id TEXT NOT NULL,
+        source TEXT NOT NULL,
+        subject TEXT,
+        chapter TEXT,
+        PRIMARY KEY (chunk_id, source)
+    )
+    """,
+)
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+def minhash(text):
+    """MinHash signature of a text's word shingles (None if the text has no words)"""
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return None
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+    hashes = np.fromiter(
+        (_hash64(s.encode("utf-8")) & 0xFFFFFFFF for s in shingles), dtype=np.uint64, count=len(shingles)
+    )
+    permuted = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+def band_buckets(signature):
+    """LSH bucket key for each band of a signature (signed 64-bit, as SQLite stores it)"""
+    keys = []
+    for band in range(BANDS):
+        key = _hash64(signature[band * ROWS:(band + 1) * ROWS].tobytes())
+        keys.append(key - (1 << 64) if key >= (1 << 63) else key)
+    return keys
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+class ChunkPlan:
+    """Which chunks of a document need embedding and which collapse into existing ones"""
+
+    def __init__(self, source, namespace):
+        self.source = source
+        self.namespace = namespace
+        self.new_indexes = []    # chunk_index of every chunk to embed and store
+        self.new_texts = []
+        self.signatures = []     # signature per new chunk (None if it has no words)
+        self.existing_refs = {}  # existing chunk_id -> chunk indexes that duplicate it
+        self.pending_refs = {}   # (earlier plan in the batch, position) -> chunk indexes that duplicate it
+        self.collapsed = 0       # duplicates within this document
+        self.stored_ids = None   # vector id per new chunk, once committed
+
+    @property
+    def duplicates(self):
+        return self.collapsed + sum(len(v) for v in (*self.existing_refs.values(), *self.pending_refs.values()))
+
+    @property
+    def depends_on(self):
+        """Earlier plans of the batch that must be committed before this one"""
+        return {plan for plan, _ in self.pending_refs}
+
+class PendingChunks:
+    """
+    Signatures planned in one upload batch but not stored yet
+
+    Files later in the batch collapse into these chunks too, so identical
+    files uploaded together are stored once.
+    """
+
+    def __init__(self):
+        self.buckets = {}  # (namespace, band, bucket) -> [(plan, position in plan.new_*)]
+
+    def add(self, plan):
+        for position, signature in enumerate(plan.signatures):
+            if signature is None:
+                continue
+            for band, bucket in enumerate(band_buckets(signature)):
+                self.buckets.setdefault((plan.namespace, band, bucket), []).append((plan, position))
+
+    def find(self, namespace, signature, buckets):
+        best, best_score = None, NEAR_DUP_THRESHOLD
+        for band, bucket in enumerate(buckets):
+            for plan, position in self.buckets.get((namespace, band, bucket), ()):
+                score = similarity(signature, plan.signatures[position])
+                if score >= best_score:
+                    best, best_score = (plan, position), score
+        return best
+
+def plan_chunks(chunks, source, namespace, pending=None):
+    """
+    Split a document's chunks into new ones and near-duplicates
+
+    Args:
+        chunks: Chunk texts in document order
+        source: Source filename the chunks came from
+        namespace: Subject partition the chunks will be stored in
+        pending: PendingChunks of the upload batch, if any; the plan is
+            matched against it and then added to it
+
+    Returns:
+        ChunkPlan; only plan.new_texts need to be embedded
+    """
+    plan = ChunkPlan(source, namespace)
+    if not NEAR_DUP_ENABLED:
+        plan.new_indexes = list(range(len(chunks)))
+        plan.new_texts = list(chunks)
+        plan.signatures = [None] * len(chunks)
+        return plan
+
+    conn = get_connection()
+    local_buckets = {}  # (band, bucket) -> positions in plan.new_* for this document
+
+    for chunk_index, text in enumerate(chunks):
+        signature = minhash(text)
+        if signature is None:
+            plan.new_indexes.append(chunk_index)
+            plan.new_texts.append(text)
+            plan.signatures.append(None)
+            continue
+        buckets = band_buckets(signature)
+
+        # Earlier in this same document?
+        local_match = None
+        for band, bucket in enumerate(buckets):
+            for position in local_buckets.get((band, bucket), ()):
+                if similarity(signature, plan.signatures[position]) >= NEAR_DUP_THRESHOLD:
+                    local_match = position
+                    break
+            if local_match is not None:
+                break
+        if local_match is not None:
+            plan.collapsed += 1
+            continue
+
+        # Already in the corpus?
+        existing_match = _find_existing(conn, namespace, signature, buckets)
+        if existing_match is not None:
+            plan.existing_refs.setdefault(existing_match, []).append(chunk_index)
+            continue
+
+        # Planned by an earlier file of the same batch?
+        pending_match = pending.find(namespace, signature, buckets) if pending is not None else None
+        if pending_match is not None:
+            plan.pending_refs.setdefault(pending_match, []).append(chunk_index)
+            continue
+
+        position = len(plan.new_indexes)
+        plan.new_indexes.append(chunk_index)
+        plan.new_texts.append(text)
+        plan.signatures.append(signature)
+        for band, bucket in enumerate(buckets):
+            local_buckets.setdefault((band, bucket), []).append(position)
+
+    if pending is not None:
+        pending.add(plan)
+    return plan
+
+def _find_existing(conn, namespace, signature, buckets):
+    candidates = set()
+    for band, bucket in enumerate(buckets):
+        candidates.update(row[0] for row in conn.execute(
+            "SELECT chunk_id FROM chunk_bands WHERE namespace = ? AND band = ? AND bucket = ?",
+            (namespace, band, bucket)
+        ))
+    best, best_score = None, NEAR_DUP_THRESHOLD
+    for chunk_id in candidates:
+        row = conn.execute("SELECT signature FROM chunk_signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+        if row is None:
+            continue
+        score = similarity(signature, np.frombuffer(row[0], dtype=np.uint64))
+        if score >= best_score:
+            best, best_score = chunk_id, score
+    return best
+
+def _shared_update(conn, chunk_id, namespace, sources):
+    """
+    Metadata update for a chunk shared by these sources
+
+    Returns:
+        {"namespace", "sources", "subjects", "chapters"}, plus the primary
+        "subject"/"chapter" when the first source's are known
+    """
+    scopes = {
+        source: (subject, chapter) for source, subject, chapter in conn.execute(
+            "SELECT source, subject, chapter FROM chunk_sources WHERE chunk_id = ?", (chunk_id,)
+        )
+    }
+    update = {"namespace": namespace, "sources": sources}
+    for field, position in (("subject", 0), ("chapter", 1)):
+        values = []
+        for source in sources:
+            value = scopes.get(source, (None, None))[position]
+            if value and value not in values:
+                values.append(value)
+        if values:
+            update[field + "s"] = values
+        primary = scopes.get(sources[0], (None, None))[position]
+        if primary:
+            update[field] = primary
+    return update
+
+def commit_plan(plan, vectors, subject=None, chapter=None):
+    """
+    Record a stored document's signatures and source references
+
+    Args:
+        plan: The ChunkPlan the vectors were built from
+        vectors: (id, embedding, metadata) tuples stored for plan.new_texts, in order
+        subject, chapter: What the document was filed under
+
+    Returns:
+        {chunk_id: {"namespace", "sources", "subjects", "chapters", ...}} for
+        existing chunks that gained this source, so the caller can update their
+        metadata in the vector store
+    """
+    if not NEAR_DUP_ENABLED:
+        return {}
+
+    plan.stored_ids = [vector_id for vector_id, _, _ in vectors]
+    # Chunks matched within the batch were stored (and committed) by earlier files
+    for (earlier, position), indexes in plan.pending_refs.items():
+        plan.existing_refs.setdefault(earlier.stored_ids[position], []).extend(indexes)
+    plan.pending_refs = {}
+
+    conn = get_connection()
+    updated = {}
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunk_sources (chunk_id, source, subject, chapter) VALUES (?, ?, ?, ?)",
+            [(vector_id, plan.source, subject, chapter) for vector_id, _, _ in vectors]
+            + [(chunk_id, plan.source, subject, chapter) for chunk_id in plan.existing_refs]
+        )
+        for (vector_id, _, _), signature in zip(vectors, plan.signatures):
+            if signature is None:
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO chunk_signatures (chunk_id, namespace, signature, sources) VALUES (?, ?, ?, ?)",
+                (vector_id, plan.namespace, signature.tobytes(), json.dumps([plan.source]))
+            )
+            conn.executemany(
+                "INSERT INTO chunk_bands (namespace, band, bucket, chunk_id) VALUES (?, ?, ?, ?)",
+                [(plan.namespace, band, bucket, vector_id) for band, bucket in enumerate(band_buckets(signature))]
+            )
+
+        for chunk_id in plan.existing_refs:
+            row = conn.execute("SELECT sources FROM chunk_signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            sources = json.loads(row[0]) if row else []
+            if plan.source not in sources:
+                sources.append(plan.source)
+                conn.execute(
+                    "UPDATE chunk_signatures SET sources = ? WHERE chunk_id = ?", (json.dumps(sources), chunk_id)
+                )
+            # Re-ingesting under a new subject or chapter changes the lists too
+            updated[chunk_id] = _shared_update(conn, chunk_id, plan.namespace, sources)
+    return updated
+
+def release_source(source):
+    """
+    Drop a deleted source from the chunks it shared with other sources
+
+    Returns:
+        {chunk_id: {"namespace", "sources", ...}} (see commit_plan) for chunks
+        that must survive with the remaining sources (the first one becomes the
+        primary "source")
+    """
+    conn = get_connection()
+    survivors = {}
+    with conn:
+        conn.execute("DELETE FROM chunk_sources WHERE source = ?", (source,))
+        rows = conn.execute(
+            "SELECT chunk_id, namespace, sources FROM chunk_signatures WHERE sources LIKE ?",
+            (f"%{json.dumps(source)}%",)
+        ).fetchall()
+        for chunk_id, namespace, sources_json in rows:
+            sources = json.loads(sources_json)
+            if source not in sources:
+                continue
+            remaining = [s for s in sources if s != source]
+            if remaining:
+                conn.execute(
+                    "UPDATE chunk_signatures SET sources = ? WHERE chunk_id = ?", (json.dumps(remaining), chunk_id)
+                )
+                survivors[chunk_id] = _shared_update(conn, chunk_id, namespace, remaining)
+            else:
+                conn.execute("DELETE FROM chunk_signatures WHERE chunk_id = ?", (chunk_id,))
+                conn.execute("DELETE FROM chunk_bands WHERE chunk_id = ?", (chunk_id,))
+    return survivors
+
+def source_chunks(source):
+    """(chunk_id, subject, chapter) of every chunk a source references, its own and shared ones"""
+    return get_connection().execute(
+        "SELECT chunk_id, subject, chapter FROM chunk_sources WHERE source = ?", (source,)
+    ).fetchall()
+
+def backfill(matches=None):
+    """
+    Compute signatures for chunks ingested before near-duplicate detection existed
+
+    Args:
+        matches: Chunks as {"id", "metadata"} dicts (defaults to scanning the index)
+    """
+    import pinecone_client
+
+    if matches is None:
+        matches = pinecone_client.scan_chunks()
+    conn = get_connection()
+    known = {row[0] for row in conn.execute("SELECT chunk_id FROM chunk_signatures")}
+    added = 0
+    with conn:
+        for match in matches:
+            metadata = match.get("metadata") or {}
+            if match["id"] in known or not metadata.get("text"):
+                continue
+            signature = minhash(metadata["text"])
+            if signature is None:
+                continue
+            namespace = pinecone_client.subject_namespace(metadata.get("subject"))
+            sources = list(metadata.get("sources") or [metadata.get("source", "Unknown")])
+            conn.execute(
+                "INSERT INTO chunk_signatures (chunk_id, namespace, signature, sources) VALUES (?, ?, ?, ?)",
+                (match["id"], namespace, signature.tobytes(), json.dumps(sources))
+            )
+            conn.executemany(
+                "INSERT INTO chunk_bands (namespace, band, bucket, chunk_id) VALUES (?, ?, ?, ?)",
+                [(namespace, band, bucket, match["id"]) for band, bucket in enumerate(band_buckets(signature))]
+            )
+            # Only the primary source's subject and chapter are known for old chunks
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunk_sources (chunk_id, source, subject, chapter) VALUES (?, ?, ?, ?)",
+                [
+                    (match["id"], source, metadata.get("subject"), metadata.get("chapter") if i == 0 else None)
+                    for i, source in enumerate(sources)
+                ]
+            )
+            added += 1
+    print(f"✅ Added signatures for {added} existing chunks")
+    return added
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        backfill()
+    else:
+        print("""
+Usage:
+    python near_dup.py backfill    Compute signatures for chunks already in Pinecone
+        """)
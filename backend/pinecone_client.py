@@ -3,82 +3,394 @@ Pinecone Vector Database Client
 Handles initialization, indexing, and querying of document embeddings
 """
 import os
-from pinecone import Pinecone, ServerlessSpec
+import re
+import json
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import requests
 
-load_dotenv()
+import metrics
+import projection
+from lexical_index import LIST_FIELDS
+import resilience
+from db import bump_version
 
-# Initialize Pinecone
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+load_dotenv()
 
 INDEX_NAME = "study-jarvis"
 DIMENSION = 384  # all-MiniLM-L6-v2 embedding dimension
 
+# Talk to the index's data plane directly (skips the control-plane lookup);
+# also how the benchmarks point the app at bench/fake_vector_store.py
+INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")
+# Same, for the projected index while a projection is active (see projection.py)
+PROJECTED_INDEX_HOST = os.getenv("PROJECTED_INDEX_HOST")
+
+# Longest a single query may take (a request deadline can cut it shorter)
+VECTOR_STORE_TIMEOUT_SECONDS = float(os.getenv("VECTOR_STORE_TIMEOUT_SECONDS", "10"))
+
+# Chunks are partitioned into one namespace per subject; chunks without a
+# subject stay in the default ("") namespace
+SUBJECT_NAMESPACE_PREFIX = "subject-"
+NAMESPACE_CACHE_SECONDS = 30
+LIST_PAGE_SIZE = 100  # ids per list page (Pinecone's maximum), each fetched in one request
+
+# Change counter bumped on every write; drives the /documents ETag
+CORPUS_VERSION = "corpus"
+
+# Pinecone client and index handle (lazy-loaded so importing this module stays cheap)
+pc = None
+_index = None
+
+# (fetched_at, [namespace, ...]) from describe_index_stats
+_namespace_cache = (0.0, [])
+
+# Data-plane base URL and per-thread HTTP sessions for bulk_upsert
+_index_host = None
+_data_plane = threading.local()
+
+def subject_namespace(subject):
+    """Namespace holding a subject's chunks ("" for chunks without a subject)"""
+    if not subject:
+        return ""
+    slug = re.sub(r"[^a-z0-9]+", "-", subject.lower()).strip("-")
+    return f"{SUBJECT_NAMESPACE_PREFIX}{slug or 'untitled'}"
+
+def metadata_filter(filter):
+    """
+    Pinecone filter for {field: value} equality conditions
+
+    Chunks shared by several files keep every file's source, subject and
+    chapter in list fields ("sources", "subjects", "chapters"), which match too.
+    """
+    if not filter:
+        return None
+    conditions = []
+    for field, value in filter.items():
+        condition = {field: {"$eq": value}}
+        if field in LIST_FIELDS:
+            condition = {"$or": [condition, {LIST_FIELDS[field]: {"$in": [value]}}]}
+        conditions.append(condition)
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def list_chunk_namespaces(refresh=False):
+    """Namespaces that hold note chunks (the default one plus every subject partition)"""
+    global _namespace_cache
+    fetched_at, namespaces = _namespace_cache
+    stale = refresh or time.time() - fetched_at > NAMESPACE_CACHE_SECONDS
+    metrics.record_cache("namespaces", not stale)
+    # While the vector store is down, keep the last list instead of waiting on it
+    if stale and not resilience.VECTOR_STORE_BREAKER.rejecting():
+        try:
+            stats = get_index().describe_index_stats(
+                _request_timeout=resilience.time_left(VECTOR_STORE_TIMEOUT_SECONDS)
+            )
+            namespaces = [
+                name for name in stats.get('namespaces', {})
+                if name == "" or name.startswith(SUBJECT_NAMESPACE_PREFIX)
+            ]
+        except Exception as e:
+            print(f"❌ Error listing namespaces: {e}")
+        if "" not in namespaces:
+            namespaces.append("")
+        _namespace_cache = (time.time(), namespaces)
+    return list(namespaces)
+
+def _remember_namespace(namespace):
+    fetched_at, namespaces = _namespace_cache
+    if namespace not in namespaces:
+        namespaces.append(namespace)
+
+def index_name():
+    """Index the vectors live in: the projection's own index while one is active"""
+    active = projection.get_active()
+    return active.index_name if active else INDEX_NAME
+
+def index_dimension():
+    """Dimension of the stored vectors"""
+    active = projection.get_active()
+    return active.dim if active else DIMENSION
+
+def _index_host_override():
+    return PROJECTED_INDEX_HOST if projection.get_active() else INDEX_HOST
+
+def to_index_space(vectors):
+    """
+    Map embeddings into the stored vectors' space
+
+    Full-dimension embeddings are projected while a projection is active;
+    vectors that are already projected (e.g. read back from the index) and
+    everything when no projection is active pass through unchanged.
+    """
+    active = projection.get_active()
+    if active is None or len(vectors) == 0 or len(vectors[0]) != active.input_dim:
+        return vectors
+    return active.project(vectors).tolist()
+
+def _project_vectors(vectors):
+    projected = to_index_space([values for _, values, _ in vectors])
+    return [(vector_id, values, metadata) for (vector_id, _, metadata), values in zip(vectors, projected)]
+
+def reset_index():
+    """Drop the cached index handle and namespaces (after the active projection changes)"""
+    global _index, _index_host, _namespace_cache
+    _index = None
+    _index_host = None
+    _namespace_cache = (0.0, [])
+
+def get_client():
+    """Get or initialize the Pinecone client"""
+    global pc
+    if pc is None:
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    return pc
+
 def init_index():
     """Initialize Pinecone index if it doesn't exist"""
+    global _index
+    name, dimension, host = index_name(), index_dimension(), _index_host_override()
+    if host:
+        _index = get_client().Index(name, host=host)
+        print(f"✅ Using index at {host}")
+        return _index
+
     try:
+        from pinecone import ServerlessSpec
+        pc = get_client()
+
         # Check if index exists
         existing_indexes = [index.name for index in pc.list_indexes()]
 
-        if INDEX_NAME not in existing_indexes:
-            print(f"Creating new index: {INDEX_NAME}")
+        if name not in existing_indexes:
+            print(f"Creating new index: {name} ({dimension} dimensions)")
             pc.create_index(
-                name=INDEX_NAME,
-                dimension=DIMENSION,
+                name=name,
+                dimension=dimension,
                 metric="cosine",
                 spec=ServerlessSpec(
                     cloud=os.getenv("PINECONE_CLOUD", "aws"),
                     region=os.getenv("PINECONE_REGION", "us-east-1")
                 )
             )
-            print(f"✅ Index '{INDEX_NAME}' created successfully!")
+            print(f"✅ Index '{name}' created successfully!")
         else:
-            print(f"✅ Index '{INDEX_NAME}' already exists")
+            print(f"✅ Index '{name}' already exists")
 
-        return pc.Index(INDEX_NAME)
+        _index = pc.Index(name)
+        return _index
     except Exception as e:
         print(f"❌ Error initializing Pinecone index: {e}")
         raise
 
 def get_index():
     """Get the Pinecone index instance"""
+    global _index
+    if _index is not None:
+        return _index
     try:
-        return pc.Index(INDEX_NAME)
+        _index = get_client().Index(index_name(), host=_index_host_override() or "")
+        return _index
     except Exception as e:
         print(f"❌ Error getting index: {e}")
         return init_index()
 
-def upsert_vectors(vectors):
+def upsert_vectors(vectors, namespace=None):
     """
     Upsert vectors to Pinecone
     vectors: list of tuples (id, embedding, metadata)
+    namespace: optional namespace (default namespace if None)
     """
     try:
-        index = get_index()
-        index.upsert(vectors=vectors)
+        with resilience.VECTOR_STORE_BREAKER.call():
+            index = get_index()
+            index.upsert(vectors=_project_vectors(vectors), namespace=namespace)
+        bump_version(CORPUS_VERSION)
         print(f"✅ Upserted {len(vectors)} vectors to Pinecone")
         return True
     except Exception as e:
         print(f"❌ Error upserting vectors: {e}")
         return False
 
-def query_vectors(query_embedding, top_k=5, filter=None):
+def query_vectors(query_embedding, top_k=5, filter=None, namespace=None):
     """
-    Query Pinecone for similar vectors
+    Query Pinecone for similar vectors (times out at the request deadline)
     Returns: list of matches with metadata
+    Raises: the query error, or resilience.CircuitOpenError / DeadlineExceeded
     """
-    try:
+    timeout = resilience.time_left(VECTOR_STORE_TIMEOUT_SECONDS)
+    with resilience.VECTOR_STORE_BREAKER.call():
         index = get_index()
         results = index.query(
-            vector=query_embedding,
+            vector=to_index_space([query_embedding])[0],
             top_k=top_k,
             include_metadata=True,
-            filter=filter
+            filter=filter,
+            namespace=namespace,
+            _request_timeout=timeout
         )
-        return results.get('matches', [])
+    return results.get('matches', [])
+
+def index_host():
+    """Base URL of the index's data plane"""
+    global _index_host
+    if _index_host is None:
+        host = _index_host_override() or get_client().describe_index(index_name()).host
+        _index_host = host if host.startswith("http") else f"https://{host}"
+    return _index_host
+
+def _data_plane_session():
+    session = getattr(_data_plane, "session", None)
+    if session is None:
+        session = _data_plane.session = requests.Session()
+        session.headers.update({"Api-Key": os.getenv("PINECONE_API_KEY", ""), "Content-Type": "application/json"})
+    return session
+
+def namespace_counts():
+    """Number of vectors in each namespace of the index, from describe_index_stats"""
+    stats = get_index().describe_index_stats()
+    return {name: summary.get("vector_count", 0) for name, summary in stats.get("namespaces", {}).items()}
+
+def list_vector_ids(namespace=None):
+    """
+    Yield the ids of every vector in a namespace, one page at a time
+
+    Goes through the REST list endpoint (the pinned client has no list()),
+    which serverless indexes support. Raises on failure.
+    """
+    session = _data_plane_session()
+    token = None
+    while True:
+        params = {"namespace": namespace or "", "limit": LIST_PAGE_SIZE}
+        if token:
+            params["paginationToken"] = token
+        response = session.get(f"{index_host()}/vectors/list", params=params, timeout=60)
+        response.raise_for_status()
+        data = response.json()
+        ids = [vector["id"] for vector in data.get("vectors", [])]
+        if ids:
+            yield ids
+        token = (data.get("pagination") or {}).get("next")
+        if not token:
+            return
+
+def iter_vectors(namespace=None, include_values=True):
+    """
+    Yield every stored vector of a namespace in batches of {"id", "values", "metadata"}
+
+    Ids are paged through the list endpoint and fetched a page at a time, so
+    there is no cap (a zero-vector query stops at top_k's 10,000). Vectors deleted between listing
+    and fetching are skipped. Raises on failure.
+    """
+    session = _data_plane_session()
+    for ids in list_vector_ids(namespace):
+        response = session.get(
+            f"{index_host()}/vectors/fetch", params={"ids": ids, "namespace": namespace or ""}, timeout=60
+        )
+        response.raise_for_status()
+        vectors = response.json().get("vectors", {})
+        yield [
+            {
+                "id": vector_id,
+                "values": vectors[vector_id].get("values") if include_values else None,
+                "metadata": vectors[vector_id].get("metadata") or {},
+            }
+            for vector_id in ids if vector_id in vectors
+        ]
+
+def bulk_upsert(vectors, namespace=None):
+    """
+    Upsert a batch straight through the REST data plane
+
+    The client validates every vector as a model object, which costs several
+    times more than the request itself and holds the GIL, so bulk loads
+    (snapshot imports) post the JSON directly. Raises on failure. Callers
+    bump CORPUS_VERSION once the whole load is done.
+
+    Returns:
+        Number of vectors upserted
+    """
+    session = _data_plane_session()
+    body = {
+        "vectors": [
+            {"id": vector_id, "values": values, "metadata": metadata}
+            for vector_id, values, metadata in _project_vectors(vectors)
+        ],
+        "namespace": namespace or "",
+    }
+    response = session.post(f"{index_host()}/vectors/upsert", data=json.dumps(body), timeout=60)
+    response.raise_for_status()
+    return response.json().get("upsertedCount", len(vectors))
+
+def upsert_partitioned(vectors):
+    """Upsert chunk vectors into their subject namespaces"""
+    by_namespace = {}
+    for vector in vectors:
+        by_namespace.setdefault(subject_namespace(vector[2].get("subject")), []).append(vector)
+
+    success = True
+    for namespace, group in by_namespace.items():
+        success = upsert_vectors(group, namespace=namespace) and success
+        _remember_namespace(namespace)
+    return success
+
+def query_partitions(query_embedding, top_k=5, filter=None, namespaces=None):
+    """
+    Query several namespaces concurrently and merge the best matches
+
+    namespaces defaults to every chunk namespace.
+    """
+    if namespaces is None:
+        namespaces = list_chunk_namespaces()
+    if len(namespaces) == 1:
+        return query_vectors(query_embedding, top_k=top_k, filter=filter, namespace=namespaces[0])
+
+    # Each query runs in a copy of this context so it keeps the request's deadline
+    contexts = {namespace: contextvars.copy_context() for namespace in namespaces}
+    with ThreadPoolExecutor(max_workers=min(8, len(namespaces))) as executor:
+        results = executor.map(
+            lambda namespace: contexts[namespace].run(
+                query_vectors, query_embedding, top_k=top_k, filter=filter, namespace=namespace
+            ),
+            namespaces
+        )
+        merged = [match for matches in results for match in matches]
+    merged.sort(key=lambda match: match.get('score', 0), reverse=True)
+    return merged[:top_k]
+
+def update_metadata(vector_id, metadata, namespace=None):
+    """Overwrite selected metadata fields of one vector"""
+    try:
+        get_index().update(id=vector_id, set_metadata=metadata, namespace=namespace)
+        return True
     except Exception as e:
-        print(f"❌ Error querying vectors: {e}")
-        return []
+        print(f"❌ Error updating metadata for {vector_id}: {e}")
+        return False
+
+def fetch_vectors(ids, namespace=None):
+    """
+    Fetch vectors by id
+    Returns: dict of id -> {"values": [...], "metadata": {...}} for the ids that exist
+    """
+    try:
+        index = get_index()
+        response = index.fetch(ids=ids, namespace=namespace)
+        return {
+            vector_id: {"values": list(vector.values), "metadata": vector.metadata or {}}
+            for vector_id, vector in response.vectors.items()
+        }
+    except Exception as e:
+        print(f"❌ Error fetching vectors: {e}")
+        return {}
+
+def scan_chunks(include_values=False):
+    """Yield every stored chunk vector ({"id", "values", "metadata"}) from every subject namespace"""
+    for namespace in list_chunk_namespaces(refresh=True):
+        for batch in iter_vectors(namespace, include_values=include_values):
+            yield from batch
 
 def get_document_stats():
     """Get statistics about stored documents by scanning metadata"""
@@ -88,32 +400,33 @@ def get_document_stats():
 
         documents = {}
 
-        # Use query with zero vector to sample documents
-        # Fetch larger sample to get all unique sources
         try:
-            sample_results = index.query(
-                vector=[0.0] * DIMENSION,
-                top_k=10000,  # Increased to get more results
-                include_metadata=True
-            )
-
-            for match in sample_results.get('matches', []):
-                if match.get('metadata'):
-                    source = match['metadata'].get('source', 'Unknown')
-
+            for match in scan_chunks():
+                metadata = match.get('metadata')
+                if not metadata:
+                    continue
+                # A near-duplicate chunk counts for every file that contains it
+                for source in metadata.get('sources') or [metadata.get('source', 'Unknown')]:
                     if source not in documents:
                         documents[source] = {
                             'name': source,
                             'chunks': 0,
-                            'upload_time': match['metadata'].get('upload_time', 'Unknown'),
-                            'subject': match['metadata'].get('subject', 'General')
+                            'upload_time': metadata.get('upload_time', 'Unknown'),
+                            'subject': metadata.get('subject', 'General')
                         }
                     documents[source]['chunks'] += 1
         except Exception as e:
             print(f"Warning: Could not fetch all documents: {e}")
 
+        chunk_namespaces = set(list_chunk_namespaces())
+        total_vectors = sum(
+            summary.get('vector_count', 0)
+            for name, summary in stats.get('namespaces', {}).items()
+            if name in chunk_namespaces
+        )
+
         return {
-            'total_vectors': stats.get('total_vector_count', 0),
+            'total_vectors': total_vectors,
             'documents': sorted(list(documents.values()), key=lambda x: x.get('upload_time', ''), reverse=True)
         }
     except Exception as e:
@@ -123,12 +436,13 @@ def get_document_stats():
             'documents': []
         }
 
-def delete_document(source_name):
+def delete_document(source_name, namespace=None):
     """
     Delete all vectors for a specific document
 
     Args:
         source_name: The filename/source to delete
+        namespace: Namespace to delete from (default namespace if None)
 
     Returns:
         dict with success status and count of deleted vectors
@@ -137,7 +451,8 @@ def delete_document(source_name):
         index = get_index()
 
         # Use the filter to delete vectors with matching source
-        delete_response = index.delete(filter={"source": {"$eq": source_name}})
+        index.delete(filter={"source": {"$eq": source_name}}, namespace=namespace)
+        bump_version(CORPUS_VERSION)
 
         print(f"✅ Deleted document: {source_name}")
         return {
@@ -153,11 +468,39 @@ def delete_document(source_name):
             'source': source_name
         }
 
+def partition_by_subject():
+    """
+    Move subject-tagged chunks from the default namespace into their subject namespaces
+
+    One-off migration for indexes created before chunks were partitioned.
+    """
+    # Read everything before deleting, so the listing isn't paged while it shrinks
+    moved = [
+        (v['id'], v['values'], v['metadata'])
+        for batch in iter_vectors(namespace="", include_values=True)
+        for v in batch if v['metadata'].get('subject')
+    ]
+    if not moved:
+        print("✅ Nothing to migrate")
+        return 0
+
+    for start in range(0, len(moved), 100):
+        batch = moved[start:start + 100]
+        if not upsert_partitioned(batch):
+            raise RuntimeError("Upsert failed during migration; default namespace left untouched")
+        get_index().delete(ids=[vector_id for vector_id, _, _ in batch], namespace="")
+        bump_version(CORPUS_VERSION)
+    print(f"✅ Moved {len(moved)} chunks into subject namespaces")
+    return len(moved)
+
 def delete_all():
     """Delete all vectors from the index (use with caution!)"""
     try:
         index = get_index()
-        index.delete(delete_all=True)
+        namespaces = set(index.describe_index_stats().get('namespaces', {})) | {""}
+        for namespace in namespaces:
+            index.delete(delete_all=True, namespace=namespace)
+        bump_version(CORPUS_VERSION)
         print("✅ Deleted all vectors from index")
         return True
     except Exception as e:
@@ -165,7 +508,12 @@ def delete_all():
         return False
 
 if __name__ == "__main__":
-    # Test initialization
-    print("Testing Pinecone connection...")
-    init_index()
-    print("Pinecone setup complete!")
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "partition":
+        partition_by_subject()
+    else:
+        # Test initialization
+        print("Testing Pinecone connection...")
+        init_index()
+        print("Pinecone setup complete!")
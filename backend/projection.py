@@ -0,0 +1,382 @@
+"""
+Dimensionality Reduction
+Optional projection of the 384-dimensional embeddings down to a smaller
+dimension before they are stored or queried. Within one course's notes most
+of the variance lives in a few dozen directions, so a PCA fitted on the
+ingested corpus keeps nearly the same neighbours at a fraction of the size,
+and every query scans and transfers less. A random projection (no fitting)
+is available for comparison.
+
+A projection is saved to PROJECTION_PATH with a version number and a
+fingerprint. Projected vectors live in their own index named after both
+(study-jarvis-d64-v2), so a refit fills a new index instead of mixing
+incompatible vectors, and the full-dimension index is left as it was.
+pinecone_client projects every full-dimension vector it stores or queries
+with while PROJECTION_ENABLED=1.
+
+Usage:
+    python projection.py report [dim ...]          # recall@10 vs dimension on the current corpus
+    python projection.py build <dim> [pca|random]  # fit on the corpus and fill a new projected index
+    python projection.py status
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import numpy as np
+
+load_dotenv()
+
+PROJECTION_ENABLED = os.getenv("PROJECTION_ENABLED", "0") == "1"
+PROJECTION_PATH = os.getenv("PROJECTION_PATH", "projection.npz")
+
+METHODS = ("pca", "random")
+REPORT_DIMS = (32, 48, 64, 96, 128, 192, 256)
+REPORT_K = 10
+REPORT_QUERIES = 200
+BUILD_BATCH_SIZE = 100
+BUILD_WORKERS = 8
+BUILD_VERIFY_SECONDS = 120  # how long to wait for the new index's counts to catch up
+
+# Projection in use (loaded from PROJECTION_PATH on first use)
+_active = None
+_loaded = False
+_lock = threading.Lock()
+
+class Projection:
+    """A linear map onto a smaller orthonormal basis: x @ components.T, renormalized"""
+
+    def __init__(self, method, components, info=None):
+        self.method = method
+        self.components = np.asarray(components, dtype=np.float32)
+        self.info = info or {}
+        self.fingerprint = hashlib.blake2b(self.components.tobytes(), digest_size=8).hexdigest()
+
+    @property
+    def dim(self):
+        return self.components.shape[0]
+
+    @property
+    def input_dim(self):
+        return self.components.shape[1]
+
+    @property
+    def version(self):
+        return self.info.get("version", 0)
+
+    @property
+    def index_name(self):
+        return self.info.get("index_name")
+
+    def project(self, vectors):
+        """Project a (n, input_dim) array (or a single vector) to unit-length (n, dim) float32"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        single = vectors.ndim == 1
+        projected = np.atleast_2d(vectors) @ self.components.T
+        # The index uses cosine similarity; unit length keeps scores comparable to before
+        projected /= np.maximum(np.linalg.norm(projected, axis=1, keepdims=True), 1e-12)
+        return projected[0] if single else projected
+
+    def save(self, path):
+        info = {**self.info, "method": self.method, "fingerprint": self.fingerprint}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, components=self.components, info=np.array(json.dumps(info)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            info = json.loads(str(data["info"]))
+            projection = cls(info["method"], data["components"], info)
+        if projection.fingerprint != info.get("fingerprint"):
+            raise ValueError(f"Projection file {path} is corrupt (fingerprint mismatch)")
+        return projection
+
+def fit_pca(vectors, dim):
+    """
+    Principal directions of the corpus
+
+    Uncentered (eigenvectors of X^T X rather than the covariance): cosine
+    similarity is measured from the origin, and subtracting the corpus mean
+    would reorder neighbours even with every dimension kept.
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    second_moment = vectors.T @ vectors / max(len(vectors), 1)
+    eigenvalues, eigenvectors = np.linalg.eigh(second_moment)
+    order = np.argsort(eigenvalues)[::-1][:dim]
+    explained = float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12))
+    return Projection("pca", eigenvectors[:, order].T, {"explained_variance": round(explained, 4)})
+
+def fit_random(input_dim, dim, seed=0):
+    """Orthonormal Gaussian random projection (needs no corpus)"""
+    gaussian = np.random.default_rng(seed).standard_normal((input_dim, dim))
+    basis, _ = np.linalg.qr(gaussian)
+    return Projection("random", basis.T, {"seed": seed})
+
+def fit(vectors, dim, method="pca"):
+    """
+    Fit a projection on corpus vectors
+
+    Args:
+        vectors: (n, input_dim) array of full-dimension embeddings
+        dim: Target dimension (smaller than input_dim)
+        method: "pca" or "random"
+
+    Returns:
+        Projection
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    if not 0 < dim < vectors.shape[1]:
+        raise ValueError(f"dim must be between 1 and {vectors.shape[1] - 1}")
+    projection = fit_pca(vectors, dim) if method == "pca" else fit_random(vectors.shape[1], dim)
+    projection.info.update({
+        "samples": len(vectors),
+        "fitted_at": datetime.now().isoformat(timespec="seconds"),
+    })
+    return projection
+
+def get_active():
+    """The projection stored and query vectors go through, or None when disabled"""
+    global _active, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if PROJECTION_ENABLED:
+                    if not os.path.exists(PROJECTION_PATH):
+                        raise FileNotFoundError(
+                            f"PROJECTION_ENABLED=1 but {PROJECTION_PATH} doesn't exist "
+                            f"(create it with: python projection.py build <dim>)"
+                        )
+                    _active = Projection.load(PROJECTION_PATH)
+                    print(f"✅ Using {_active.method} projection v{_active.version} "
+                          f"({_active.input_dim} → {_active.dim} dims, index '{_active.index_name}')")
+                _loaded = True
+    return _active
+
+def activate(projection):
+    """Switch this process to a projection (None: store full-dimension vectors)"""
+    global _active, _loaded
+    with _lock:
+        _active = projection
+        _loaded = True
+
+def _normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def _top_k(scores, k):
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+def recall_report(vectors, dims=REPORT_DIMS, k=REPORT_K, queries=REPORT_QUERIES, seed=0):
+    """
+    How well projected search keeps the full-dimension neighbours
+
+    Holds some vectors out as queries, fits on the rest, and compares each
+    query's top k under projected cosine similarity with its exact top k.
+
+    Returns:
+        One dict per dimension: dim, bytes_per_vector, recall per method
+        and the PCA's explained variance
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    held_out = min(queries, len(vectors) // 5)
+    if held_out < 1:
+        raise ValueError("Need at least 5 vectors for a recall report")
+    query_vectors, corpus = vectors[order[:held_out]], vectors[order[held_out:]]
+    k = min(k, len(corpus))
+    exact = _top_k(_normalize(query_vectors) @ _normalize(corpus).T, k)
+
+    rows = []
+    for dim in sorted(set(dims)):
+        if not 0 < dim < vectors.shape[1]:
+            continue
+        row = {"dim": dim, "bytes_per_vector": dim * 4}
+        for method in METHODS:
+            projection = fit(corpus, dim, method)
+            found = _top_k(projection.project(query_vectors) @ projection.project(corpus).T, k)
+            row[f"{method}_recall"] = round(float(np.mean([len(a & b) / k for a, b in zip(exact, found)])), 4)
+            if method == "pca":
+                row["explained_variance"] = projection.info["explained_variance"]
+        rows.append(row)
+    rows.append({"dim": vectors.shape[1], "bytes_per_vector": vectors.shape[1] * 4,
+                 **{f"{method}_recall": 1.0 for method in METHODS}, "explained_variance": 1.0})
+    return rows
+
+def load_corpus():
+    """
+    Full-dimension vectors of every stored chunk
+
+    Read straight from the index when it holds full-dimension vectors; once a
+    projection is active the originals aren't stored, so the chunk texts are
+    re-embedded. Every id is paged through, so namespaces of any size are
+    read in full.
+
+    Returns:
+        {namespace: [(id, values, metadata), ...]}
+
+    Raises:
+        ValueError: A namespace holds more vectors than could be read
+    """
+    import pinecone_client
+
+    active = get_active()
+    counts = pinecone_client.namespace_counts()
+    corpus = {}
+    for namespace in pinecone_client.list_chunk_namespaces(refresh=True):
+        rows = [
+            (vector["id"], vector["values"], vector["metadata"])
+            for batch in pinecone_client.iter_vectors(namespace, include_values=active is None)
+            for vector in batch
+        ]
+        if len(rows) < counts.get(namespace, 0):
+            raise ValueError(f"Namespace '{namespace}': read {len(rows)} of {counts[namespace]} vectors")
+        if rows:
+            corpus[namespace] = rows
+
+    if active is not None and corpus:
+        from ingest_notes import get_embed_model
+
+        model = get_embed_model()
+        print(f"🔧 Re-embedding {sum(len(rows) for rows in corpus.values())} chunks (the index holds projected vectors)")
+        for namespace, rows in corpus.items():
+            embeddings = model.encode([metadata.get("text", "") for _, _, metadata in rows], batch_size=64)
+            corpus[namespace] = [
+                (vector_id, embedding.tolist(), metadata)
+                for (vector_id, _, metadata), embedding in zip(rows, embeddings)
+            ]
+    return corpus
+
+def _saved_version(path):
+    try:
+        return Projection.load(path).version
+    except (OSError, ValueError, KeyError):
+        return 0
+
+def _verify_counts(expected):
+    """
+    Wait until the current index holds expected[namespace] vectors in each namespace
+
+    Index stats lag behind upserts, so they are polled for a while before a
+    shortfall counts as one. Raises RuntimeError if the counts never match.
+    """
+    import pinecone_client
+
+    deadline = time.time() + BUILD_VERIFY_SECONDS
+    while True:
+        counts = pinecone_client.namespace_counts()
+        missing = {
+            namespace: (counts.get(namespace, 0), count)
+            for namespace, count in expected.items() if counts.get(namespace, 0) != count
+        }
+        if not missing:
+            return
+        if time.time() >= deadline:
+            raise RuntimeError("Projected index doesn't match the source: " + ", ".join(
+                f"'{namespace}' has {found} of {count} vectors" for namespace, (found, count) in missing.items()
+            ))
+        time.sleep(2)
+
+def build(dim, method="pca", path=PROJECTION_PATH):
+    """
+    Fit a projection on the current corpus and fill a new projected index with it
+
+    The source index is left untouched. Document centroids are rebuilt from
+    the projected chunks. The projection is only saved (and so only served)
+    once the new index holds as many vectors per namespace as the source.
+
+    Returns:
+        The saved Projection
+    """
+    import pinecone_client
+    import summary_vectors
+
+    started = time.perf_counter()
+    corpus = load_corpus()
+    rows = [row for namespace_rows in corpus.values() for row in namespace_rows]
+    if not rows:
+        raise ValueError("No chunks in the index to fit a projection on")
+
+    projection = fit(np.asarray([values for _, values, _ in rows], dtype=np.float32), dim, method)
+    version = _saved_version(path) + 1
+    projection.info.update({
+        "version": version,
+        "index_name": f"{pinecone_client.INDEX_NAME}-d{dim}-v{version}",
+    })
+    variance = projection.info.get("explained_variance")
+    print(f"📐 Fitted {method} projection v{version} on {len(rows)} chunks: {projection.input_dim} → {dim} dims"
+          + (f" ({variance:.1%} of variance)" if variance is not None else ""))
+
+    # From here on this process reads and writes the new index
+    previous = get_active()
+    activate(projection)
+    pinecone_client.reset_index()
+    pinecone_client.init_index()
+    try:
+        with ThreadPoolExecutor(max_workers=BUILD_WORKERS) as executor:
+            for namespace, namespace_rows in corpus.items():
+                projected = projection.project([values for _, values, _ in namespace_rows]).tolist()
+                vectors = [
+                    (vector_id, values, metadata)
+                    for (vector_id, _, metadata), values in zip(namespace_rows, projected)
+                ]
+                batches = [vectors[i:i + BUILD_BATCH_SIZE] for i in range(0, len(vectors), BUILD_BATCH_SIZE)]
+                stored = sum(executor.map(lambda batch: pinecone_client.bulk_upsert(batch, namespace=namespace), batches))
+                print(f"✅ {namespace or '(default)'}: {stored} vectors")
+        _verify_counts({namespace: len(namespace_rows) for namespace, namespace_rows in corpus.items()})
+    except Exception:
+        # Leave the projection in use before the build (if any) as it was
+        activate(previous)
+        pinecone_client.reset_index()
+        raise
+    summary_vectors.backfill()
+
+    projection.save(path)
+    size_ratio = projection.input_dim / dim
+    print(f"✅ Built index '{projection.index_name}' in {time.perf_counter() - started:.1f}s "
+          f"({size_ratio:.1f}x smaller vectors)")
+    print(f"   Serve it with PROJECTION_ENABLED=1 (PROJECTION_PATH={path}) and restart the server")
+    return projection
+
+def print_report(rows, k=REPORT_K):
+    print(f"\n{'dim':>5} {'bytes':>7} {'pca recall@' + str(k):>15} {'random recall@' + str(k):>18} {'pca variance':>13}")
+    for row in rows:
+        print(f"{row['dim']:>5} {row['bytes_per_vector']:>7} {row['pca_recall']:>15.3f} "
+              f"{row['random_recall']:>18.3f} {row['explained_variance']:>13.1%}")
+
+if __name__ == "__main__":
+    # pinecone_client reads the active projection from the imported module, not __main__
+    import projection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "report":
+        import pinecone_client
+
+        pinecone_client.init_index()
+        vectors = [values for rows in projection.load_corpus().values() for _, values, _ in rows]
+        dims = [int(arg) for arg in sys.argv[2:]] or REPORT_DIMS
+        print(f"📊 Recall of projected search on {len(vectors)} chunks")
+        print_report(recall_report(vectors, dims))
+    elif command == "build" and len(sys.argv) > 2:
+        import pinecone_client
+
+        pinecone_client.init_index()
+        projection.build(int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else "pca")
+    elif command == "status":
+        if os.path.exists(PROJECTION_PATH):
+            saved = Projection.load(PROJECTION_PATH)
+            print(f"{PROJECTION_PATH}: {saved.method} v{saved.version}, {saved.input_dim} → {saved.dim} dims, "
+                  f"index '{saved.index_name}', fitted {saved.info.get('fitted_at')} on {saved.info.get('samples')} chunks")
+        else:
+            print(f"No projection at {PROJECTION_PATH}")
+        print(f"PROJECTION_ENABLED={'1' if PROJECTION_ENABLED else '0'}")
+    else:
+        print(__doc__)
@@ -0,0 +1,183 @@
+"""
+Quiz Job Store
+Tracks multi-topic quiz generation jobs in the shared SQLite database so any
+worker can report progress on a job another worker is running.
+
+The worker running a job records a heartbeat while it works; a job that goes
+JOB_STALE_SECONDS without one (its worker died or restarted) is marked failed
+the next time anyone reads it, so pollers and streams don't wait forever.
+"""
+import json
+import time
+import uuid
+
+from db import get_connection, register_schema
+
+JOB_RETENTION_SECONDS = 24 * 3600
+JOB_HEARTBEAT_SECONDS = 15
+JOB_STALE_SECONDS = 120
+
+register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS quiz_jobs (
+        job_id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        num_questions INTEGER NOT NULL,
+        subject TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        finished_at REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quiz_job_items (
+        job_id TEXT NOT NULL,
+        item_index INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        status TEXT NOT NULL,
+        quiz TEXT,
+        sources TEXT,
+        error TEXT,
+        finished_at REAL,
+        PRIMARY KEY (job_id, item_index)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quiz_job_heartbeats (
+        job_id TEXT PRIMARY KEY,
+        beat_at REAL NOT NULL
+    )
+    """,
+)
+
+def create_job(topics, num_questions, subject=None):
+    """Record a new pending job with one item per topic; returns the job id"""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        # Old jobs are only useful for polling shortly after they finish
+        cutoff = now - JOB_RETENTION_SECONDS
+        conn.execute(
+            "DELETE FROM quiz_job_items WHERE job_id IN (SELECT job_id FROM quiz_jobs WHERE created_at < ?)",
+            (cutoff,)
+        )
+        conn.execute(
+            "DELETE FROM quiz_job_heartbeats WHERE job_id IN (SELECT job_id FROM quiz_jobs WHERE created_at < ?)",
+            (cutoff,)
+        )
+        conn.execute("DELETE FROM quiz_jobs WHERE created_at < ?", (cutoff,))
+
+        conn.execute(
+            "INSERT INTO quiz_jobs (job_id, status, num_questions, subject, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, "pending", num_questions, subject, now)
+        )
+        conn.executemany(
+            "INSERT INTO quiz_job_items (job_id, item_index, topic, status) VALUES (?, ?, ?, ?)",
+            [(job_id, i, topic, "pending") for i, topic in enumerate(topics)]
+        )
+    return job_id
+
+def set_job_status(job_id, status, error=None):
+    """Update a job's overall status ("running", "completed" or "failed")"""
+    finished_at = time.time() if status in ("completed", "failed") else None
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE quiz_jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+            (status, error, finished_at, job_id)
+        )
+        if status == "failed":
+            conn.execute(
+                "UPDATE quiz_job_items SET status = 'failed', error = ? WHERE job_id = ? AND status = 'pending'",
+                (error, job_id)
+            )
+
+def heartbeat(job_id):
+    """Record that the worker running a job is still alive"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO quiz_job_heartbeats (job_id, beat_at) VALUES (?, ?) "
+            "ON CONFLICT(job_id) DO UPDATE SET beat_at = excluded.beat_at",
+            (job_id, time.time())
+        )
+
+def _fail_if_stale(conn, job_id):
+    """Mark an unfinished job failed if its worker has stopped sending heartbeats"""
+    cutoff = time.time() - JOB_STALE_SECONDS
+    with conn:
+        stale = conn.execute(
+            "UPDATE quiz_jobs SET status = 'failed', error = ?, finished_at = ? "
+            "WHERE job_id = ? AND status IN ('pending', 'running') AND created_at < ? "
+            "AND COALESCE((SELECT beat_at FROM quiz_job_heartbeats WHERE job_id = ?), 0) < ?",
+            (
+                f"Job stopped making progress for {JOB_STALE_SECONDS}s (its worker may have restarted)",
+                time.time(), job_id, cutoff, job_id, cutoff
+            )
+        ).rowcount
+        if stale:
+            conn.execute(
+                "UPDATE quiz_job_items SET status = 'failed', error = 'Job stopped making progress' "
+                "WHERE job_id = ? AND status = 'pending'",
+                (job_id,)
+            )
+
+def finish_item(job_id, item_index, quiz=None, sources=None, error=None):
+    """Store the generated quiz (or the error) for one topic of a job"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE quiz_job_items SET status = ?, quiz = ?, sources = ?, error = ?, finished_at = ? "
+            "WHERE job_id = ? AND item_index = ?",
+            (
+                "failed" if error else "completed",
+                quiz,
+                json.dumps(sources or []),
+                error,
+                time.time(),
+                job_id,
+                item_index,
+            )
+        )
+
+def get_job(job_id):
+    """Return a job and all of its items, or None if it doesn't exist"""
+    conn = get_connection()
+    _fail_if_stale(conn, job_id)
+    row = conn.execute(
+        "SELECT status, num_questions, subject, error, created_at, finished_at FROM quiz_jobs WHERE job_id = ?",
+        (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    status, num_questions, subject, error, created_at, finished_at = row
+    items = []
+    for item_index, topic, item_status, quiz, sources, item_error in conn.execute(
+        "SELECT item_index, topic, status, quiz, sources, error FROM quiz_job_items "
+        "WHERE job_id = ? ORDER BY item_index",
+        (job_id,)
+    ):
+        item = {"index": item_index, "topic": topic, "status": item_status}
+        if quiz is not None:
+            item["quiz"] = quiz
+            item["sources"] = json.loads(sources or "[]")
+        if item_error:
+            item["error"] = item_error
+        items.append(item)
+
+    job = {
+        "job_id": job_id,
+        "status": status,
+        "num_questions": num_questions,
+        "subject": subject,
+        "completed": sum(1 for item in items if item["status"] != "pending"),
+        "total": len(items),
+        "items": items,
+    }
+    if error:
+        job["error"] = error
+    if finished_at:
+        job["elapsed_seconds"] = round(finished_at - created_at, 3)
+    return job
@@ -0,0 +1,185 @@
+"""
+Deadlines and Circuit Breakers
+Each interactive request gets an end-to-end deadline, carried in a
+contextvar; calls to Ollama and the vector store use the time left as their
+timeout, so a struggling dependency can't hold a worker past it.
+
+Each dependency also sits behind a circuit breaker. After repeated failures
+the breaker opens and calls fail immediately (the API answers in a degraded
+mode instead of waiting on timeouts); after a cool-down one probe call is
+let through (half-open), and its success closes the breaker again.
+"""
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from starlette.datastructures import Headers
+
+load_dotenv()
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Long-running endpoints that manage their own time budget
+NO_DEADLINE_PATHS = ("/upload", "/chat/batch", "/quiz/jobs")
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before (or while) calling a dependency"""
+
+class CircuitOpenError(Exception):
+    """A dependency's breaker is open, so the call was not attempted"""
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+@contextmanager
+def deadline(seconds):
+    """Run the enclosed block under a deadline this many seconds from now (None: no deadline)"""
+    token = _deadline.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def expired():
+    """True if the current request has a deadline and it has passed"""
+    at = _deadline.get()
+    return at is not None and time.monotonic() >= at
+
+def time_left(cap):
+    """
+    Timeout to use for one outbound call
+
+    Args:
+        cap: The call's own maximum timeout in seconds
+
+    Returns:
+        The smaller of cap and the time until the request deadline
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    at = _deadline.get()
+    if at is None:
+        return cap
+    left = at - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(cap, left)
+
+class CircuitBreaker:
+    """Closed → open after consecutive failures → half-open probe after a cool-down → closed"""
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.last_error = None
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+                self.state = "half_open"
+                self.probing = False
+            # Half-open: a single probe at a time; everyone else keeps failing fast
+            if self.probing:
+                raise CircuitOpenError(f"{self.name} is unavailable (probing)")
+            self.probing = True
+
+    def rejecting(self):
+        """True while the breaker is open and cooling down (a cheap check before queueing for a call)"""
+        with self.lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.reset_seconds
+
+    def record_success(self):
+        with self.lock:
+            if self.state != "closed":
+                print(f"✅ {self.name} recovered; circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            self.probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"⚠️  {self.name} failing ({self.last_error}); circuit open for {self.reset_seconds:.0f}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    @contextmanager
+    def call(self):
+        """
+        Guard one call: fail fast when open, and record how it went
+
+        A call that only failed because the request's own deadline ran out
+        says nothing about the dependency, so it raises DeadlineExceeded
+        without counting as a failure.
+        """
+        self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if isinstance(e, DeadlineExceeded) or expired():
+                with self.lock:
+                    self.probing = False
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                raise DeadlineExceeded(f"Request deadline exceeded waiting for {self.name}") from e
+            self.record_failure(e)
+            raise
+        self.record_success()
+
+    def status(self):
+        with self.lock:
+            status = {"state": self.state, "failures": self.failures, "last_error": self.last_error}
+            if self.state == "open":
+                status["retry_in_seconds"] = round(max(0.0, self.opened_at + self.reset_seconds - time.monotonic()), 1)
+            return status
+
+LLM_BREAKER = CircuitBreaker("ollama")
+VECTOR_STORE_BREAKER = CircuitBreaker("vector_store")
+
+def breaker_status():
+    """State of every breaker in this worker process, for /status"""
+    return {breaker.name: breaker.status() for breaker in (LLM_BREAKER, VECTOR_STORE_BREAKER)}
+
+class DeadlineMiddleware:
+    """
+    Give each request a deadline of REQUEST_DEADLINE_SECONDS
+
+    Clients may ask for a shorter one with an X-Request-Timeout header
+    (seconds). Paths in NO_DEADLINE_PATHS run without one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(NO_DEADLINE_PATHS):
+            await self.app(scope, receive, send)
+            return
+        seconds = REQUEST_DEADLINE_SECONDS
+        requested = Headers(scope=scope).get("x-request-timeout")
+        if requested:
+            try:
+                seconds = min(seconds, max(0.1, float(requested)))
+            except ValueError:
+                pass
+        with deadline(seconds):
+            await self.app(scope, receive, send)
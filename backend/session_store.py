@@ -0,0 +1,219 @@
+"""
+Conversation Session Store
+SQLite-backed chat history shared by every server worker process, with a
+bounded in-memory LRU of hot sessions and TTL expiry for idle ones
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+import metrics
+from db import get_connection, register_schema
+
+load_dotenv()
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))  # hot sessions kept in memory
+SESSION_CACHE_MESSAGES = int(os.getenv("SESSION_CACHE_MESSAGES", "50"))  # newest messages cached per session
+PURGE_INTERVAL_SECONDS = 600
+MAX_PAGE_SIZE = 200
+
+register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        payload TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)",
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        last_active REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions (last_active)",
+    # Messages written before the sessions table existed get a row (active as of
+    # the migration) so they expire too; the versions row makes this run once
+    """
+    INSERT OR IGNORE INTO sessions (session_id, last_active)
+    SELECT DISTINCT session_id, (julianday('now') - 2440587.5) * 86400.0 FROM messages
+    WHERE NOT EXISTS (SELECT 1 FROM versions WHERE name = 'sessions_backfill')
+    """,
+    """
+    INSERT OR IGNORE INTO versions (name, version, updated_at)
+    VALUES ('sessions_backfill', 1, (julianday('now') - 2440587.5) * 86400.0)
+    """,
+)
+
+# session_id -> {"last_id", "complete", "messages": [(id, message), ...]}
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_last_purge = 0.0
+
+def _evict(session_id):
+    with _cache_lock:
+        _cache.pop(session_id, None)
+
+def _append_cached(session_id, previous_id, row_id, message):
+    """Add a just-written message to the cached tail, if the cache holds everything before it"""
+    with _cache_lock:
+        entry = _cache.get(session_id)
+        if entry is None:
+            return
+        if entry["last_id"] != previous_id:
+            # Another worker appended in between; rebuild from disk on the next read
+            del _cache[session_id]
+            return
+        entry["messages"].append((row_id, message))
+        if len(entry["messages"]) > SESSION_CACHE_MESSAGES:
+            del entry["messages"][0]
+            entry["complete"] = False
+        entry["last_id"] = row_id
+
+def append_message(session_id, message):
+    """Append one conversation entry (a JSON-serializable dict) to a session; returns its id"""
+    conn = get_connection()
+    now = time.time()
+    payload = json.dumps(message)
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO messages (session_id, payload) VALUES (?, ?)",
+            (session_id, payload)
+        )
+        (previous_id,) = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM messages WHERE session_id = ? AND id < ?",
+            (session_id, cursor.lastrowid)
+        ).fetchone()
+        conn.execute(
+            "INSERT INTO sessions (session_id, last_active) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_active = excluded.last_active",
+            (session_id, now)
+        )
+    _append_cached(session_id, previous_id, cursor.lastrowid, json.loads(payload))
+
+    if now - _last_purge > PURGE_INTERVAL_SECONDS:
+        purge_expired()
+    return cursor.lastrowid
+
+def _load_tail(conn, session_id):
+    """Read the newest SESSION_CACHE_MESSAGES entries of a session into a cache entry"""
+    rows = conn.execute(
+        "SELECT id, payload FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+        (session_id, SESSION_CACHE_MESSAGES + 1)
+    ).fetchall()
+    complete = len(rows) <= SESSION_CACHE_MESSAGES
+    rows = rows[:SESSION_CACHE_MESSAGES]
+    rows.reverse()
+    return {
+        "last_id": rows[-1][0] if rows else 0,
+        "complete": complete,
+        "messages": [(row_id, json.loads(payload)) for row_id, payload in rows],
+    }
+
+def _get_cached(conn, session_id):
+    """Return an up-to-date cache entry for a session, refreshing it if stale"""
+    (last_id,) = conn.execute(
+        "SELECT COALESCE(MAX(id), 0) FROM messages WHERE session_id = ?", (session_id,)
+    ).fetchone()
+
+    with _cache_lock:
+        entry = _cache.get(session_id)
+        if entry is not None and entry["last_id"] == last_id:
+            _cache.move_to_end(session_id)
+            metrics.record_cache("session_history", True)
+            return entry
+
+    metrics.record_cache("session_history", False)
+
+    entry = _load_tail(conn, session_id)
+    if entry["messages"]:
+        with _cache_lock:
+            _cache[session_id] = entry
+            _cache.move_to_end(session_id)
+            while len(_cache) > SESSION_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return entry
+
+def get_messages(session_id, cursor=None, limit=50):
+    """
+    Return one page of a session's history, oldest first
+
+    Args:
+        session_id: Conversation to read
+        cursor: Id of the last message already seen (None starts from the beginning)
+        limit: Maximum number of messages to return
+
+    Returns:
+        (messages, next_cursor) where next_cursor is None when there are no more messages
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = cursor or 0
+    conn = get_connection()
+
+    entry = _get_cached(conn, session_id)
+    cached = entry["messages"]
+    if entry["complete"] or (cached and after >= cached[0][0]):
+        rows = [(row_id, message) for row_id, message in cached if row_id > after]
+        page = rows[:limit]
+        has_more = len(rows) > limit
+    else:
+        fetched = conn.execute(
+            "SELECT id, payload FROM messages WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (session_id, after, limit + 1)
+        ).fetchall()
+        page = [(row_id, json.loads(payload)) for row_id, payload in fetched[:limit]]
+        has_more = len(fetched) > limit
+
+    messages = [{"id": row_id, **message} for row_id, message in page]
+    next_cursor = page[-1][0] if has_more else None
+    return messages, next_cursor
+
+def get_version(session_id):
+    """
+    Cheap change marker for a session's history
+
+    Returns:
+        (last message id, last active time or None); message ids are never
+        reused, so any append or clear changes the first value
+    """
+    conn = get_connection()
+    (last_id,) = conn.execute(
+        "SELECT COALESCE(MAX(id), 0) FROM messages WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    row = conn.execute("SELECT last_active FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    return last_id, (row[0] if row else None)
+
+def clear_session(session_id):
+    """Delete a session's history; returns True if anything was removed"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    _evict(session_id)
+    return cursor.rowcount > 0
+
+def purge_expired():
+    """Delete sessions idle for longer than SESSION_TTL_SECONDS; returns how many were removed"""
+    global _last_purge
+    _last_purge = time.time()
+    cutoff = _last_purge - SESSION_TTL_SECONDS
+
+    conn = get_connection()
+    with conn:
+        expired = [row[0] for row in conn.execute(
+            "SELECT session_id FROM sessions WHERE last_active < ?", (cutoff,)
+        )]
+        if expired:
+            conn.executemany("DELETE FROM messages WHERE session_id = ?", [(s,) for s in expired])
+            conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in expired])
+
+    for session_id in expired:
+        _evict(session_id)
+    if expired:
+        print(f"🧹 Expired {len(expired)} idle session(s)")
+    return len(expired)
@@ -0,0 +1,213 @@
+"""
+Index Snapshots
+Export every vector, ID and metadata record in the index to a single binary
+snapshot file, and bulk-load one back, without re-extracting or re-embedding
+anything. Useful for disaster recovery, moving between the hosted index and
+a local one (PINECONE_INDEX_HOST), and seeding test environments.
+
+A snapshot is an uncompressed zip holding, per namespace, raw float32 .npy
+blocks of vectors and a JSON-lines table of (id, metadata) in the same row
+order, plus manifest.json describing the namespaces and dimension.
+
+Usage:
+    python snapshot.py export <snapshot.zip>
+    python snapshot.py import <snapshot.zip>
+"""
+import os
+import sys
+import json
+import time
+import zipfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import numpy as np
+
+import pinecone_client
+import projection
+from db import bump_version
+
+load_dotenv()
+
+SNAPSHOT_FORMAT = 1
+BLOCK_SIZE = 10000  # rows per .npy block
+UPSERT_BATCH_SIZE = 100
+SNAPSHOT_IMPORT_WORKERS = int(os.getenv("SNAPSHOT_IMPORT_WORKERS", "8"))
+UPSERT_RETRIES = 3
+
+class IncompleteSnapshot(Exception):
+    """The export read fewer vectors than the index holds"""
+
+def _write_block(snapshot, prefix, block, rows):
+    vectors = np.asarray([row["values"] for row in rows], dtype=np.float32)
+    name = f"{prefix}/vectors-{block:05d}.npy"
+    with snapshot.open(name, "w", force_zip64=True) as f:
+        np.save(f, vectors, allow_pickle=False)
+    records = "".join(json.dumps({"id": row["id"], "metadata": row["metadata"]}) + "\n" for row in rows)
+    snapshot.writestr(f"{prefix}/records-{block:05d}.jsonl", records, compress_type=zipfile.ZIP_DEFLATED)
+    return {"vectors": name, "records": f"{prefix}/records-{block:05d}.jsonl", "count": len(rows)}
+
+def export_snapshot(path):
+    """
+    Write every namespace of the index to a snapshot file
+
+    Every id is paged through the list endpoint and fetched in batches, so
+    namespaces of any size are exported in full.
+
+    Returns:
+        Number of vectors exported
+
+    Raises:
+        IncompleteSnapshot: A namespace still holds more vectors than were
+            read; no snapshot file is written
+    """
+    counts = pinecone_client.namespace_counts()
+    active = projection.get_active()
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "index": pinecone_client.index_name(),
+        "dimension": pinecone_client.index_dimension(),
+        # Projected vectors only make sense with the projection that made them
+        "projection": active.fingerprint if active else None,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "namespaces": [],
+    }
+    total = 0
+    started = time.perf_counter()
+    tmp_path = f"{path}.tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as snapshot:
+            for number, (namespace, expected) in enumerate(sorted(counts.items())):
+                prefix = f"ns{number:04d}"
+                blocks, rows, exported = [], [], 0
+                for batch in pinecone_client.iter_vectors(namespace, include_values=True):
+                    rows.extend(batch)
+                    exported += len(batch)
+                    if len(rows) >= BLOCK_SIZE:
+                        blocks.append(_write_block(snapshot, prefix, len(blocks), rows[:BLOCK_SIZE]))
+                        rows = rows[BLOCK_SIZE:]
+                if rows:
+                    blocks.append(_write_block(snapshot, prefix, len(blocks), rows))
+
+                # Deletes during the export can lower the count; only a shortfall that remains is an error
+                if exported < expected and exported < pinecone_client.namespace_counts().get(namespace, 0):
+                    raise IncompleteSnapshot(
+                        f"Namespace '{namespace}': read {exported} of {expected} vectors"
+                    )
+                if not exported:
+                    continue
+
+                manifest["namespaces"].append({"name": namespace, "count": exported, "blocks": blocks})
+                total += exported
+                print(f"📦 {namespace or '(default)'}: {exported} vectors")
+
+            manifest["total"] = total
+            snapshot.writestr("manifest.json", json.dumps(manifest, indent=2))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"✅ Exported {total} vectors to {path} ({size_mb:.1f} MB, {time.perf_counter() - started:.1f}s)")
+    return total
+
+def read_manifest(snapshot):
+    manifest = json.loads(snapshot.read("manifest.json"))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format')}")
+    active = projection.get_active()
+    expected = (pinecone_client.index_dimension(), active.fingerprint if active else None)
+    # Full-dimension snapshots also load into a projected index (projected on upsert)
+    if manifest["dimension"] == pinecone_client.DIMENSION and not manifest.get("projection"):
+        return manifest
+    if (manifest["dimension"], manifest.get("projection")) != expected:
+        raise ValueError(
+            f"Snapshot has {manifest['dimension']}-dimensional vectors"
+            + (f" from projection {manifest['projection']}" if manifest.get("projection") else "")
+            + f"; the index expects {expected[0]}" + (f" from projection {expected[1]}" if expected[1] else "")
+        )
+    return manifest
+
+def iter_blocks(snapshot, namespace_entry):
+    """Yield (ids, metadata list, float32 matrix) for each block of a namespace"""
+    for block in namespace_entry["blocks"]:
+        with snapshot.open(block["vectors"]) as f:
+            vectors = np.load(f, allow_pickle=False)
+        records = [json.loads(line) for line in snapshot.read(block["records"]).decode("utf-8").splitlines()]
+        if len(records) != len(vectors):
+            raise ValueError(f"Corrupt snapshot block {block['vectors']}: {len(records)} records, {len(vectors)} vectors")
+        yield [r["id"] for r in records], [r["metadata"] for r in records], vectors
+
+def _upsert_batch(namespace, batch):
+    for attempt in range(UPSERT_RETRIES):
+        try:
+            return pinecone_client.bulk_upsert(batch, namespace=namespace)
+        except Exception as e:
+            if attempt == UPSERT_RETRIES - 1:
+                raise
+            print(f"⚠️  Upsert failed ({e}); retrying")
+            time.sleep(2 ** attempt)
+
+def _restore_local_indexes(chunk_vectors):
+    """Rebuild the lexical index and near-duplicate signatures for restored chunks"""
+    import lexical_index
+    import near_dup
+
+    if chunk_vectors:
+        lexical_index.add_chunks(chunk_vectors)
+        near_dup.backfill({"id": vector_id, "metadata": metadata} for vector_id, _, metadata in chunk_vectors)
+
+def import_snapshot(path, workers=SNAPSHOT_IMPORT_WORKERS):
+    """
+    Bulk-load a snapshot into the index with batched, parallel upserts
+
+    Existing vectors with the same IDs are overwritten; others are kept.
+
+    Returns:
+        Number of vectors imported
+    """
+    started = time.perf_counter()
+    total = 0
+    chunk_vectors = []
+    with zipfile.ZipFile(path) as snapshot, ThreadPoolExecutor(max_workers=workers) as executor:
+        manifest = read_manifest(snapshot)
+        print(f"📦 Importing {manifest['total']} vectors from {path} (created {manifest['created_at']})")
+        for entry in manifest["namespaces"]:
+            namespace = entry["name"]
+            is_chunks = namespace == "" or namespace.startswith(pinecone_client.SUBJECT_NAMESPACE_PREFIX)
+            imported = 0
+            for ids, metadata, vectors in iter_blocks(snapshot, entry):
+                values = vectors.tolist()
+                batches = [
+                    list(zip(ids[i:i + UPSERT_BATCH_SIZE], values[i:i + UPSERT_BATCH_SIZE],
+                             metadata[i:i + UPSERT_BATCH_SIZE]))
+                    for i in range(0, len(ids), UPSERT_BATCH_SIZE)
+                ]
+                imported += sum(executor.map(lambda batch: _upsert_batch(namespace, batch), batches))
+                if is_chunks:
+                    chunk_vectors.extend(zip(ids, [None] * len(ids), metadata))
+            total += imported
+            print(f"✅ {namespace or '(default)'}: {imported} vectors")
+
+    bump_version(pinecone_client.CORPUS_VERSION)
+    pinecone_client.list_chunk_namespaces(refresh=True)
+    _restore_local_indexes(chunk_vectors)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Imported {total} vectors in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} vectors/s)")
+    return total
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "export":
+        pinecone_client.init_index()
+        try:
+            export_snapshot(sys.argv[2])
+        except IncompleteSnapshot as e:
+            print(f"❌ Export aborted: {e}")
+            sys.exit(1)
+    elif len(sys.argv) > 2 and sys.argv[1] == "import":
+        pinecone_client.init_index()
+        import_snapshot(sys.argv[2])
+    else:
+        print(__doc__)
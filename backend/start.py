@@ -1,22 +1,97 @@
 """
 Start script for Study Jarvis backend
+
+Usage:
+    python start.py [--workers N] [--host 127.0.0.1] [--port 8000]
+
+With more than one worker on Linux/macOS the app is served by gunicorn in
+pre-fork mode: the embedding model is loaded once in the master process and
+the workers inherit it copy-on-write instead of each loading their own copy.
+That shared copy replaces the embedding worker pool: EMBED_WORKERS is ignored
+when serving with more than one worker, since every server worker would
+otherwise start its own pool of model processes.
 """
+import argparse
+import gc
 import uvicorn
 import sys
 import os
+import tempfile
+from dotenv import load_dotenv
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the Study Jarvis backend")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WORKERS", "1")),
+        help="Number of worker processes (0 = one per CPU core)"
+    )
+    return parser.parse_args()
+
+def run_prefork(host, port, workers):
+    """Serve with gunicorn, preloading the app and embedding model before forking"""
+    from gunicorn.app.base import BaseApplication
+
+    class StudyJarvisApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("timeout", 300)
+
+        def load(self):
+            import app as app_module
+
+            if app_module.EMBED_WORKERS == 0:
+                print("🔧 Loading embedding model before forking workers...")
+                app_module.get_or_init_model()
+            # Move everything allocated so far out of the GC's reach so collections
+            # in the workers don't touch (and un-share) the model's pages
+            gc.freeze()
+            return app_module.app
+
+    StudyJarvisApplication().run()
 
 if __name__ == "__main__":
     # Add current directory to path
     sys.path.insert(0, os.path.dirname(__file__))
 
+    load_dotenv()
+    args = parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    # One embedding pool per server worker would multiply the model's memory
+    if workers > 1 and int(os.getenv("EMBED_WORKERS", "0")) > 0:
+        print("⚠️  EMBED_WORKERS is ignored with more than one server worker; the workers share one model instead")
+        os.environ["EMBED_WORKERS"] = "0"
+
+    # Split the cores between workers so torch threads don't oversubscribe the CPU
+    os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    # Workers write metrics to a shared directory so /metrics covers all of them
+    if workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="study-jarvis-metrics-")
+
     print("🚀 Starting Study Jarvis Backend...")
-    print("📍 Server will be available at: http://127.0.0.1:8000")
-    print("📖 API docs at: http://127.0.0.1:8000/docs")
+    print(f"📍 Server will be available at: http://{args.host}:{args.port}")
+    print(f"📖 API docs at: http://{args.host}:{args.port}/docs")
+    print(f"👷 Workers: {workers}")
     print("\n⏳ Initializing... (this may take a moment)\n")
 
-    uvicorn.run(
-        "app:app",
-        host="127.0.0.1",
-        port=8000,
-        log_level="info"
-    )
+    if workers > 1 and os.name == "posix":
+        run_prefork(args.host, args.port, workers)
+    else:
+        if workers > 1:
+            print("⚠️  Pre-fork mode needs Linux/macOS; each worker will load its own model copy")
+
+        uvicorn.run(
+            "app:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            log_level="info"
+        )
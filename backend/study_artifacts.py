@@ -0,0 +1,337 @@
+"""
+Precomputed Study Artifacts
+Whole-document and whole-chapter summaries and flashcard sets, generated in
+the background while the LLM is idle and stored in the shared SQLite
+database, so summarize/flashcard requests for a whole document or chapter
+return instantly.
+
+Chapters are keyed by subject and chapter name together (chapter_key), since
+two subjects can each have a chapter of the same name.
+
+Ingesting or deleting a document marks its artifacts (and those of its
+chapter) pending; the background worker regenerates them, skipping the LLM
+when the underlying chunks turn out to be unchanged.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+import llm_client
+import lexical_index
+import resilience
+from db import get_connection, register_schema
+
+load_dotenv()
+
+PRECOMPUTE_ARTIFACTS = os.getenv("PRECOMPUTE_ARTIFACTS", "0") == "1"
+ARTIFACT_FLASHCARDS = int(os.getenv("ARTIFACT_FLASHCARDS", "10"))
+# Notes per LLM call; longer documents are summarized in parts first
+ARTIFACT_BATCH_CHARS = int(os.getenv("ARTIFACT_BATCH_CHARS", "8000"))
+IDLE_POLL_SECONDS = 5
+STALE_CLAIM_SECONDS = 15 * 60  # a claim this old belongs to a worker that died
+RETRY_FAILED_SECONDS = 10 * 60
+
+ARTIFACT_KINDS = ("summarize", "flashcard")
+ARTIFACT_SCOPES = ("document", "chapter")
+
+register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS study_artifacts (
+        scope TEXT NOT NULL,
+        name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        content TEXT,
+        content_hash TEXT,
+        sources TEXT,
+        error TEXT,
+        updated_at REAL NOT NULL,
+        claimed_at REAL,
+        PRIMARY KEY (scope, name, kind)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_study_artifacts_status ON study_artifacts (status)",
+)
+
+def chapter_key(subject, chapter):
+    """Artifact name of a subject's chapter ("" subject for notes without one)"""
+    return json.dumps([subject or "", chapter])
+
+def _parse_chapter_key(name):
+    """(subject, chapter) from a chapter_key, or None for a malformed name"""
+    try:
+        subject, chapter = json.loads(name)
+        return subject, chapter
+    except (ValueError, TypeError):
+        return None
+
+def artifact_label(scope, name):
+    """Readable name of an artifact for logs and chat history"""
+    if scope == "chapter":
+        parsed = _parse_chapter_key(name)
+        if parsed:
+            subject, chapter = parsed
+            return f"{subject} / {chapter}" if subject else chapter
+    return name
+
+def _chapter_keys(meta):
+    """Chapter keys a stored chunk belongs to (shared chunks can be in several)"""
+    subjects = meta.get("subjects") or [meta.get("subject")]
+    chapters = meta.get("chapters") or ([meta["chapter"]] if meta.get("chapter") else [])
+    return {chapter_key(subject, chapter) for subject in subjects for chapter in chapters}
+
+def chapter_subjects(chapter):
+    """Subjects with notes in a chapter of this name ("" for notes without a subject)"""
+    subjects = set()
+    for meta in lexical_index.document_chunks(chapter=chapter):
+        for key in _chapter_keys(meta):
+            subject, name = json.loads(key)
+            if name == chapter:
+                subjects.add(subject)
+    return sorted(subjects)
+
+def _mark_pending(conn, scope, name):
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO study_artifacts (scope, name, kind, status, updated_at) VALUES (?, ?, ?, 'pending', ?) "
+        "ON CONFLICT (scope, name, kind) DO UPDATE SET status = 'pending', claimed_at = NULL, updated_at = ?",
+        [(scope, name, kind, now, now) for kind in ARTIFACT_KINDS]
+    )
+
+def _chapters_containing(conn, source):
+    rows = conn.execute(
+        "SELECT DISTINCT name FROM study_artifacts WHERE scope = 'chapter' AND sources LIKE ?",
+        (f"%{json.dumps(source)}%",)
+    )
+    return [row[0] for row in rows]
+
+def invalidate(source, subject=None, chapter=None):
+    """Queue regeneration of a source's artifacts after it was (re)ingested"""
+    conn = get_connection()
+    with conn:
+        _mark_pending(conn, "document", source)
+        chapters = set(_chapters_containing(conn, source))
+        if chapter:
+            chapters.add(chapter_key(subject, chapter))
+        for name in chapters:
+            _mark_pending(conn, "chapter", name)
+
+def forget(source):
+    """Drop a deleted source's artifacts and queue its chapters for regeneration"""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM study_artifacts WHERE scope = 'document' AND name = ?", (source,))
+        for name in _chapters_containing(conn, source):
+            _mark_pending(conn, "chapter", name)
+
+def get_artifact(scope, name, kind):
+    """Return a ready artifact as {"content", "sources", "updated_at"}, or None"""
+    row = get_connection().execute(
+        "SELECT content, sources, updated_at FROM study_artifacts "
+        "WHERE scope = ? AND name = ? AND kind = ? AND status = 'ready'",
+        (scope, name, kind)
+    ).fetchone()
+    if row is None:
+        return None
+    content, sources, updated_at = row
+    return {"content": content, "sources": json.loads(sources or "[]"), "updated_at": updated_at}
+
+def _chunks_for(scope, name):
+    if scope == "document":
+        return lexical_index.document_chunks(source=name)
+    parsed = _parse_chapter_key(name)
+    if parsed is None:
+        return []
+    subject, chapter = parsed
+    if subject:
+        return lexical_index.document_chunks(subject=subject, chapter=chapter)
+    return [
+        meta for meta in lexical_index.document_chunks(chapter=chapter)
+        if not meta.get("subject") and not meta.get("subjects")
+    ]
+
+def _content_hash(chunks):
+    digest = hashlib.sha1()
+    for meta in chunks:
+        digest.update(meta.get("text", "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _batches(chunks):
+    """Group source-labeled chunk texts into prompts that fit the LLM context"""
+    batches, current, size = [], [], 0
+    for meta in chunks:
+        labeled = f"[source={meta.get('source', 'Unknown')}]\n{meta.get('text', '')}"
+        if current and size + len(labeled) > ARTIFACT_BATCH_CHARS:
+            batches.append(current)
+            current, size = [], 0
+        current.append(labeled)
+        size += len(labeled)
+    if current:
+        batches.append(current)
+    return batches
+
+def _query(prompt):
+    return llm_client.generate(prompt)
+
+def _generate(kind, chunks):
+    """Summarize or make flashcards from a whole document, map-reduce style if it's long"""
+    batches = _batches(chunks)
+    # Reduce long notes to partial summaries until they fit in one prompt
+    while len(batches) > 1:
+        partials = [_query(llm_client.build_study_prompt(batch, "", "summarize")) for batch in batches]
+        reduced = _batches([{"source": "summary", "text": partial} for partial in partials])
+        if len(reduced) >= len(batches):
+            # Summaries aren't getting shorter; go with what we have
+            batches = [[text for batch in reduced for text in batch]]
+            break
+        batches = reduced
+
+    if kind == "summarize":
+        return _query(llm_client.build_study_prompt(batches[0], "", "summarize"))
+    return _query(llm_client.build_study_prompt(batches[0], str(ARTIFACT_FLASHCARDS), "flashcard"))
+
+def build_artifact(scope, name, kind):
+    """
+    Generate (or confirm) one artifact now and store it
+
+    Returns:
+        The artifact as returned by get_artifact, or None if there are no
+        notes for this document/chapter
+    """
+    chunks = _chunks_for(scope, name)
+    conn = get_connection()
+    if not chunks:
+        with conn:
+            conn.execute(
+                "DELETE FROM study_artifacts WHERE scope = ? AND name = ? AND kind = ?", (scope, name, kind)
+            )
+        return None
+
+    content_hash = _content_hash(chunks)
+    sources = sorted({s for meta in chunks for s in (meta.get("sources") or [meta.get("source", "Unknown")])})
+    row = conn.execute(
+        "SELECT content, content_hash FROM study_artifacts WHERE scope = ? AND name = ? AND kind = ?",
+        (scope, name, kind)
+    ).fetchone()
+
+    # Re-uploading identical notes doesn't need a new generation
+    if row and row[0] is not None and row[1] == content_hash:
+        content = row[0]
+    else:
+        try:
+            content = _generate(kind, chunks)
+        except Exception as e:
+            with conn:
+                conn.execute(
+                    "INSERT INTO study_artifacts (scope, name, kind, status, error, updated_at) "
+                    "VALUES (?, ?, ?, 'failed', ?, ?) ON CONFLICT (scope, name, kind) DO UPDATE "
+                    "SET status = 'failed', error = excluded.error, claimed_at = NULL, updated_at = excluded.updated_at",
+                    (scope, name, kind, str(e), time.time())
+                )
+            raise
+
+    now = time.time()
+    with conn:
+        conn.execute(
+            "INSERT INTO study_artifacts (scope, name, kind, status, content, content_hash, sources, updated_at) "
+            "VALUES (?, ?, ?, 'ready', ?, ?, ?, ?) ON CONFLICT (scope, name, kind) DO UPDATE "
+            "SET status = 'ready', content = excluded.content, content_hash = excluded.content_hash, "
+            "sources = excluded.sources, error = NULL, claimed_at = NULL, updated_at = excluded.updated_at",
+            (scope, name, kind, content, content_hash, json.dumps(sources), now)
+        )
+    return {"content": content, "sources": sources, "updated_at": now}
+
+def _claim_next():
+    """Atomically claim one artifact that needs (re)generation; safe across worker processes"""
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            "SELECT scope, name, kind FROM study_artifacts WHERE status = 'pending' "
+            "OR (status = 'running' AND claimed_at < ?) OR (status = 'failed' AND updated_at < ?) "
+            "ORDER BY updated_at LIMIT 1",
+            (now - STALE_CLAIM_SECONDS, now - RETRY_FAILED_SECONDS)
+        ).fetchone()
+        if row is None:
+            return None
+        claimed = conn.execute(
+            "UPDATE study_artifacts SET status = 'running', claimed_at = ? "
+            "WHERE scope = ? AND name = ? AND kind = ? AND (status != 'running' OR claimed_at < ?)",
+            (now, *row, now - STALE_CLAIM_SECONDS)
+        ).rowcount
+    return row if claimed else None
+
+def run_pending(wait_for_idle=False, stop_event=None):
+    """
+    Generate every pending artifact
+
+    Args:
+        wait_for_idle: Only start a generation when this process has no
+            other LLM requests running or queued
+        stop_event: threading.Event that ends the loop when set
+
+    Returns:
+        Number of artifacts built
+    """
+    built = 0
+    while stop_event is None or not stop_event.is_set():
+        if wait_for_idle and llm_client.generations_in_flight() > 0:
+            return built
+        # Leave pending artifacts queued while Ollama is down rather than failing each one
+        if resilience.LLM_BREAKER.rejecting():
+            return built
+        claimed = _claim_next()
+        if claimed is None:
+            return built
+        scope, name, kind = claimed
+        try:
+            if build_artifact(scope, name, kind):
+                built += 1
+                print(f"📝 Precomputed {kind} for {scope} '{artifact_label(scope, name)}'")
+        except Exception as e:
+            print(f"❌ Error precomputing {kind} for {scope} '{artifact_label(scope, name)}': {e}")
+    return built
+
+def _background_loop(stop_event):
+    while not stop_event.wait(IDLE_POLL_SECONDS):
+        try:
+            run_pending(wait_for_idle=True, stop_event=stop_event)
+        except Exception as e:
+            print(f"❌ Artifact worker error: {e}")
+
+def start_background_worker():
+    """Start the idle-time generation thread; returns its stop event"""
+    stop_event = threading.Event()
+    threading.Thread(target=_background_loop, args=(stop_event,), daemon=True, name="study-artifacts").start()
+    return stop_event
+
+def schedule_all():
+    """Queue artifacts for every document and chapter already in the index"""
+    sources, chapters = set(), set()
+    for meta in lexical_index.document_chunks():
+        sources.update(meta.get("sources") or [meta.get("source", "Unknown")])
+        chapters.update(_chapter_keys(meta))
+    conn = get_connection()
+    with conn:
+        for source in sources:
+            _mark_pending(conn, "document", source)
+        for chapter in chapters:
+            _mark_pending(conn, "chapter", chapter)
+    print(f"✅ Queued artifacts for {len(sources)} document(s) and {len(chapters)} chapter(s)")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "schedule":
+        schedule_all()
+    elif len(sys.argv) > 1 and sys.argv[1] == "run":
+        print(f"✅ Built {run_pending()} artifact(s)")
+    else:
+        print("""
+Usage:
+    python study_artifacts.py schedule    Queue artifacts for all existing notes
+    python study_artifacts.py run         Generate every pending artifact now
+        """)
@@ -0,0 +1,206 @@
+"""
+Document Summary Vectors
+Document-level (and optionally section-level) centroid embeddings for
+two-stage retrieval: a query first picks the few most relevant documents
+from their centroids, then only searches those documents' chunks.
+
+Centroids live in their own Pinecone namespace so they never show up in
+ordinary chunk searches.
+"""
+import os
+import sys
+import hashlib
+from dotenv import load_dotenv
+import numpy as np
+
+import near_dup
+import pinecone_client
+
+load_dotenv()
+
+SUMMARY_NAMESPACE = "document-summaries"
+HIERARCHICAL_RETRIEVAL = os.getenv("HIERARCHICAL_RETRIEVAL", "0") == "1"
+HIERARCHY_TOP_DOCS = int(os.getenv("HIERARCHY_TOP_DOCS", "3"))
+# Consecutive chunks per section centroid; 0 = document-level centroids only
+SUMMARY_SECTION_SIZE = int(os.getenv("SUMMARY_SECTION_SIZE", "0"))
+
+SUMMARY_FIELDS = ("source", "subject", "chapter")
+
+def _source_key(source):
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+def document_vector_id(source):
+    return f"doc:{_source_key(source)}"
+
+def section_vector_id(source, section):
+    return f"sec:{_source_key(source)}:{section}"
+
+def update_summaries(vectors):
+    """
+    Fold freshly stored chunk vectors into their documents' centroids
+
+    Centroids are plain means (cosine similarity ignores scale), so a
+    re-upload merges with the existing centroid weighted by chunk count.
+    """
+    by_source = {}
+    for _, embedding, metadata in vectors:
+        by_source.setdefault(metadata["source"], []).append((embedding, metadata))
+
+    existing = pinecone_client.fetch_vectors(
+        [document_vector_id(source) for source in by_source], namespace=SUMMARY_NAMESPACE
+    )
+
+    summaries = []
+    for source, items in by_source.items():
+        # Same space as the stored centroids (projected when a projection is active)
+        embeddings = np.asarray(pinecone_client.to_index_space([embedding for embedding, _ in items]), dtype=np.float32)
+        first_meta = items[0][1]
+        base = {k: first_meta[k] for k in SUMMARY_FIELDS if k in first_meta}
+
+        count = len(items)
+        centroid = embeddings.mean(axis=0)
+        previous = existing.get(document_vector_id(source))
+        if previous:
+            previous_count = int(previous["metadata"].get("chunk_count", 0))
+            if previous_count:
+                previous_centroid = np.asarray(previous["values"], dtype=np.float32)
+                centroid = (previous_centroid * previous_count + embeddings.sum(axis=0)) / (previous_count + count)
+                count += previous_count
+
+        summaries.append((
+            document_vector_id(source),
+            centroid.tolist(),
+            {**base, "level": "document", "chunk_count": count}
+        ))
+
+        if SUMMARY_SECTION_SIZE > 0:
+            for start in range(0, len(items), SUMMARY_SECTION_SIZE):
+                section_items = items[start:start + SUMMARY_SECTION_SIZE]
+                chunk_indexes = [meta["chunk_index"] for _, meta in section_items]
+                summaries.append((
+                    section_vector_id(source, min(chunk_indexes) // SUMMARY_SECTION_SIZE),
+                    embeddings[start:start + SUMMARY_SECTION_SIZE].mean(axis=0).tolist(),
+                    {
+                        **base,
+                        "level": "section",
+                        "chunk_start": min(chunk_indexes),
+                        "chunk_end": max(chunk_indexes),
+                    }
+                ))
+
+    return pinecone_client.upsert_vectors(summaries, namespace=SUMMARY_NAMESPACE)
+
+def delete_summaries(source):
+    """Remove a document's centroid vectors"""
+    return pinecone_client.delete_document(source, namespace=SUMMARY_NAMESPACE)
+
+def rebuild_summaries(sources, stored=()):
+    """
+    Recompute these documents' centroids from every chunk they reference
+
+    A near-duplicate chunk is stored once under the document that brought it
+    first, so centroids built at ingestion miss the chunks a later document
+    shares. This covers documents whose chunks (partly or all) collapsed into
+    existing ones, and the documents left sharing a chunk after another is
+    deleted.
+
+    Args:
+        sources: Documents to rebuild centroids for
+        stored: (id, embedding, metadata) of chunks just stored, used as they
+            are instead of being read back from the index
+    """
+    # id -> (values, chunk_index)
+    known = {
+        vector_id: (values, metadata.get("chunk_index", 0))
+        for (vector_id, _, metadata), values in zip(
+            stored, pinecone_client.to_index_space([values for _, values, _ in stored])
+        )
+    }
+    for source in sources:
+        by_namespace = {}
+        for chunk_id, subject, chapter in near_dup.source_chunks(source):
+            by_namespace.setdefault(pinecone_client.subject_namespace(subject), {})[chunk_id] = (subject, chapter)
+
+        vectors = []
+        for namespace, scopes in by_namespace.items():
+            chunks = {chunk_id: known[chunk_id] for chunk_id in scopes if chunk_id in known}
+            ids = [chunk_id for chunk_id in scopes if chunk_id not in known]
+            for start in range(0, len(ids), pinecone_client.LIST_PAGE_SIZE):
+                fetched = pinecone_client.fetch_vectors(ids[start:start + pinecone_client.LIST_PAGE_SIZE], namespace)
+                chunks.update({
+                    chunk_id: (vector["values"], vector["metadata"].get("chunk_index", 0))
+                    for chunk_id, vector in fetched.items()
+                })
+            for chunk_id, (values, chunk_index) in chunks.items():
+                subject, chapter = scopes[chunk_id]
+                metadata = {"source": source, "subject": subject, "chapter": chapter, "chunk_index": chunk_index}
+                vectors.append((chunk_id, values, {k: v for k, v in metadata.items() if v is not None}))
+
+        delete_summaries(source)
+        if vectors:
+            vectors.sort(key=lambda vector: vector[2].get("chunk_index", 0))
+            update_summaries(vectors)
+
+def narrow_filter(query_embedding, filter=None, top_docs=HIERARCHY_TOP_DOCS):
+    """
+    Stage one of hierarchical retrieval
+
+    Picks the documents (or sections) whose centroids best match the query
+    and returns a chunk filter restricted to them, or None when there are no
+    centroids yet (callers then fall back to a flat search).
+    """
+    level = "section" if SUMMARY_SECTION_SIZE > 0 else "document"
+    summary_filter = {"level": {"$eq": level}}
+    if filter:
+        summary_filter = {"$and": [summary_filter, filter]}
+
+    matches = pinecone_client.query_vectors(
+        query_embedding=query_embedding,
+        top_k=top_docs,
+        filter=summary_filter,
+        namespace=SUMMARY_NAMESPACE
+    )
+    if not matches:
+        return None
+
+    if level == "section":
+        narrowed = {"$or": [
+            {
+                "source": {"$eq": m["metadata"]["source"]},
+                "chunk_index": {"$gte": m["metadata"]["chunk_start"], "$lte": m["metadata"]["chunk_end"]},
+            }
+            for m in matches
+        ]}
+    else:
+        chosen = [m["metadata"]["source"] for m in matches]
+        # Near-duplicate chunks shared with a chosen document list it in "sources"
+        narrowed = {"$or": [{"source": {"$in": chosen}}, {"sources": {"$in": chosen}}]}
+
+    return {"$and": [narrowed, filter]} if filter else narrowed
+
+def backfill():
+    """Build centroids for chunks that were ingested before summaries existed"""
+    built = 0
+    # A document's chunks share its subject namespace, so one namespace is read at a time
+    for namespace in pinecone_client.list_chunk_namespaces(refresh=True):
+        vectors = [
+            (v["id"], v["values"], v["metadata"])
+            for batch in pinecone_client.iter_vectors(namespace, include_values=True)
+            for v in batch if v["metadata"].get("source")
+        ]
+        sources = {metadata["source"] for _, _, metadata in vectors}
+        for source in sources:
+            delete_summaries(source)
+        if vectors:
+            update_summaries(vectors)
+        built += len(sources)
+    print(f"✅ Built summary vectors for {built} document(s)")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        backfill()
+    else:
+        print("""
+Usage:
+    python summary_vectors.py backfill    Build document centroids for existing chunks
+        """)
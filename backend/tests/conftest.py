@@ -0,0 +1,68 @@
+"""
+Shared fixtures for the backend tests
+
+Run from the backend folder with: python -m pytest tests
+
+Modules read their settings from the environment at import time, so tests
+that need a particular database or index file run the code in a subprocess
+with that environment (see run_python). API tests run the real app against
+the fake Ollama and vector store from bench/ (see app_server).
+"""
+import os
+import sys
+import socket
+import subprocess
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture
+def backend_env(tmp_path):
+    """Environment pointing every shared file (database, lexical index) into tmp_path"""
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'study_jarvis.db'}",
+        "LEXICAL_INDEX_PATH": str(tmp_path / "lexical_index.bin"),
+        "TRACE_LOG_PATH": str(tmp_path / "traces.jsonl"),
+        "PINECONE_API_KEY": "test",
+    }
+
+def run_python(env, *args, code=None):
+    """Run a backend script (or a -c snippet) in a fresh interpreter; returns its stdout"""
+    command = [sys.executable] + (["-c", code] if code is not None else list(args))
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+def start_process(env, code):
+    """Start a -c snippet in the background; returns the Popen"""
+    return subprocess.Popen(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def app_server(backend_env):
+    """Start the app (one worker) against fresh fakes; yields its base URL"""
+    from bench import fake_ollama, fake_vector_store
+    from bench.load import start_app
+
+    ollama, ollama_url = fake_ollama.start(ttft=0.0, tokens_per_second=1000.0, tokens=20)
+    store, store_url = fake_vector_store.start()
+    port = free_port()
+    env = {**backend_env, "OLLAMA_URL": ollama_url, "PINECONE_INDEX_HOST": store_url, "PRECOMPUTE_ARTIFACTS": "0"}
+    server = start_app(port, 1, env, timeout=120)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        ollama.shutdown()
+        store.shutdown()
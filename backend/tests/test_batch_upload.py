@@ -0,0 +1,37 @@
+"""Identical files uploaded in one batch are stored once and listed under both names"""
+import json
+
+import pytest
+import requests
+
+from bench.load import make_document
+
+# One file per upsert, and every file in one upsert
+@pytest.fixture(params=["1", "200"])
+def backend_env(backend_env, request):
+    return {**backend_env, "UPLOAD_BATCH_CHUNKS": request.param}
+
+def test_identical_files_in_one_batch_collapse(app_server):
+    text = make_document(5, 12).encode("utf-8")
+    other = make_document(6, 6).encode("utf-8")
+    response = requests.post(
+        f"{app_server}/upload/batch",
+        files=[
+            ("files", ("lecture.txt", text, "text/plain")),
+            ("files", ("lecture-copy.txt", text, "text/plain")),
+            ("files", ("other.txt", other, "text/plain")),
+        ],
+        timeout=120,
+    )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    results, summary = lines[:-1], lines[-1]
+    assert [r["status"] for r in results] == ["success"] * 3, results
+    assert "near-duplicates collapsed" in results[1]["message"]
+
+    documents = requests.get(f"{app_server}/documents", timeout=30).json()
+    chunks = {d["name"]: d["chunks"] for d in documents["documents"]}
+    assert chunks == {r["filename"]: r["chunks_created"] for r in results}
+    # The copy added no vectors of its own
+    assert documents["total_vectors"] == results[0]["chunks_created"] + results[2]["chunks_created"]
+    assert summary["succeeded"] == 3
@@ -0,0 +1,34 @@
+"""/chat/batch answers every question once, streaming one NDJSON line each"""
+import json
+
+import requests
+
+from bench.load import make_document
+
+def test_batch_answers_every_question(app_server):
+    upload = requests.post(
+        f"{app_server}/upload",
+        files={"file": ("lecture.txt", make_document(3, 12).encode("utf-8"), "text/plain")},
+        timeout=120,
+    )
+    assert upload.status_code == 200, upload.text
+
+    questions = ["Explain heaps", "What is a hash table?", "Describe merge sort"]
+    response = requests.post(
+        f"{app_server}/chat/batch", json={"questions": questions, "session_id": "batch"}, timeout=120
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    for line in lines:
+        assert "error" not in line, line
+        assert line["question"] == questions[line["index"]]
+        assert line["answer"]
+        assert line["sources"] == ["lecture.txt"]
+
+def test_batch_rejects_empty_and_oversized_batches(app_server):
+    assert requests.post(f"{app_server}/chat/batch", json={"questions": []}, timeout=30).status_code == 400
+    too_many = {"questions": ["q"] * 101}
+    assert requests.post(f"{app_server}/chat/batch", json=too_many, timeout=30).status_code == 400
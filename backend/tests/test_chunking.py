@@ -0,0 +1,11 @@
+"""iter_chunks drops fragments under min_chars wherever it flushes"""
+import ingest_notes
+
+
+def test_fragment_before_long_paragraph_is_dropped():
+    text = "Tiny.\n\n" + " ".join(["word"] * 1200)
+    chunks = list(ingest_notes.iter_chunks(text, max_size=500, min_chars=50))
+
+    assert chunks
+    assert "Tiny." not in chunks
+    assert all(len(chunk) > 50 for chunk in chunks)
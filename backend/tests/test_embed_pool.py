@@ -0,0 +1,28 @@
+"""Embedding pool lanes: queries are served while bulk work saturates the workers"""
+import time
+
+import numpy as np
+import pytest
+
+from embed_pool import EmbeddingPool, BULK_LANE
+
+@pytest.fixture
+def pool():
+    pool = EmbeddingPool(2, 384, bulk_batch_size=50)
+    pool.start()
+    pool.wait_ready(120)
+    yield pool
+    pool.close()
+
+def test_query_lane_overtakes_bulk_work(pool):
+    bulk = pool.submit([f"bulk text {i}" for i in range(20000)], BULK_LANE)
+
+    started = time.perf_counter()
+    query = pool.encode(["what is a heap?"], timeout=30)
+    query_seconds = time.perf_counter() - started
+
+    embeddings = bulk.result(120)
+    assert embeddings.shape == (20000, 384)
+    assert query.shape == (1, 384)
+    assert query_seconds < 2
+    assert np.allclose(embeddings[7], pool.encode(["bulk text 7"], timeout=30)[0])
@@ -0,0 +1,55 @@
+"""Folder sync re-ingests modified files, removes deleted ones and leaves touched ones alone"""
+import json
+
+from bench import fake_vector_store
+from bench.load import make_document
+from conftest import run_python
+
+SYNC = """
+import os, json
+import folder_sync, lexical_index, pinecone_client
+from db import get_connection
+folder_sync.SYNC_DEBOUNCE_SECONDS = 0
+pinecone_client.init_index()
+
+def state():
+    chunks = {{d["name"]: d["chunks"] for d in pinecone_client.get_document_stats()["documents"]}}
+    manifest = dict(get_connection().execute("SELECT path, chunks FROM sync_manifest").fetchall())
+    return {{"chunks": chunks, "manifest": manifest, "lexical": len(lexical_index.document_chunks())}}
+
+root = {root!r}
+steps = {{"added": folder_sync.sync_once(root), "after_add": state()}}
+
+os.utime(os.path.join(root, "keep.txt"), ns=(1, 1))
+with open(os.path.join(root, "edit.txt"), "w") as f:
+    f.write({edited!r})
+os.utime(os.path.join(root, "edit.txt"), ns=(2, 2))
+os.remove(os.path.join(root, "gone.txt"))
+steps["changed"] = folder_sync.sync_once(root)
+steps["after_change"] = state()
+print(json.dumps(steps))
+"""
+
+def test_sync_handles_modified_deleted_and_touched_files(backend_env, tmp_path):
+    _, url = fake_vector_store.start()
+    notes = tmp_path / "notes"
+    notes.mkdir()
+    for seed, name in enumerate(("keep.txt", "edit.txt", "gone.txt"), start=20):
+        (notes / name).write_text(make_document(seed, 12))
+
+    code = SYNC.format(root=str(notes), edited=make_document(30, 6))
+    output = run_python({**backend_env, "PINECONE_INDEX_HOST": url}, code=code)
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["added"] == {"added": 3, "modified": 0, "removed": 0, "touched": 0}
+    before = result["after_add"]["chunks"]
+    assert set(before) == {"keep.txt", "edit.txt", "gone.txt"}
+
+    assert result["changed"] == {"added": 0, "modified": 1, "removed": 1, "touched": 1}
+    after = result["after_change"]
+    assert set(after["chunks"]) == {"keep.txt", "edit.txt"}
+    assert after["chunks"]["keep.txt"] == before["keep.txt"]
+    assert after["chunks"]["edit.txt"] < before["edit.txt"]
+    # The touched file keeps its chunk count in the manifest
+    assert after["manifest"] == after["chunks"]
+    assert after["lexical"] == sum(after["chunks"].values())
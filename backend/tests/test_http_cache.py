@@ -0,0 +1,53 @@
+"""Polled read endpoints answer 304 until what they return changes"""
+import pytest
+import requests
+
+from bench.load import make_document
+
+@pytest.fixture
+def backend_env(backend_env):
+    # Validators are only sent once the corpus has settled; the fake store is consistent at once
+    return {**backend_env, "INDEX_CONSISTENCY_SECONDS": "0"}
+
+def _upload(base_url, name, seed):
+    response = requests.post(
+        f"{base_url}/upload",
+        files={"file": (name, make_document(seed, 6).encode("utf-8"), "text/plain")},
+        timeout=120,
+    )
+    assert response.status_code == 200, response.text
+
+def test_documents_etag_round_trip(app_server):
+    _upload(app_server, "first.txt", 1)
+    first = requests.get(f"{app_server}/documents", timeout=30)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = requests.get(f"{app_server}/documents", headers={"If-None-Match": etag}, timeout=30)
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert not cached.content
+
+    _upload(app_server, "second.txt", 2)
+    changed = requests.get(f"{app_server}/documents", headers={"If-None-Match": etag}, timeout=30)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["document_count"] == 2
+
+def test_history_etag_round_trip(app_server):
+    url = f"{app_server}/history/etag-session"
+    chat = {"message": "Explain heaps", "session_id": "etag-session"}
+    assert requests.post(f"{app_server}/chat", json=chat, timeout=60).status_code == 200
+
+    first = requests.get(url, timeout=30)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert requests.get(url, headers={"If-None-Match": etag}, timeout=30).status_code == 304
+    # The validator covers the page parameters too
+    assert requests.get(url, params={"limit": 1}, headers={"If-None-Match": etag}, timeout=30).status_code == 200
+
+    assert requests.post(f"{app_server}/chat", json=chat, timeout=60).status_code == 200
+    changed = requests.get(url, headers={"If-None-Match": etag}, timeout=30)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert len(changed.json()["messages"]) == len(first.json()["messages"]) * 2
@@ -0,0 +1,75 @@
+"""Lexical index persistence: the rebuild CLI, and writers in several processes"""
+import json
+
+from bench import fake_vector_store
+from conftest import run_python, start_process
+
+CHUNKS = {
+    "heaps-0": "A binary heap keeps the smallest key at the root",
+    "heaps-1": "Heapsort repeatedly extracts the root of a max heap",
+    "trees-0": "A B+ tree stores every key in its leaves",
+}
+
+SEARCH = """
+import json, lexical_index
+index = lexical_index.get_index()
+print(json.dumps({{"live": index.live_docs, "ids": [m["id"] for m in lexical_index.search({query!r}, top_k=5)]}}))
+"""
+
+def search(env, query):
+    return json.loads(run_python(env, code=SEARCH.format(query=query)).strip().splitlines()[-1])
+
+def test_rebuild_cli_then_load(backend_env):
+    _, url = fake_vector_store.start()
+    env = {**backend_env, "PINECONE_INDEX_HOST": url}
+    vectors = [
+        (chunk_id, [float(i + 1)] + [0.0] * 383, {"text": text, "source": "notes.txt", "chunk_index": i})
+        for i, (chunk_id, text) in enumerate(CHUNKS.items())
+    ]
+    run_python(env, code=f"""
+import pinecone_client
+pinecone_client.init_index()
+pinecone_client.upsert_vectors({vectors!r})
+""")
+
+    # Run as a script, the way the docs say to backfill
+    run_python(env, "lexical_index.py", "rebuild")
+
+    # The server and the ingest CLI load it as a module
+    result = search(env, "heap root")
+    assert result["live"] == 3
+    assert set(result["ids"]) == {"heaps-0", "heaps-1"}
+
+    # Writers keep working on top of the rebuilt index
+    run_python(env, code="""
+import lexical_index
+lexical_index.add_chunks([("graphs-0", None, {"text": "Dijkstra relaxes heap entries", "source": "graphs.txt"})])
+lexical_index.delete_source("notes.txt")
+""")
+    result = search(env, "heap")
+    assert result == {"live": 1, "ids": ["graphs-0"]}
+
+WRITER = """
+import lexical_index
+for i in range({count}):
+    lexical_index.add_chunks([("{name}-%d" % i, None, {{"text": "{name} chunk %d about heaps" % i, "source": "{name}.txt"}})])
+"""
+
+def test_concurrent_writers_keep_every_chunk(backend_env):
+    count = 60
+    writers = [start_process(backend_env, WRITER.format(name=name, count=count)) for name in ("alpha", "beta", "gamma")]
+    for writer in writers:
+        output, _ = writer.communicate(timeout=120)
+        assert writer.returncode == 0, output
+
+    assert search(backend_env, "heaps")["live"] == 3 * count
+
+def test_small_log_compacts_into_snapshot(backend_env):
+    env = {**backend_env}
+    run_python(env, code=WRITER.format(name="alpha", count=5) + """
+lexical_index.LOG_COMPACT_BYTES = 0
+lexical_index.add_chunks([("last", None, {"text": "compacted heaps", "source": "last.txt"})])
+""")
+    # A fresh process reads the compacted snapshot, then appends to the new log
+    run_python(env, code=WRITER.format(name="beta", count=2))
+    assert search(env, "heaps")["live"] == 8
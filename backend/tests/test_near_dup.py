@@ -0,0 +1,87 @@
+"""Near-duplicate collapsing keeps every document's subject and chapter findable"""
+import json
+
+from bench import fake_vector_store
+from bench.load import make_document
+from conftest import run_python
+
+CHECK = """
+import json
+import ingest_notes, lexical_index, pinecone_client
+pinecone_client.init_index()
+ingest_notes.ingest_file({first!r}, subject="Algorithms", chapter="Heaps")
+ingest_notes.ingest_file({second!r}, subject="algorithms", chapter="Sorting")
+
+def sources(matches):
+    return sorted({{s for m in matches for s in m["metadata"].get("sources", [m["metadata"]["source"]])}})
+
+query = pinecone_client.get_index().query
+dense = query(
+    vector=[1.0] * 384, top_k=50, include_metadata=True, namespace=pinecone_client.subject_namespace("Algorithms"),
+    filter=pinecone_client.metadata_filter({{"chapter": "Sorting", "subject": "algorithms"}})
+).get("matches", [])
+print(json.dumps({{
+    "lexical": sources(lexical_index.search("the", top_k=50, filter={{"chapter": "Sorting", "subject": "algorithms"}})),
+    "dense": sources(dense),
+    "chapter_chunks": len(lexical_index.document_chunks(chapter="Sorting")),
+}}))
+"""
+
+def test_collapsed_chunks_keep_the_new_documents_chapter(backend_env, tmp_path):
+    _, url = fake_vector_store.start()
+    text = make_document(7, 6)
+    first, second = tmp_path / "lecture.txt", tmp_path / "lecture-copy.txt"
+    first.write_text(text)
+    second.write_text(text)
+
+    output = run_python({**backend_env, "PINECONE_INDEX_HOST": url}, code=CHECK.format(first=str(first), second=str(second)))
+    result = json.loads(output.strip().splitlines()[-1])
+
+    # Every chunk of the copy collapsed onto the original, yet chapter-filtered search still finds it
+    assert result["lexical"] == ["lecture-copy.txt", "lecture.txt"]
+    assert result["dense"] == ["lecture-copy.txt", "lecture.txt"]
+    assert result["chapter_chunks"] > 0
+
+SHARED = """
+import json
+import ingest_notes, pinecone_client, summary_vectors
+pinecone_client.init_index()
+ingest_notes.ingest_file({first!r})
+ingest_notes.ingest_file({second!r})
+listed = {{d["name"]: d["chunks"] for d in pinecone_client.get_document_stats()["documents"]}}
+
+def has_centroid(source):
+    ids = [summary_vectors.document_vector_id(source)]
+    return bool(pinecone_client.fetch_vectors(ids, namespace=summary_vectors.SUMMARY_NAMESPACE))
+
+centroids = {{"before": has_centroid("copy.txt")}}
+ingest_notes.remove_document("original.txt")
+centroids["after"] = has_centroid("copy.txt")
+
+query = ingest_notes.get_embed_model().encode([{probe!r}])[0].tolist()
+narrowed = summary_vectors.narrow_filter(query)
+matches = pinecone_client.query_partitions(query, top_k=5, filter=narrowed)
+print(json.dumps({{
+    "listed": listed,
+    "centroids": centroids,
+    "after_delete": sorted({{m["metadata"]["source"] for m in matches}}),
+}}))
+"""
+
+def test_fully_collapsed_upload_is_listed_and_reachable(backend_env, tmp_path):
+    _, url = fake_vector_store.start()
+    text = make_document(11, 6)
+    first, second = tmp_path / "original.txt", tmp_path / "copy.txt"
+    first.write_text(text)
+    second.write_text(text)
+
+    code = SHARED.format(first=str(first), second=str(second), probe=text.split("\n\n")[2])
+    output = run_python({**backend_env, "PINECONE_INDEX_HOST": url, "HIERARCHICAL_RETRIEVAL": "1"}, code=code)
+    result = json.loads(output.strip().splitlines()[-1])
+
+    # Every chunk of copy.txt collapsed, yet /documents lists it with the shared chunks
+    assert set(result["listed"]) == {"original.txt", "copy.txt"}
+    assert result["listed"]["copy.txt"] == result["listed"]["original.txt"]
+    # It has a centroid of its own, so hierarchical retrieval still reaches it once the original is gone
+    assert result["centroids"] == {"before": True, "after": True}
+    assert result["after_delete"] == ["copy.txt"]
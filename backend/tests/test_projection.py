@@ -0,0 +1,63 @@
+"""Projected index builds read the whole corpus and check the copy before it is saved"""
+import json
+import os
+
+from bench import fake_vector_store
+from conftest import run_python
+
+FILL = """
+import numpy as np
+import pinecone_client
+pinecone_client.init_index()
+rng = np.random.default_rng(0)
+for start in range(0, 10250, 1000):
+    ids = range(start, min(start + 1000, 10250))
+    values = rng.standard_normal((len(ids), pinecone_client.DIMENSION)).tolist()
+    pinecone_client.bulk_upsert([(f"chunk-{i}", v, {"source": "big.txt", "text": "x"}) for i, v in zip(ids, values)])
+"""
+
+BUILD = """
+import json
+import projection, pinecone_client
+projection.BUILD_VERIFY_SECONDS = 0
+pinecone_client.init_index()
+try:
+    projection.build(16, path=%r)
+    print(json.dumps({"built": True, "counts": pinecone_client.namespace_counts()}))
+except RuntimeError as e:
+    print(json.dumps({"built": False, "error": str(e)}))
+"""
+
+def build(env, path):
+    return json.loads(run_python(env, code=BUILD % path).strip().splitlines()[-1])
+
+def test_build_copies_past_the_query_cap(backend_env, tmp_path):
+    _, source = fake_vector_store.start()
+    _, projected = fake_vector_store.start(dimension=16)
+    env = {**backend_env, "PINECONE_INDEX_HOST": source, "PROJECTED_INDEX_HOST": projected}
+    path = str(tmp_path / "projection.npz")
+
+    run_python(env, code=FILL)
+    result = build(env, path)
+
+    assert result["built"]
+    assert result["counts"][""] == 10250
+    assert os.path.exists(path)
+
+def test_build_is_not_saved_when_counts_differ(backend_env, tmp_path):
+    _, source = fake_vector_store.start()
+    _, projected = fake_vector_store.start(dimension=16)
+    env = {**backend_env, "PINECONE_INDEX_HOST": source, "PROJECTED_INDEX_HOST": projected}
+    path = str(tmp_path / "projection.npz")
+
+    run_python(env, code=FILL)
+    # A leftover vector in the target makes its count disagree with the source
+    run_python({**env, "PINECONE_INDEX_HOST": projected}, code=(
+        "import pinecone_client; pinecone_client.DIMENSION = 16; pinecone_client.init_index(); "
+        "pinecone_client.bulk_upsert([('stray', [1.0] * 16, {})])"
+    ))
+    result = build(env, path)
+
+    assert not result["built"]
+    assert "'' has 10251 of 10250" in result["error"]
+    assert not os.path.exists(path)
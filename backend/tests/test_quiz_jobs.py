@@ -0,0 +1,44 @@
+"""Quiz jobs whose worker stops sending heartbeats end as failed, keeping finished topics"""
+import json
+
+from conftest import run_python
+
+STALE = """
+import json, time
+import quiz_jobs
+from db import get_connection
+
+quiz_jobs.JOB_STALE_SECONDS = 60
+conn = get_connection()
+
+def backdate(job_id, seconds):
+    with conn:
+        conn.execute("UPDATE quiz_jobs SET created_at = ? WHERE job_id = ?", (time.time() - seconds, job_id))
+
+dead = quiz_jobs.create_job(["heaps", "tries", "graphs"], 3)
+quiz_jobs.set_job_status(dead, "running")
+quiz_jobs.finish_item(dead, 0, quiz="Q1. ...", sources=["heaps.txt"])
+backdate(dead, 600)
+with conn:
+    conn.execute("INSERT INTO quiz_job_heartbeats (job_id, beat_at) VALUES (?, ?)", (dead, time.time() - 300))
+
+alive = quiz_jobs.create_job(["stacks"], 3)
+quiz_jobs.set_job_status(alive, "running")
+backdate(alive, 600)
+quiz_jobs.heartbeat(alive)
+
+print(json.dumps({"dead": quiz_jobs.get_job(dead), "alive": quiz_jobs.get_job(alive)}))
+"""
+
+def test_stale_job_fails_and_keeps_finished_items(backend_env):
+    result = json.loads(run_python(backend_env, code=STALE).strip().splitlines()[-1])
+
+    dead = result["dead"]
+    assert dead["status"] == "failed"
+    assert "stopped making progress" in dead["error"]
+    assert [item["status"] for item in dead["items"]] == ["completed", "failed", "failed"]
+    assert dead["items"][0]["quiz"] == "Q1. ..."
+    assert dead["completed"] == dead["total"] == 3
+
+    # A recent heartbeat keeps an old job running
+    assert result["alive"]["status"] == "running"
@@ -0,0 +1,56 @@
+"""Circuit breakers open after repeated failures and let one probe through after the cool-down"""
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, deadline
+
+class Unavailable(Exception):
+    pass
+
+def _fail(breaker):
+    with pytest.raises(Unavailable):
+        with breaker.call():
+            raise Unavailable("connection refused")
+
+def test_breaker_opens_then_recovers_through_a_probe():
+    breaker = CircuitBreaker("dependency", failure_threshold=2, reset_seconds=0.2)
+    _fail(breaker)
+    assert breaker.status()["state"] == "closed"
+    _fail(breaker)
+    assert breaker.status()["state"] == "open"
+    assert breaker.rejecting()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.25)
+    assert not breaker.rejecting()
+    # Half-open: the first caller probes, everyone else still fails fast
+    breaker.before_call()
+    assert breaker.status()["state"] == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.status()["state"] == "closed"
+    assert breaker.status()["failures"] == 0
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker("dependency", failure_threshold=2, reset_seconds=0.2)
+    _fail(breaker)
+    _fail(breaker)
+    time.sleep(0.25)
+    _fail(breaker)
+    status = breaker.status()
+    assert status["state"] == "open"
+    assert 0 < status["retry_in_seconds"] <= 0.2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_deadline_expiry_is_not_a_dependency_failure():
+    breaker = CircuitBreaker("dependency", failure_threshold=1, reset_seconds=60)
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            with breaker.call():
+                raise TimeoutError("read timed out")
+    assert breaker.status()["state"] == "closed"
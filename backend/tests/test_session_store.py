@@ -0,0 +1,35 @@
+"""Idle sessions expire after SESSION_TTL_SECONDS; active ones and their cache stay intact"""
+import json
+
+from conftest import run_python
+
+PURGE = """
+import json, time
+import session_store
+from db import get_connection
+
+for session_id in ("idle", "active"):
+    for n in range(3):
+        session_store.append_message(session_id, {"question": f"{session_id} {n}"})
+session_store.get_messages("idle")  # cached, so the purge must evict it too
+
+conn = get_connection()
+with conn:
+    conn.execute("UPDATE sessions SET last_active = ? WHERE session_id = 'idle'", (time.time() - 7200,))
+
+print(json.dumps({
+    "purged": session_store.purge_expired(),
+    "idle": session_store.get_messages("idle")[0],
+    "active": [m["question"] for m in session_store.get_messages("active")[0]],
+    "rows": conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = 'idle'").fetchone()[0],
+}))
+"""
+
+def test_purge_removes_only_idle_sessions(backend_env):
+    output = run_python({**backend_env, "SESSION_TTL_SECONDS": "3600"}, code=PURGE)
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["purged"] == 1
+    assert result["idle"] == []
+    assert result["rows"] == 0
+    assert result["active"] == ["active 0", "active 1", "active 2"]
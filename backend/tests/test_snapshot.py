@@ -0,0 +1,47 @@
+"""Snapshots export every vector, past the 10,000-match query cap"""
+import json
+
+from bench import fake_vector_store
+from conftest import run_python
+
+FILL = """
+import numpy as np
+import pinecone_client
+pinecone_client.init_index()
+rng = np.random.default_rng(0)
+for namespace, count in (("", 10250), ("subject-math", 30)):
+    for start in range(0, count, 1000):
+        ids = range(start, min(start + 1000, count))
+        values = rng.standard_normal((len(ids), pinecone_client.DIMENSION)).tolist()
+        pinecone_client.bulk_upsert([(f"{{namespace}}-{{i}}", v, {{"n": i}}) for i, v in zip(ids, values)], namespace)
+"""
+
+EXPORT = """
+import json
+import pinecone_client, snapshot
+pinecone_client.init_index()
+print(json.dumps({"exported": snapshot.export_snapshot(%r), "counts": pinecone_client.namespace_counts()}))
+"""
+
+IMPORT = """
+import json
+import pinecone_client, snapshot
+pinecone_client.init_index()
+snapshot.import_snapshot(%r)
+print(json.dumps(pinecone_client.namespace_counts()))
+"""
+
+def last_json(output):
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_export_and_import_past_the_query_cap(backend_env, tmp_path):
+    _, source = fake_vector_store.start()
+    _, target = fake_vector_store.start()
+    path = str(tmp_path / "backup.zip")
+
+    run_python({**backend_env, "PINECONE_INDEX_HOST": source}, code=FILL.format())
+    exported = last_json(run_python({**backend_env, "PINECONE_INDEX_HOST": source}, code=EXPORT % path))
+    assert exported["exported"] == 10280
+
+    imported = last_json(run_python({**backend_env, "PINECONE_INDEX_HOST": target}, code=IMPORT % path))
+    assert imported == exported["counts"] == {"": 10250, "subject-math": 30}
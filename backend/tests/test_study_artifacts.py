@@ -0,0 +1,36 @@
+"""Chapter artifacts are kept apart per subject"""
+import json
+
+from bench import fake_vector_store
+from conftest import run_python
+
+CHECK = """
+import json
+import ingest_notes, pinecone_client, study_artifacts
+pinecone_client.init_index()
+ingest_notes.ingest_file({heaps!r}, subject="Data Structures", chapter="Chapter 1")
+ingest_notes.ingest_file({cells!r}, subject="Biology", chapter="Chapter 1")
+study_artifacts._query = lambda prompt: prompt
+
+def sources(subject):
+    return study_artifacts.build_artifact("chapter", study_artifacts.chapter_key(subject, "Chapter 1"), "summarize")["sources"]
+
+print(json.dumps({{
+    "data_structures": sources("Data Structures"),
+    "biology": sources("Biology"),
+    "subjects": study_artifacts.chapter_subjects("Chapter 1"),
+}}))
+"""
+
+def test_same_chapter_name_in_two_subjects(backend_env, tmp_path):
+    _, url = fake_vector_store.start()
+    heaps, cells = tmp_path / "heaps.txt", tmp_path / "cells.txt"
+    heaps.write_text("A binary heap keeps the smallest key at the root of a complete binary tree. " * 8)
+    cells.write_text("The mitochondria produce most of the chemical energy a living cell needs. " * 8)
+
+    output = run_python({**backend_env, "PINECONE_INDEX_HOST": url}, code=CHECK.format(heaps=str(heaps), cells=str(cells)))
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["data_structures"] == ["heaps.txt"]
+    assert result["biology"] == ["cells.txt"]
+    assert result["subjects"] == ["Biology", "Data Structures"]
@@ -0,0 +1,39 @@
+"""Spans are written by a background thread and arrive as one intact tree per trace"""
+import json
+
+from conftest import run_python
+
+TRACE = """
+import json, threading
+import tracing
+
+def request(n):
+    with tracing.span("request", trace_id=f"trace-{n}", path="/chat"):
+        with tracing.span("embed"):
+            pass
+        with tracing.span("generate", tokens=n):
+            pass
+
+callers = set()
+real_append = tracing._append
+tracing._append = lambda lines: (callers.add(threading.current_thread().name), real_append(lines))
+
+threads = [threading.Thread(target=request, args=(n,)) for n in range(20)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(json.dumps({"flushed": tracing.flush(), "writers": sorted(callers)}))
+"""
+
+def test_spans_are_written_off_the_calling_thread(backend_env, tmp_path):
+    result = json.loads(run_python(backend_env, code=TRACE).strip().splitlines()[-1])
+    assert result == {"flushed": True, "writers": ["trace-writer"]}
+
+    spans = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert len(spans) == 60
+    for n in range(20):
+        trace = [s for s in spans if s["trace_id"] == f"trace-{n}"]
+        root = next(s for s in trace if s["parent_id"] is None)
+        assert sorted(s["name"] for s in trace) == ["embed", "generate", "request"]
+        assert all(s["parent_id"] == root["span_id"] for s in trace if s is not root)
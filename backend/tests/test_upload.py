@@ -0,0 +1,26 @@
+"""Uploading a changed file under an existing name replaces the earlier version"""
+import requests
+
+from bench.load import make_document
+
+def _upload(base_url, text):
+    response = requests.post(
+        f"{base_url}/upload",
+        files={"file": ("lecture.txt", text.encode("utf-8"), "text/plain")},
+        timeout=120,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_changed_upload_replaces_previous_version(app_server):
+    first = _upload(app_server, make_document(1, 12))
+    assert first["chunks_created"] > 0
+    again = _upload(app_server, make_document(1, 12))
+    assert "unchanged" in again["message"]
+
+    second = _upload(app_server, make_document(2, 6))
+    assert second["chunks_created"] != first["chunks_created"]
+
+    documents = requests.get(f"{app_server}/documents", timeout=30).json()
+    assert [(d["name"], d["chunks"]) for d in documents["documents"]] == [("lecture.txt", second["chunks_created"])]
+    assert documents["total_vectors"] == second["chunks_created"]
@@ -0,0 +1,302 @@
+"""
+Request Tracing
+Every traced request gets a trace ID (returned in the X-Trace-Id header)
+and a tree of spans -- embed, retrieve, prompt, generate, ... -- appended
+to a local JSONL trace log. No collector or network access is needed. Spans
+are queued and written by a background thread, so request handlers never
+wait on the disk.
+
+With TRACE_PROFILING=1, a request sent with the header "X-Debug-Profile: 1"
+also gets a sampled CPU profile (folded stacks, flamegraph-compatible) and a
+tracemalloc allocation snapshot attached to its root span.
+
+Usage:
+    python tracing.py show <trace_id>    Print one trace as a tree
+    python tracing.py slowest [N]        List the N slowest traced requests
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "traces.jsonl")
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_PROFILING = os.getenv("TRACE_PROFILING", "0") == "1"
+TRACED_PATHS = ("/chat", "/upload", "/quiz")
+
+PROFILE_INTERVAL_SECONDS = 0.005
+PROFILE_TOP_STACKS = 50
+ALLOCATION_TOP_LINES = 20
+
+# (trace_id, span_id) of the span the current code runs in
+_current_span = ContextVar("current_span", default=None)
+# Span records waiting for the writer thread, and that thread's process id
+# (a forked worker starts its own)
+_records = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+# Only one request at a time is profiled; the sampler sees every thread
+_profile_lock = threading.Lock()
+
+def _append(lines):
+    try:
+        if os.path.getsize(TRACE_LOG_PATH) > TRACE_LOG_MAX_BYTES:
+            os.replace(TRACE_LOG_PATH, f"{TRACE_LOG_PATH}.1")
+    except FileNotFoundError:
+        pass
+    fd = os.open(TRACE_LOG_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        # One append per line keeps records from several workers intact
+        for line in lines:
+            os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+def _writer_loop(records):
+    while True:
+        batch = [records.get()]
+        while True:
+            try:
+                batch.append(records.get_nowait())
+            except queue.Empty:
+                break
+        lines = [json.dumps(item, default=str) + "\n" for item in batch if isinstance(item, dict)]
+        if lines:
+            try:
+                _append(lines)
+            except OSError as e:
+                print(f"❌ Error writing traces: {e}")
+        for item in batch:
+            if isinstance(item, threading.Event):
+                item.set()
+
+def _queue():
+    global _records, _writer_pid
+    if _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer_pid != os.getpid():
+                _records = queue.SimpleQueue()
+                threading.Thread(target=_writer_loop, args=(_records,), daemon=True, name="trace-writer").start()
+                _writer_pid = os.getpid()
+    return _records
+
+def _write(record):
+    _queue().put(record)
+
+def flush(timeout=5.0):
+    """Wait until every span recorded so far is in the trace log"""
+    if _writer_pid != os.getpid():
+        return True
+    written = threading.Event()
+    _records.put(written)
+    return written.wait(timeout)
+
+atexit.register(flush)
+
+def current_trace_id():
+    current = _current_span.get()
+    return current[0] if current else None
+
+@contextmanager
+def span(name, trace_id=None, **attrs):
+    """
+    Record a block as a span of the current trace
+
+    Outside a trace (and without trace_id) this does nothing, so library
+    code can open spans unconditionally. Yields the span's attribute dict,
+    which the block may add to.
+    """
+    parent = _current_span.get()
+    if not TRACING_ENABLED or (parent is None and trace_id is None):
+        yield attrs
+        return
+
+    trace_id = trace_id or parent[0]
+    span_id = uuid.uuid4().hex[:16]
+    token = _current_span.set((trace_id, span_id))
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = repr(e)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _write({
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent[1] if parent else None,
+            "name": name,
+            "start": started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "thread": threading.current_thread().name,
+            "attrs": attrs,
+        })
+
+class StackSampler:
+    """Samples every thread's Python stack on an interval and counts folded stacks"""
+
+    def __init__(self, interval=PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="trace-sampler")
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "folded_stacks": dict(self.stacks.most_common(PROFILE_TOP_STACKS)),
+        }
+
+@contextmanager
+def debug_profile(attrs):
+    """Attach a CPU profile and allocation snapshot of the block to a span's attrs"""
+    if not _profile_lock.acquire(blocking=False):
+        attrs["profile"] = "skipped: another request is being profiled"
+        yield
+        return
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(10)
+    before = tracemalloc.take_snapshot()
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        attrs["profile"] = sampler.stop()
+        after = tracemalloc.take_snapshot()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        attrs["allocations"] = [
+            {"location": str(stat.traceback[0]), "size_kb": round(stat.size_diff / 1024, 1), "count": stat.count_diff}
+            for stat in after.compare_to(before, "lineno")[:ALLOCATION_TOP_LINES]
+        ]
+        _profile_lock.release()
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class TracingMiddleware:
+    """ASGI middleware: a root span per traced request and the X-Trace-Id header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not TRACING_ENABLED or scope["type"] != "http" or not scope["path"].startswith(TRACED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = _header(scope, b"x-trace-id") or uuid.uuid4().hex
+        profile = TRACE_PROFILING and _header(scope, b"x-debug-profile") == "1"
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                attrs["status"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace_id.encode("latin-1"))
+                ]}
+            await send(message)
+
+        with span("request", trace_id=trace_id, method=scope["method"], path=scope["path"]) as attrs:
+            if profile:
+                with debug_profile(attrs):
+                    await self.app(scope, receive, send_with_trace_id)
+            else:
+                await self.app(scope, receive, send_with_trace_id)
+            endpoint = scope.get("endpoint")
+            if endpoint is not None:
+                attrs["endpoint"] = endpoint.__name__
+
+def load_trace(trace_id, path=TRACE_LOG_PATH):
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if trace_id in line:
+                record = json.loads(line)
+                if record["trace_id"] == trace_id:
+                    spans.append(record)
+    return spans
+
+def print_trace(trace_id):
+    spans = load_trace(trace_id)
+    if not spans:
+        print(f"❌ Trace not found: {trace_id}")
+        return
+    children = {}
+    for record in spans:
+        children.setdefault(record["parent_id"], []).append(record)
+
+    def show(record, depth):
+        attrs = {k: v for k, v in record["attrs"].items() if k not in ("profile", "allocations")}
+        print(f"{'  ' * depth}{record['name']:<{24 - 2 * depth}} {record['duration_ms']:>10.1f} ms  {attrs or ''}")
+        for child in sorted(children.get(record["span_id"], []), key=lambda r: r["start"]):
+            show(child, depth + 1)
+
+    for root in children.get(None, []):
+        show(root, 0)
+        if isinstance(root["attrs"].get("profile"), dict):
+            print("\nHottest stacks:")
+            for stack, count in list(root["attrs"]["profile"]["folded_stacks"].items())[:10]:
+                print(f"  {count:>5}  {stack.split(';')[-1]}")
+            print("\nTop allocations:")
+            for allocation in root["attrs"].get("allocations", [])[:10]:
+                print(f"  {allocation['size_kb']:>10.1f} KB  {allocation['location']}")
+
+def print_slowest(limit=10):
+    roots = []
+    with open(TRACE_LOG_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["parent_id"] is None:
+                roots.append(record)
+    for record in sorted(roots, key=lambda r: r["duration_ms"], reverse=True)[:limit]:
+        print(f"{record['trace_id']}  {record['duration_ms']:>10.1f} ms  {record['attrs'].get('path')}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "show":
+        print_trace(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == "slowest":
+        print_slowest(int(sys.argv[2]) if len(sys.argv) > 2 else 10)
+    else:
+        print(__doc__)